@@ -0,0 +1,290 @@
+"""
+Accounts, storages and parameters shared by the contract benchmarks.
+
+Storages are modeled on the ones used by the tests, with the contracts the
+bridge calls (FA2s, NFT, minter) replaced by instances originated on the
+sandbox, since the node resolves every contract an entrypoint looks up.
+"""
+import hashlib
+
+from pytezos import Key, michelson_to_micheline
+from pytezos.michelson.types import MichelsonType
+from pytezos.operation.result import OperationResult
+
+from src.indexer import mint_key
+from src.ligo import load_contract_file, root_dir
+
+michelson_dir = root_dir / "michelson"
+
+# sandbox bootstrap1, every administrative role is held by this key
+admin_key = Key.from_encoded_key("edsk3QoqBuvdamxouPhin7swCvkQNgq4jP5KZPbwWNnwdZpSpJiEbq")
+admin = admin_key.public_key_hash()
+user = "tz1grSQDByRpnVs7sPtaprNZRp531ZKz6Jmm"
+other_party = "tz1et19hnF9qKv6yCbbxjS1QDXB5HVx6PCVk"
+dev_pool = "tz1irF8HUsQp2dLhKNMhteG1qALNU9g3pfdN"
+staking_pool = "tz3SYyWM9sq9eWTxiA8KHb36SAieVYQPeZZm"
+# SELF_ADDRESS of scripts run through helpers/scripts/run_code and trace_code
+self_address = "KT1BEqzn5Wx8uJrZNvuS9DVHmLvG9td3fDLi"
+
+eth_token = bytes.fromhex("a0b86991c6218b36c1d19d4a2e9eb0ce3606eb48")
+eth_nft = bytes.fromhex("b47e3cd837ddf8e4c57f05d70ab865de6e193bbb")
+eth_destination = bytes.fromhex("e44a1e5b3dd2b6dd9c3b8e2b8a4d3ba8a8b9a3b1")
+block_hash = bytes.fromhex("e1286c8cdafc9462534bce697cf3bf7e718c2241c6d02763e4027b072d371b7c")
+
+signer_ep = """(or
+                 (or (or (pair %add_erc20 (bytes %eth_contract) (pair %token_address address nat))
+                         (pair %add_erc721 (bytes %eth_contract) (address %token_contract)))
+                     (or (pair %mint_erc20
+                            (bytes %erc_20)
+                            (pair (pair %event_id (bytes %block_hash) (nat %log_index))
+                                  (pair (address %owner) (nat %amount))))
+                         (list %mint_erc20_batch
+                            (pair (bytes %erc_20)
+                                  (pair (pair %event_id (bytes %block_hash) (nat %log_index))
+                                        (pair (address %owner) (nat %amount)))))))
+                 (or (pair %mint_erc721
+                        (bytes %erc_721)
+                        (pair (pair %event_id (bytes %block_hash) (nat %log_index))
+                              (pair (address %owner) (nat %token_id))))
+                     (list %mint_erc721_batch
+                        (pair (bytes %erc_721)
+                              (pair (pair %event_id (bytes %block_hash) (nat %log_index))
+                                    (pair (address %owner) (nat %token_id)))))))"""
+minter_payload_type = michelson_to_micheline(f"(pair (pair chain_id address) (pair {signer_ep} address))")
+minter_batch_payload_type = michelson_to_micheline(
+    f"(pair (pair chain_id address) (list (pair {signer_ep} address)))")
+payment_address_payload_type = michelson_to_micheline("(pair (pair chain_id address) (pair nat (pair address address)))")
+
+
+def signer(index):
+    """
+    Returns a deterministic quorum signer, so signatures and parameter sizes
+    are identical from one run to the other.
+    :return: (signer id, pytezos.Key)
+    """
+    seed = hashlib.sha256(f"bench-signer-{index}".encode()).digest()
+    return f"k51qzi5uqu5d{seed.hex()[:50]}", Key.from_secret_exponent(seed)
+
+
+def signers(count):
+    return [signer(i) for i in range(count)]
+
+
+def implicit_address(index):
+    seed = hashlib.sha256(f"bench-account-{index}".encode()).digest()
+    return Key.from_secret_exponent(seed).public_key_hash()
+
+
+def originate_targets(client):
+    """
+    Originates the contracts the benchmarked entrypoints call on the sandbox.
+    :param client: PyTezosClient using admin_key
+    :return: dict of contract name to address
+    """
+    names = ["multi_asset", "nft", "governance_token", "minter"]
+    storages = [multi_asset_storage(), nft_storage(), governance_token_storage(),
+                minter_storage({"multi_asset": self_address, "nft": self_address})]
+    originations = [load_contract_file(michelson_dir / f"{name}.tz").originate(initial_storage=storage)
+                    for name, storage in zip(names, storages)]
+    opg = client.bulk(*originations).autofill().sign().inject(_async=False)
+    return dict(zip(names, OperationResult.originated_contracts(opg)))
+
+
+def minter_storage(targets, fees_ratio=100, nft_fees=500_000, mints=10, fee_holders=(), fee_tokens=2,
+                   shareholders=()):
+    """
+    :param targets: addresses returned by originate_targets
+    :param mints: number of already processed mints
+    :param fee_holders: addresses holding xtz and token fees
+    :param fee_tokens: number of multi_asset token ids held as fees
+    :param shareholders: payment addresses of the signers of the last distribution
+    """
+    fa2 = targets["multi_asset"]
+    tokens = {(self_address, fa2, token_id): 10_000 for token_id in range(fee_tokens)}
+    xtz = {self_address: 1_000_000}
+    for holder in fee_holders:
+        tokens.update({(holder, fa2, token_id): 1_000 for token_id in range(fee_tokens)})
+        xtz[holder] = 1_000_000
+    return {
+        "admin": {
+            "administrator": admin,
+            "signer": admin,
+            "oracle": admin,
+            "paused": False
+        },
+        "assets": {
+            "erc20_tokens": {eth_token: [fa2, 0], bytes(20): [fa2, 1]},
+            "erc721_tokens": {eth_nft: targets["nft"]},
+            "mints": {mint_key(hashlib.sha256(bytes(i)).digest(), i): None for i in range(mints)}
+        },
+        "governance": {
+            "contract": admin,
+            "staking": staking_pool,
+            "dev_pool": dev_pool,
+            "erc20_wrapping_fees": fees_ratio,
+            "erc20_unwrapping_fees": fees_ratio,
+            "erc721_wrapping_fees": nft_fees,
+            "erc721_unwrapping_fees": nft_fees,
+            "fees_share": {
+                "dev_pool": 10,
+                "staking": 40,
+                "signers": 50
+            }
+        },
+        "fees": {
+            "signers": {},
+            "tokens": tokens,
+            "xtz": xtz,
+            "shares": {
+                "holders": {address: 1 for address in shareholders},
+                "tokens": [],
+                "tokens_per_share": {},
+                "xtz_per_share": 0,
+                "token_checkpoints": {},
+                "xtz_checkpoints": {}
+            }
+        },
+        "metadata": {}
+    }
+
+
+def quorum_storage(quorum, threshold=1):
+    """
+    :param quorum: list of (signer id, Key)
+    """
+    return {
+        "admin": admin,
+        "threshold": threshold,
+        "signers": {signer_id: key.public_key() for signer_id, key in quorum},
+        "counters": {},
+        "metadata": {}
+    }
+
+
+def multi_asset_storage(holders=(), tokens=2, pending_admin=None):
+    """
+    :param holders: addresses holding 1000 units of every token
+    """
+    return {
+        "admin": {
+            "admin": admin,
+            "pending_admin": pending_admin,
+            "paused": {},
+            "minter": admin
+        },
+        "assets": {
+            "ledger": {(holder, token_id): 1_000 for holder in holders for token_id in range(tokens)},
+            "operators": {},
+            "token_metadata": {token_id: {"token_id": token_id, "token_info": {"decimals": b"8"}}
+                               for token_id in range(tokens)},
+            "token_total_supply": {token_id: 1_000 * len(holders) for token_id in range(tokens)}
+        },
+        "metadata": {}
+    }
+
+
+def nft_storage(owners=None, pending_admin=None):
+    """
+    :param owners: dict of token id to owner
+    """
+    return {
+        "admin": {
+            "admin": admin,
+            "pending_admin": pending_admin,
+            "paused": False,
+            "minter": admin
+        },
+        "assets": {
+            "ledger": owners or {},
+            "operators": {},
+            "token_info": {"decimals": b"0"}
+        },
+        "metadata": {}
+    }
+
+
+def governance_token_storage(holders=(), pending_admin=None, pending_oracle=None):
+    """
+    :param holders: addresses holding 1000 tokens
+    """
+    return {
+        "admin": {
+            "admin": admin,
+            "paused": False,
+            "pending_admin": pending_admin,
+            "minter": admin
+        },
+        "metadata": {},
+        "assets": {
+            "ledger": {holder: 1_000 for holder in holders},
+            "operators": {},
+            "token_metadata": {0: {"token_id": 0, "token_info": {"decimals": b"8"}}},
+            "total_supply": 1_000 * len(holders),
+        },
+        "oracle": {
+            "role": {
+                "contract": admin,
+                "pending_contract": pending_oracle
+            },
+            "max_supply": 100_000_000 * 10 ** 8,
+            "distributed": 1_000 * len(holders)
+        }
+    }
+
+
+def mint_erc20_parameters(log_index=1, owner=user, amount=10 ** 18):
+    return {"erc_20": eth_token,
+            "event_id": {"block_hash": block_hash, "log_index": log_index},
+            "owner": owner,
+            "amount": amount}
+
+
+def mint_erc721_parameters(log_index=1, owner=user, token_id=1):
+    return {"erc_721": eth_nft,
+            "event_id": {"block_hash": block_hash, "log_index": log_index},
+            "owner": owner,
+            "token_id": token_id}
+
+
+def quorum_minter_parameters(quorum, chain_id, minter, mint=None):
+    """
+    Builds a quorum `minter` call signed by every signer of the quorum,
+    signatures sorted by signer id.
+    :param quorum: list of (signer id, Key)
+    :param chain_id: chain id of the node running the call
+    :param minter: address of the minter contract
+    """
+    mint = mint or mint_erc20_parameters()
+    call = f"(Left (Right (Left (Pair 0x{mint['erc_20'].hex()} " \
+           f"(Pair (Pair 0x{mint['event_id']['block_hash'].hex()} {mint['event_id']['log_index']}) " \
+           f"(Pair \"{mint['owner']}\" {mint['amount']}))))))"
+    payload = michelson_to_micheline(f"(Pair (Pair \"{chain_id}\" \"{self_address}\") (Pair {call} \"{minter}\"))")
+    packed = MichelsonType.match(minter_payload_type).from_micheline_value(payload).pack()
+    return {
+        "signatures": [[signer_id, key.sign(packed)] for signer_id, key in sorted(quorum, key=lambda s: s[0])],
+        "action": {"entrypoint": {"mint_erc20": mint}, "target": minter}
+    }
+
+
+def quorum_minter_batch_parameters(quorum, chain_id, minter, mints):
+    """
+    Builds a quorum `minter_batch` call of erc20 mints signed by every signer of the quorum.
+    :param mints: list of mint_erc20_parameters
+    """
+    calls = [f"(Pair (Left (Right (Left (Pair 0x{mint['erc_20'].hex()} "
+             f"(Pair (Pair 0x{mint['event_id']['block_hash'].hex()} {mint['event_id']['log_index']}) "
+             f"(Pair \"{mint['owner']}\" {mint['amount']})))))) \"{minter}\")" for mint in mints]
+    payload = michelson_to_micheline(f"(Pair (Pair \"{chain_id}\" \"{self_address}\") {{ {'; '.join(calls)} }})")
+    packed = MichelsonType.match(minter_batch_payload_type).from_micheline_value(payload).pack()
+    return {
+        "signatures": [[signer_id, key.sign(packed)] for signer_id, key in sorted(quorum, key=lambda s: s[0])],
+        "actions": [{"entrypoint": {"mint_erc20": mint}, "target": minter} for mint in mints],
+        "amounts": []
+    }
+
+
+def payment_address_parameters(quorum_signer, chain_id, minter, payment_address, counter=0):
+    signer_id, key = quorum_signer
+    packed = MichelsonType.match(payment_address_payload_type) \
+        .from_python_object([chain_id, self_address, counter, minter, payment_address]).pack()
+    return {"minter_contract": minter, "signer_id": signer_id, "signature": key.sign(packed)}
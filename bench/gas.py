@@ -0,0 +1,381 @@
+"""
+Measures every contract entrypoint against representative storages: gas
+consumed by the script, storage size delta and parameter size. Results are
+compared with bench/gas_baseline.json and the run fails when an entrypoint
+got more expensive than the baseline allows, or is missing from it. Without
+a baseline file the measures are only reported.
+
+pytezos' interpreter does not meter gas, so scripts are run by the sandbox
+node (scripts/start-sandbox.sh) through helpers/scripts/trace_code, which
+runs the code against the given storage without injecting anything.
+
+    python -m bench.gas --tolerance=0.01
+    python -m bench.gas --update
+"""
+import json
+import math
+from decimal import Decimal
+from pathlib import Path
+
+import fire
+from pytezos import pytezos
+from pytezos.michelson.forge import forge_micheline
+from pytezos.michelson.sections import StorageSection
+
+from bench import fixtures
+from bench.fixtures import admin, user, other_party, dev_pool, self_address, eth_destination
+from src.ligo import load_contract_file
+
+baseline_file = Path(__file__).parent / "gas_baseline.json"
+gas_limit = 1_040_000
+metrics = ("gas", "storage", "parameter")
+
+
+class Case:
+    def __init__(self, contract, entrypoint, parameters, storage, sender=admin, amount=0, name=None):
+        """
+        :param contract: contract name, as in builder.contracts
+        :param entrypoint: entrypoint called
+        :param parameters: entrypoint parameters as a python object
+        :param storage: initial storage as a python object
+        :param sender: SENDER and SOURCE of the call
+        :param amount: mutez sent with the call
+        :param name: key of the case in the baseline, defaults to the entrypoint
+        """
+        self.contract = contract
+        self.entrypoint = entrypoint
+        self.parameters = parameters
+        self.storage = storage
+        self.sender = sender
+        self.amount = amount
+        self.name = name or entrypoint
+
+
+def cases(targets, chain_id):
+    """
+    Lists one successful call per entrypoint. FA2 `balance_of` is left out: its
+    callback has to be an originated contract accepting the balances.
+    :param targets: addresses returned by fixtures.originate_targets
+    :param chain_id: chain id of the node running the calls
+    """
+    fa2, nft, minter = targets["multi_asset"], targets["nft"], targets["minter"]
+    holder = fixtures.implicit_address(0)
+    quorum = fixtures.signers(3)
+    quorum_addresses = [key.public_key_hash() for _, key in quorum]
+
+    def minter_storage(**kwargs):
+        return fixtures.minter_storage(targets, fee_holders=[holder, dev_pool], **kwargs)
+
+    return [
+        Case("minter", "pause_contract", True, minter_storage()),
+        Case("minter", "set_administrator", other_party, minter_storage()),
+        Case("minter", "set_oracle", other_party, minter_storage()),
+        Case("minter", "set_signer", other_party, minter_storage()),
+        Case("minter", "withdraw_all_tokens", {"fa2": fa2, "tokens": [0, 1]}, minter_storage(), sender=holder),
+        Case("minter", "withdraw_all_xtz", None, minter_storage(), sender=holder),
+        Case("minter", "withdraw_token", {"fa2": fa2, "token_id": 0, "amount": 100}, minter_storage(),
+             sender=holder),
+        Case("minter", "withdraw_xtz", 100, minter_storage(), sender=holder),
+        Case("minter", "set_erc20_unwrapping_fees", 50, minter_storage()),
+        Case("minter", "set_erc20_wrapping_fees", 50, minter_storage()),
+        Case("minter", "set_erc721_unwrapping_fees", 100_000, minter_storage()),
+        Case("minter", "set_erc721_wrapping_fees", 100_000, minter_storage()),
+        Case("minter", "set_fees_share", {"dev_pool": 20, "signers": 40, "staking": 40}, minter_storage()),
+        Case("minter", "set_governance", other_party, minter_storage()),
+        Case("minter", "distribute_tokens", {"signers": quorum_addresses, "tokens": [[fa2, 0], [fa2, 1]]},
+             minter_storage(shareholders=quorum_addresses)),
+        Case("minter", "distribute_tokens", {"signers": quorum_addresses, "tokens": [[fa2, 0], [fa2, 1]]},
+             minter_storage(), name="distribute_tokens_new_signers"),
+        Case("minter", "distribute_xtz", quorum_addresses, minter_storage(shareholders=quorum_addresses)),
+        Case("minter", "add_erc20", {"eth_contract": b"\x01" * 20, "token_address": [fa2, 2]}, minter_storage()),
+        Case("minter", "add_erc721", {"eth_contract": b"\x01" * 20, "token_contract": nft}, minter_storage()),
+        Case("minter", "mint_erc20", fixtures.mint_erc20_parameters(log_index=100), minter_storage()),
+        Case("minter", "mint_erc721", fixtures.mint_erc721_parameters(log_index=100), minter_storage(),
+             amount=500_000),
+        Case("minter", "mint_erc20_batch",
+             [fixtures.mint_erc20_parameters(log_index=100 + i) for i in range(10)], minter_storage(),
+             name="mint_erc20_batch_10"),
+        Case("minter", "mint_erc721_batch",
+             [fixtures.mint_erc721_parameters(log_index=100 + i, token_id=100 + i) for i in range(10)],
+             minter_storage(), amount=5_000_000, name="mint_erc721_batch_10"),
+        Case("minter", "signer_ops", {"signer": quorum_addresses[0], "payment_address": holder},
+             minter_storage()),
+        Case("minter", "unwrap_erc20",
+             {"erc_20": fixtures.eth_token, "amount": 10 ** 18, "fees": 10 ** 16, "destination": eth_destination},
+             minter_storage(), sender=user),
+        Case("minter", "unwrap_erc721",
+             {"erc_721": fixtures.eth_nft, "token_id": 1, "destination": eth_destination},
+             minter_storage(), sender=user, amount=500_000),
+
+        Case("quorum", "change_quorum", [2, {i: key.public_key() for i, key in quorum}],
+             fixtures.quorum_storage(quorum)),
+        Case("quorum", "change_threshold", 2, fixtures.quorum_storage(quorum)),
+        Case("quorum", "set_admin", other_party, fixtures.quorum_storage(quorum)),
+        Case("quorum", "distribute_tokens_with_quorum", {"minter_contract": minter, "tokens": [[fa2, 0], [fa2, 1]]},
+             fixtures.quorum_storage(quorum)),
+        Case("quorum", "distribute_xtz_with_quorum", minter, fixtures.quorum_storage(quorum)),
+        Case("quorum", "minter", fixtures.quorum_minter_parameters(quorum[:1], chain_id, minter),
+             fixtures.quorum_storage(quorum), sender=user),
+        Case("quorum", "minter", fixtures.quorum_minter_parameters(quorum[:2], chain_id, minter),
+             fixtures.quorum_storage(quorum, threshold=2), sender=user, name="minter_2_of_3"),
+        Case("quorum", "minter", fixtures.quorum_minter_parameters(quorum, chain_id, minter),
+             fixtures.quorum_storage(quorum, threshold=2), sender=user, name="minter_3_signatures_2_of_3"),
+        Case("quorum", "minter_batch",
+             fixtures.quorum_minter_batch_parameters(
+                 quorum[:2], chain_id, minter, [fixtures.mint_erc20_parameters(log_index=i) for i in range(10)]),
+             fixtures.quorum_storage(quorum, threshold=2), sender=user, name="minter_batch_10_2_of_3"),
+        Case("quorum", "set_signer_payment_address",
+             fixtures.payment_address_parameters(quorum[0], chain_id, minter, holder),
+             fixtures.quorum_storage(quorum), sender=holder),
+
+        Case("multi_asset", "create_token", {"token_id": 2, "token_info": {"decimals": b"8"}},
+             fixtures.multi_asset_storage([user])),
+        Case("multi_asset", "confirm_admin", None, fixtures.multi_asset_storage([user], pending_admin=other_party),
+             sender=other_party),
+        Case("multi_asset", "pause", [{"token_id": 0, "paused": True}], fixtures.multi_asset_storage([user])),
+        Case("multi_asset", "set_admin", other_party, fixtures.multi_asset_storage([user])),
+        Case("multi_asset", "set_minter", minter, fixtures.multi_asset_storage([user])),
+        Case("multi_asset", "transfer", [{"from_": user, "txs": [{"to_": other_party, "token_id": 0, "amount": 10}]}],
+             fixtures.multi_asset_storage([user]), sender=user),
+        Case("multi_asset", "update_operators",
+             [{"add_operator": {"owner": user, "operator": other_party, "token_id": 0}}],
+             fixtures.multi_asset_storage([user]), sender=user),
+        Case("multi_asset", "burn_tokens", [{"owner": user, "token_id": 0, "amount": 10}],
+             fixtures.multi_asset_storage([user])),
+        Case("multi_asset", "mint_tokens", [{"owner": other_party, "token_id": 0, "amount": 10}],
+             fixtures.multi_asset_storage([user])),
+
+        Case("nft", "confirm_admin", None, fixtures.nft_storage({1: user}, pending_admin=other_party),
+             sender=other_party),
+        Case("nft", "pause", [{"token_id": 1, "paused": True}], fixtures.nft_storage({1: user})),
+        Case("nft", "set_admin", other_party, fixtures.nft_storage({1: user})),
+        Case("nft", "set_minter", minter, fixtures.nft_storage({1: user})),
+        Case("nft", "transfer", [{"from_": user, "txs": [{"to_": other_party, "token_id": 1, "amount": 1}]}],
+             fixtures.nft_storage({1: user}), sender=user),
+        Case("nft", "update_operators", [{"add_operator": {"owner": user, "operator": other_party, "token_id": 1}}],
+             fixtures.nft_storage({1: user}), sender=user),
+        Case("nft", "burn_tokens", [{"owner": user, "token_id": 1, "amount": 1}], fixtures.nft_storage({1: user})),
+        Case("nft", "mint_tokens", [{"owner": user, "token_id": 2, "amount": 1}], fixtures.nft_storage({1: user})),
+
+        Case("governance_token", "confirm_admin", None,
+             fixtures.governance_token_storage([user], pending_admin=other_party), sender=other_party),
+        Case("governance_token", "pause", [{"token_id": 0, "paused": True}],
+             fixtures.governance_token_storage([user])),
+        Case("governance_token", "set_admin", other_party, fixtures.governance_token_storage([user])),
+        Case("governance_token", "set_minter", minter, fixtures.governance_token_storage([user])),
+        Case("governance_token", "transfer",
+             [{"from_": user, "txs": [{"to_": other_party, "token_id": 0, "amount": 10}]}],
+             fixtures.governance_token_storage([user]), sender=user),
+        Case("governance_token", "update_operators",
+             [{"add_operator": {"owner": user, "operator": other_party, "token_id": 0}}],
+             fixtures.governance_token_storage([user]), sender=user),
+        Case("governance_token", "confirm_oracle_migration", None,
+             fixtures.governance_token_storage([user], pending_oracle=other_party), sender=other_party),
+        Case("governance_token", "distribute", [{"to_": other_party, "amount": 10}],
+             fixtures.governance_token_storage([user])),
+        Case("governance_token", "migrate_oracle", other_party, fixtures.governance_token_storage([user])),
+        Case("governance_token", "burn_tokens", [{"owner": user, "token_id": 0, "amount": 10}],
+             fixtures.governance_token_storage([user])),
+        Case("governance_token", "mint_tokens", [{"owner": other_party, "token_id": 0, "amount": 10}],
+             fixtures.governance_token_storage([user])),
+    ]
+
+
+class Runner:
+    def __init__(self, client, gas_limit=gas_limit):
+        """
+        :param client: PyTezosClient connected to the sandbox
+        :param gas_limit: gas available to each call
+        """
+        self.client = client
+        self.gas_limit = gas_limit
+        self.chain_id = client.shell.chains.main.chain_id()
+        self._contracts = {}
+
+    def contract(self, name):
+        if name not in self._contracts:
+            self._contracts[name] = load_contract_file(fixtures.michelson_dir / f"{name}.tz")
+        return self._contracts[name]
+
+    def trace(self, case):
+        """
+        Runs the case on the node.
+        :return: (trace_code response, initial storage as Micheline, parameter as Micheline)
+        """
+        contract = self.contract(case.contract)
+        storage_ty = StorageSection.match(contract.context.storage_expr)
+        storage = storage_ty.from_python_object(case.storage).to_micheline_value(mode="optimized")
+        parameters = getattr(contract, case.entrypoint).encode(case.parameters, mode="optimized")
+        query = {
+            "script": [contract.context.parameter_expr, contract.context.storage_expr, contract.context.code_expr],
+            "storage": storage,
+            "entrypoint": parameters["entrypoint"],
+            "input": parameters["value"],
+            "amount": str(case.amount),
+            "balance": "0",
+            "chain_id": self.chain_id,
+            "source": case.sender,
+            "payer": case.sender,
+            "gas": str(self.gas_limit),
+        }
+        return self.client.shell.blocks["head"].helpers.scripts.trace_code.post(query), storage, parameters
+
+    def measure(self, case):
+        """
+        :return: dict with consumed gas, storage size delta in bytes and parameter size in bytes
+        """
+        result, storage, parameters = self.trace(case)
+        contract = self.contract(case.contract)
+        storage_expr = contract.context.storage_expr
+        final_storage = _materialize(storage_expr["args"][0], result["storage"], _big_maps(result))
+        return {
+            "gas": consumed_gas(result, self.gas_limit),
+            "storage": storage_size(storage_expr, final_storage) - storage_size(storage_expr, storage),
+            "parameter": len(forge_micheline(parameters["value"])),
+        }
+
+
+def consumed_gas(trace_result, limit=gas_limit):
+    remaining = min(Decimal(step["gas"]) for step in trace_result["trace"])
+    return math.ceil(limit - remaining)
+
+
+def storage_size(storage_expr, value):
+    """
+    Size of the binary encoded storage, big_map contents included.
+    :param storage_expr: Micheline `storage` section of the contract
+    :param value: storage value where big maps are literals
+    """
+    value = StorageSection.match(storage_expr).from_micheline_value(value).to_micheline_value(mode="optimized")
+    return len(forge_micheline(value))
+
+
+def _big_maps(trace_result):
+    """
+    Rebuilds the content of every big_map of a run_code/trace_code result from
+    its lazy storage diff: big maps given as literals come back as fresh ids
+    whose diff lists every entry.
+    :return: dict of big_map id to dict of key hash to (key, value)
+    """
+    big_maps = {}
+    for diff in trace_result.get("lazy_storage_diff", []):
+        if diff["kind"] != "big_map":
+            continue
+        action = diff["diff"]["action"]
+        if action == "remove":
+            big_maps.pop(diff["id"], None)
+            continue
+        entries = dict(big_maps.get(diff["diff"]["source"], {})) if action == "copy" else {}
+        entries.update(big_maps.get(diff["id"], {}) if action == "update" else {})
+        for update in diff["diff"].get("updates", []):
+            if "value" in update:
+                entries[update["key_hash"]] = (update["key"], update["value"])
+            else:
+                entries.pop(update["key_hash"], None)
+        big_maps[diff["id"]] = entries
+    return big_maps
+
+
+def _materialize(ty, value, big_maps):
+    """
+    Replaces big_map ids by their content in a Micheline value of type ty.
+    """
+    prim = ty.get("prim")
+    args = ty.get("args", [])
+    if prim == "big_map" and isinstance(value, dict) and "int" in value:
+        return [{"prim": "Elt", "args": [k, v]} for k, v in big_maps.get(value["int"], {}).values()]
+    if prim == "pair":
+        items = value if isinstance(value, list) else value["args"]
+        right_ty = args[1] if len(args) == 2 else {"prim": "pair", "args": args[1:]}
+        right = items[1] if len(items) == 2 else {"prim": "Pair", "args": items[1:]}
+        return {"prim": "Pair", "args": [_materialize(args[0], items[0], big_maps),
+                                         _materialize(right_ty, right, big_maps)]}
+    if prim == "or":
+        branch = args[0] if value["prim"] == "Left" else args[1]
+        return {"prim": value["prim"], "args": [_materialize(branch, value["args"][0], big_maps)]}
+    if prim == "option" and value["prim"] == "Some":
+        return {"prim": "Some", "args": [_materialize(args[0], value["args"][0], big_maps)]}
+    if prim in ("list", "set"):
+        return [_materialize(args[0], item, big_maps) for item in value]
+    if prim in ("map", "big_map"):
+        return [{"prim": "Elt", "args": [elt["args"][0], _materialize(args[1], elt["args"][1], big_maps)]}
+                for elt in value]
+    return value
+
+
+def compare(results, baseline, tolerance):
+    """
+    :param results: dict of contract to case name to metrics
+    :param baseline: same structure, as loaded from the baseline file
+    :param tolerance: relative increase allowed before a metric is a regression
+    :return: list of regression descriptions, entrypoints missing from the
+    baseline included
+    """
+    regressions = []
+    for contract, entrypoints in results.items():
+        for name, measured in entrypoints.items():
+            reference = baseline.get(contract, {}).get(name)
+            if reference is None:
+                regressions.append(f"{contract}.{name}: not in the baseline, record it with --update")
+                continue
+            for metric in metrics:
+                allowed = reference[metric] + abs(reference[metric]) * tolerance
+                if measured[metric] > allowed:
+                    regressions.append(f"{contract}.{name} {metric}: {reference[metric]} -> {measured[metric]}")
+    return regressions
+
+
+def _report(results, baseline):
+    print(f"{'entrypoint':<50}{'gas':>10}{'storage':>10}{'param':>8}")
+    for contract, entrypoints in results.items():
+        for name, measured in entrypoints.items():
+            reference = baseline.get(contract, {}).get(name)
+            line = f"{contract + '.' + name:<50}" + "".join(
+                f"{measured[m]:>{w}}" for m, w in zip(metrics, (10, 10, 8)))
+            if reference is None:
+                line += "   (new)"
+            elif reference != measured:
+                line += "   was " + "/".join(str(reference[m]) for m in metrics)
+            print(line)
+
+
+def run(shell="http://localhost:8732", tolerance=0.0, update=False, only=None, baseline=str(baseline_file)):
+    """
+    :param shell: RPC of the sandbox node
+    :param tolerance: relative increase allowed per metric, 0.02 for 2%
+    :param update: write the measures to the baseline instead of checking them
+    :param only: comma separated contract names to measure, all of them by default
+    :param baseline: path to the baseline file
+    """
+    client = pytezos.using(shell=shell, key=fixtures.admin_key)
+    targets = fixtures.originate_targets(client)
+    runner = Runner(client)
+    contracts = only.split(",") if isinstance(only, str) else only
+    results = {}
+    for case in cases(targets, runner.chain_id):
+        if contracts and case.contract not in contracts:
+            continue
+        results.setdefault(case.contract, {})[case.name] = runner.measure(case)
+
+    baseline_path = Path(baseline)
+    reference = json.loads(baseline_path.read_text()) if baseline_path.exists() else {}
+    _report(results, reference)
+    if update:
+        for contract, entrypoints in results.items():
+            reference.setdefault(contract, {}).update(entrypoints)
+        baseline_path.write_text(json.dumps(reference, indent=2, sort_keys=True) + "\n")
+        print(f"Baseline written to {baseline_path}")
+        return
+    if not baseline_path.exists():
+        print(f"No baseline in {baseline_path}, nothing to compare: record it with --update")
+        return
+    regressions = compare(results, reference, tolerance)
+    if regressions:
+        print("Regressions:")
+        for r in regressions:
+            print(f"  {r}")
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    fire.Fire(run)
@@ -0,0 +1,74 @@
+"""
+Storage paid per mint for the replay protection of the minter, with mints
+keyed by event id (the former layout) and by the blake2b hash of the packed
+event id.
+
+A new big_map entry is charged 65 bytes plus the binary size of its key and
+value, as counted by src.preflight.big_map_size_diff. The hash is a 32 bytes
+key whatever the log index, shorter than the block hash and log index pair,
+so every mint pays less however events are spread over ethereum blocks.
+
+Events are drawn per ethereum block, log indexes spread over the block as
+the bridge's events are among the other contracts' logs.
+
+    python -m bench.mints_storage --events=10000 --events_per_block=1,2,4,8
+"""
+import hashlib
+import random
+
+import fire
+
+from src.indexer import mint_key
+from src.preflight import big_map_entry_size, expr_size
+
+max_log_index = 300
+
+
+def event_ids(events, events_per_block, seed=0):
+    """
+    :return: list of (block hash, log index), events_per_block events for each block
+    """
+    rng = random.Random(seed)
+    ids = []
+    for block in range(0, events, events_per_block):
+        block_hash = hashlib.sha256(block.to_bytes(8, "big")).digest()
+        count = min(events_per_block, events - block)
+        ids.extend((block_hash, log_index) for log_index in sorted(rng.sample(range(max_log_index), count)))
+    return ids
+
+
+def by_event_id(ids):
+    """
+    :return: bytes paid by each mint when mints are (eth_event_id, unit) big_map
+    """
+    return [big_map_entry_size + expr_size(_event_id(block_hash, log_index)) + expr_size({"prim": "Unit"})
+            for block_hash, log_index in ids]
+
+
+def by_hash(ids):
+    """
+    :return: bytes paid by each mint when mints are (bytes, unit) big_map keyed by src.indexer.mint_key
+    """
+    return [big_map_entry_size + expr_size({"bytes": mint_key(block_hash, log_index).hex()})
+            + expr_size({"prim": "Unit"}) for block_hash, log_index in ids]
+
+
+def _event_id(block_hash, log_index):
+    return {"prim": "Pair", "args": [{"bytes": block_hash.hex()}, {"int": str(log_index)}]}
+
+
+def run(events=10_000, events_per_block=(1, 2, 4, 8)):
+    """
+    :param events: number of mints
+    :param events_per_block: comma separated numbers of bridge events per ethereum block
+    """
+    counts = [events_per_block] if isinstance(events_per_block, int) else list(events_per_block)
+    print(f"{'events/block':<14}{'by event id':>14}{'by hash':>12}{'saved':>8}")
+    for count in counts:
+        ids = event_ids(events, count)
+        former, hashed = sum(by_event_id(ids)), sum(by_hash(ids))
+        print(f"{count:<14}{former / events:>14.1f}{hashed / events:>12.1f}{1 - hashed / former:>8.0%}")
+
+
+if __name__ == '__main__':
+    fire.Fire(run)
@@ -0,0 +1,237 @@
+"""
+Measures how entrypoints folding over caller supplied lists scale with the
+list size, and finds the largest list each of them accepts under the
+operation gas limit.
+
+Every series is run on the sandbox node for each size (gas, through
+helpers/scripts/trace_code) and on pytezos' interpreter (wall time). A
+polynomial of degree 2 at most is fitted on the gas measures, its estimate
+is then checked on the node by bisection between the sizes that fit and the
+first one that does not.
+
+    python -m bench.scaling --sizes=1,10,100 --series_names=quorum_signatures
+    python -m bench.scaling --output=bench/batch_limits.json
+"""
+import json
+import time
+from pathlib import Path
+
+import fire
+from pytezos import pytezos
+from pytezos.rpc.node import RpcError
+
+from bench import fixtures
+from bench.fixtures import admin, user
+from bench.gas import Case, Runner, gas_limit
+
+default_output = Path(__file__).parent / "batch_limits.json"
+
+
+class Series:
+    def __init__(self, name, build, description):
+        """
+        :param name: series name, key of the output file
+        :param build: function returning the Case for a list size
+        :param description: what the list size counts
+        """
+        self.name = name
+        self.build = build
+        self.description = description
+
+
+def series(targets, chain_id):
+    fa2, minter = targets["multi_asset"], targets["minter"]
+
+    def quorum_signatures(n):
+        quorum = fixtures.signers(n)
+        return Case("quorum", "minter", fixtures.quorum_minter_parameters(quorum, chain_id, minter),
+                    fixtures.quorum_storage(quorum, threshold=n), sender=user)
+
+    def distribute_tokens(n):
+        signers = [key.public_key_hash() for _, key in fixtures.signers(3)]
+        return Case("minter", "distribute_tokens",
+                    {"signers": signers, "tokens": [[fa2, i] for i in range(n)]},
+                    fixtures.minter_storage(targets, fee_tokens=n, shareholders=signers))
+
+    def distribute_tokens_signers(n):
+        signers = [key.public_key_hash() for _, key in fixtures.signers(n)]
+        return Case("minter", "distribute_tokens", {"signers": signers, "tokens": [[fa2, 0], [fa2, 1]]},
+                    fixtures.minter_storage(targets, shareholders=signers))
+
+    def withdraw_all_tokens(n):
+        holder = fixtures.implicit_address(0)
+        return Case("minter", "withdraw_all_tokens", {"fa2": fa2, "tokens": list(range(n))},
+                    fixtures.minter_storage(targets, fee_holders=[holder], fee_tokens=n), sender=holder)
+
+    def fa2_transfer(n):
+        txs = [{"to_": fixtures.implicit_address(i), "token_id": 0, "amount": 1} for i in range(n)]
+        return Case("multi_asset", "transfer", [{"from_": user, "txs": txs}],
+                    fixtures.multi_asset_storage([user]), sender=user)
+
+    def governance_distribute(n):
+        return Case("governance_token", "distribute",
+                    [{"to_": fixtures.implicit_address(i), "amount": 1} for i in range(n)],
+                    fixtures.governance_token_storage([user]), sender=admin)
+
+    return [
+        Series("quorum_signatures", quorum_signatures, "signatures checked by quorum %minter"),
+        Series("distribute_tokens", distribute_tokens, "tokens distributed to 3 signers"),
+        Series("distribute_tokens_signers", distribute_tokens_signers, "signers sharing 2 tokens"),
+        Series("withdraw_all_tokens", withdraw_all_tokens, "token ids withdrawn"),
+        Series("fa2_transfer", fa2_transfer, "txs of a single multi_asset transfer"),
+        Series("governance_distribute", governance_distribute, "$WRAP distributions"),
+    ]
+
+
+def fit(points, degree=2):
+    """
+    Least squares polynomial fit.
+    :param points: list of (size, gas)
+    :param degree: highest degree, lowered when there are not enough points
+    :return: coefficients, constant term first
+    """
+    degree = min(degree, len(points) - 1)
+    size = degree + 1
+    # normal equations (X^T X) c = X^T y, solved by Gauss-Jordan elimination
+    matrix = [[sum(x ** (i + j) for x, _ in points) for j in range(size)] + [sum(y * x ** i for x, y in points)]
+              for i in range(size)]
+    for col in range(size):
+        pivot = max(range(col, size), key=lambda r: abs(matrix[r][col]))
+        matrix[col], matrix[pivot] = matrix[pivot], matrix[col]
+        for row in range(size):
+            if row != col:
+                factor = matrix[row][col] / matrix[col][col]
+                matrix[row] = [a - factor * b for a, b in zip(matrix[row], matrix[col])]
+    return [matrix[i][size] / matrix[i][i] for i in range(size)]
+
+
+def evaluate(coefficients, n):
+    return sum(c * n ** i for i, c in enumerate(coefficients))
+
+
+def estimate_max_size(coefficients, limit, upper=1_000_000):
+    """
+    Largest size whose fitted gas stays under limit, assuming gas grows with size.
+    """
+    if evaluate(coefficients, 1) > limit:
+        return 0
+    low, high = 1, upper
+    while low < high:
+        middle = (low + high + 1) // 2
+        if evaluate(coefficients, middle) <= limit:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+class Sweep:
+    def __init__(self, runner, limit=gas_limit, max_size=5_000):
+        """
+        :param runner: bench.gas.Runner, created with the gas limit to check
+        :param limit: gas limit the batch has to fit in
+        :param max_size: largest list size ever tried
+        """
+        self.runner = runner
+        self.limit = limit
+        self.max_size = max_size
+
+    def gas(self, case):
+        """
+        :return: consumed gas, None if the call runs out of gas
+        """
+        try:
+            return self.runner.measure(case)["gas"]
+        except RpcError as e:
+            if "gas_exhausted" in str(e):
+                return None
+            raise
+
+    def wall_time(self, case):
+        contract = self.runner.contract(case.contract)
+        call = getattr(contract, case.entrypoint)(case.parameters)
+        start = time.perf_counter()
+        call.interpret(storage=case.storage, sender=case.sender, source=case.sender, amount=case.amount,
+                       chain_id=self.runner.chain_id, self_address=fixtures.self_address)
+        return time.perf_counter() - start
+
+    def run(self, s, sizes):
+        """
+        :return: dict with measured points, fitted coefficients and the largest size under the limit
+        """
+        points = []
+        exhausted = None
+        for n in sizes:
+            case = s.build(n)
+            gas = self.gas(case)
+            if gas is None:
+                exhausted = n
+                break
+            points.append({"size": n, "gas": gas, "wall_time": self.wall_time(case)})
+
+        coefficients = fit([(p["size"], p["gas"]) for p in points]) if len(points) > 1 else None
+        max_size = self._search(s, points, exhausted, coefficients)
+        return {"description": s.description, "points": points, "fit": coefficients, "max_size": max_size,
+                "gas_limit": self.limit}
+
+    def _search(self, s, points, exhausted, coefficients):
+        fits = max((p["size"] for p in points), default=0)
+        fails = exhausted
+        if fails is None:
+            probe = estimate_max_size(coefficients, self.limit, self.max_size) + 1 if coefficients else fits * 2
+            probe = min(max(probe, fits + 1), self.max_size)
+            while fails is None and fits < self.max_size:
+                if self.gas(s.build(probe)) is None:
+                    fails = probe
+                else:
+                    fits, probe = probe, min(probe * 2, self.max_size)
+            if fails is None:
+                return fits
+        while fails - fits > 1:
+            middle = (fits + fails) // 2
+            if self.gas(s.build(middle)) is None:
+                fails = middle
+            else:
+                fits = middle
+        return fits
+
+
+def _report(name, result):
+    print(f"{name}: {result['description']}")
+    for p in result["points"]:
+        print(f"  {p['size']:>6} gas {p['gas']:>10,}   interpreter {p['wall_time'] * 1000:8.1f} ms")
+    if result["fit"]:
+        terms = " + ".join(f"{c:,.2f} n^{i}" for i, c in enumerate(result["fit"]))
+        print(f"  fit: gas = {terms}")
+    print(f"  largest batch under {result['gas_limit']:,} gas: {result['max_size']}")
+
+
+def run(shell="http://localhost:8732", sizes=(1, 10, 100, 1000), series_names=None, limit=gas_limit,
+        max_size=5_000, output=str(default_output)):
+    """
+    :param shell: RPC of the sandbox node
+    :param sizes: list sizes measured, in increasing order
+    :param series_names: comma separated series to run, all of them by default
+    :param limit: gas limit the batches have to fit in
+    :param max_size: largest list size tried when searching the limit
+    :param output: JSON file receiving the results, merged with its current content
+    """
+    client = pytezos.using(shell=shell, key=fixtures.admin_key)
+    targets = fixtures.originate_targets(client)
+    sweep = Sweep(Runner(client, gas_limit=limit), limit=limit, max_size=max_size)
+    names = series_names.split(",") if isinstance(series_names, str) else series_names
+    sizes = [int(s) for s in (sizes.split(",") if isinstance(sizes, str) else sizes)]
+
+    output_path = Path(output)
+    results = json.loads(output_path.read_text()) if output_path.exists() else {}
+    for s in series(targets, sweep.runner.chain_id):
+        if names and s.name not in names:
+            continue
+        results[s.name] = sweep.run(s, sizes)
+        _report(s.name, results[s.name])
+    output_path.write_text(json.dumps(results, indent=2, sort_keys=True) + "\n")
+    print(f"Results written to {output_path}")
+
+
+if __name__ == '__main__':
+    fire.Fire(run)
@@ -0,0 +1,102 @@
+"""
+Measures client.py startup: interpreter + import time, and time from process
+start to the first RPC the CLI sends. The same measures are taken with every
+helper imported and built upfront, which is what client.py used to do.
+
+    python -m bench.startup --runs=20
+"""
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import fire
+
+root_dir = Path(__file__).parent.parent
+
+_eager = "import client; " \
+         "c = client.Client(); " \
+         "[getattr(c, name) for name in client.commands]"
+
+_lazy = "import client"
+
+_fire = """
+import fire, client
+{prelude}
+fire.Fire(client.Client)
+"""
+
+_eager_prelude = """
+class Eager(client.Client):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for name in client.commands:
+            getattr(self, name)
+client.Client = Eager
+"""
+
+contract = "KT1VUNmGa1JYJuNxNS4XDzwpsc9N1gpcCBN2"
+address = "tz1S792fHX5rvs6GYP49S1U58isZkp2bNmn6"
+
+
+class _FirstRequest(BaseHTTPRequestHandler):
+    received = None
+
+    def _answer(self):
+        if _FirstRequest.received is None:
+            _FirstRequest.received = time.perf_counter()
+        self.send_response(500)
+        self.end_headers()
+
+    do_GET = _answer
+    do_POST = _answer
+
+    def log_message(self, *args):
+        pass
+
+
+def _time_process(code, args=()):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code, *args], cwd=root_dir, stdout=subprocess.DEVNULL,
+                   stderr=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def _time_to_first_rpc(prelude, server):
+    _FirstRequest.received = None
+    shell = f"http://127.0.0.1:{server.server_port}"
+    args = [f"--shell={shell}", "governance", "distribute", contract, address, "1"]
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", _fire.format(prelude=prelude), *args], cwd=root_dir,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    if _FirstRequest.received is None:
+        raise RuntimeError("client did not send any RPC")
+    return _FirstRequest.received - start
+
+
+def _report(name, eager, lazy):
+    e, la = statistics.median(eager), statistics.median(lazy)
+    print(f"{name:<20} eager {e * 1000:8.1f} ms   lazy {la * 1000:8.1f} ms   x{e / la:.2f}")
+
+
+def run(runs=10):
+    """
+    :param runs: number of processes started per measure, medians are reported
+    """
+    _report("import", [_time_process(_eager) for _ in range(runs)], [_time_process(_lazy) for _ in range(runs)])
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _FirstRequest)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        eager = [_time_to_first_rpc(_eager_prelude, server) for _ in range(runs)]
+        lazy = [_time_to_first_rpc("", server) for _ in range(runs)]
+        _report("first rpc", eager, lazy)
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    fire.Fire(run)
@@ -0,0 +1,165 @@
+import os
+import subprocess
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import fire
+
+from src.includes import IncludeGraph
+
+root_dir = Path(__file__).parent
+michelson_dir = root_dir / "michelson"
+metadata_dir = root_dir / "metadata"
+
+contracts = {
+    "multi_asset": ("ligo/fa2/multi_asset/fa2_multi_asset.mligo", "main"),
+    "quorum": ("ligo/quorum/multisig.mligo", "main"),
+    "minter": ("ligo/minter/main.mligo", "main"),
+    "nft": ("ligo/fa2/nft/fa2_nft_asset.mligo", "main"),
+    "governance_token": ("ligo/fa2/governance/main.mligo", "main"),
+}
+
+metadata = {
+    "multi_asset": "ligo/fa2/multi_asset/views.mligo",
+    "nft": "ligo/fa2/nft/views.mligo",
+    "quorum": None,
+    "minter": None,
+    "governance_token": "ligo/fa2/governance/views.mligo",
+}
+
+
+def compile_contract(name):
+    from src.cache import atomic_write
+    from src.ligo import LigoContract
+
+    ligo_file, main_func = contracts[name]
+    destination = michelson_dir / f"{name}.tz"
+    michelson = LigoContract(root_dir / ligo_file, main_func).compile_michelson()
+    atomic_write(destination, michelson)
+    return destination
+
+
+def check_contract(name):
+    from src.ligo import LigoContract
+
+    ligo_file, main_func = contracts[name]
+    destination = michelson_dir / f"{name}.tz"
+    michelson = LigoContract(root_dir / ligo_file, main_func).compile_michelson()
+    if not destination.exists() or destination.read_text() != michelson:
+        raise ValueError(f"{destination.relative_to(root_dir)} is not the output of {ligo_file}, rebuild it")
+    return destination
+
+
+def build_metadata(name):
+    from metadata import Views
+
+    destination = metadata_dir / f"{name}.json"
+    getattr(Views(), name)(str(destination))
+    return destination
+
+
+def _is_stale(output, dependencies):
+    if not output.exists():
+        return True
+    built = output.stat().st_mtime
+    return any(d.exists() and d.stat().st_mtime > built for d in dependencies)
+
+
+def _git_changed_files():
+    out = subprocess.run(["git", "diff", "--name-only", "HEAD"], cwd=root_dir, capture_output=True, text=True,
+                         check=True).stdout
+    return out.split()
+
+
+class Builder(object):
+
+    def compile(self, *names, jobs=None):
+        """
+        Compiles contracts to michelson/<name>.tz, all of them if no name is given.
+        """
+        return self._run([(compile_contract, n) for n in names or contracts], jobs)
+
+    def check(self, *names, jobs=None):
+        """
+        Compiles contracts, all of them if no name is given, and fails if the
+        committed michelson/<name>.tz differs from the compiler output.
+        """
+        return self._run([(check_contract, n) for n in names or contracts], jobs, done="Checked")
+
+    def metadata(self, *names, jobs=None):
+        """
+        Generates metadata/<name>.json, all of them if no name is given.
+        """
+        return self._run([(build_metadata, n) for n in names or metadata], jobs)
+
+    def all(self, jobs=None):
+        """
+        Compiles every contract and generates every metadata file on a single process pool.
+        """
+        tasks = [(compile_contract, n) for n in contracts] + [(build_metadata, n) for n in metadata]
+        return self._run(tasks, jobs)
+
+    def changed(self, *paths, jobs=None):
+        """
+        Rebuilds only the contracts and metadata depending on the given files
+        (defaults to files changed since HEAD according to git).
+        """
+        paths = paths or _git_changed_files()
+        graph = IncludeGraph()
+        contract_targets = graph.affected({n: f for n, (f, _) in contracts.items()}, paths)
+        metadata_targets = graph.affected({n: f for n, f in metadata.items() if f}, paths)
+        if any(Path(p).name == "metadata.py" for p in paths):
+            metadata_targets = list(metadata)
+        return self._run_targets(contract_targets, metadata_targets, jobs)
+
+    def stale(self, jobs=None):
+        """
+        Rebuilds the outputs that are missing or older than one of the files they depend on.
+        """
+        graph = IncludeGraph()
+        contract_targets = [n for n, (f, _) in contracts.items()
+                            if _is_stale(michelson_dir / f"{n}.tz", graph.dependencies(f))]
+        metadata_targets = [n for n, f in metadata.items()
+                            if _is_stale(metadata_dir / f"{n}.json",
+                                         (graph.dependencies(f) if f else set()) | {root_dir / "metadata.py"})]
+        return self._run_targets(contract_targets, metadata_targets, jobs)
+
+    def deps(self, *names):
+        """
+        Prints the LIGO files each contract depends on.
+        """
+        graph = IncludeGraph()
+        for name in names or contracts:
+            print(f"{name}:")
+            for f in sorted(graph.dependencies(contracts[name][0])):
+                print(f"  {f.relative_to(root_dir)}")
+
+    def _run_targets(self, contract_targets, metadata_targets, jobs):
+        tasks = [(compile_contract, n) for n in contract_targets] + [(build_metadata, n) for n in metadata_targets]
+        if not tasks:
+            print("Nothing to rebuild")
+            return
+        return self._run(tasks, jobs)
+
+    @staticmethod
+    def _run(tasks, jobs, done="Built"):
+        jobs = int(jobs or os.cpu_count() or 1)
+        start = time.perf_counter()
+        failures = []
+        with ProcessPoolExecutor(max_workers=min(jobs, len(tasks)) or 1) as pool:
+            futures = {pool.submit(f, name): name for (f, name) in tasks}
+            for future in as_completed(futures):
+                try:
+                    print(f"{done} {future.result().relative_to(root_dir)}")
+                except Exception as e:
+                    print(f"Failed {futures[future]}: {e}")
+                    failures.append(futures[future])
+        print(f"{len(tasks) - len(failures)}/{len(tasks)} targets {done.lower()} in "
+              f"{time.perf_counter() - start:.1f}s with {jobs} jobs")
+        if failures:
+            raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    fire.Fire(Builder)
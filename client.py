@@ -1,22 +1,72 @@
-from src.deploy import Deploy
-from src.governance import Governance
-from src.minter import Minter
-from src.quorum import Quorum
-from src.token import Token
+from importlib import import_module
+
 import fire
-from pytezos import pytezos, PyTezosClient
+
+# subcommand -> (module, helper class), imported and built on first use only
+commands = {
+    "minter": ("src.minter", "Minter"),
+    "token": ("src.token", "Token"),
+    "quorum": ("src.quorum", "Quorum"),
+    "deploy": ("src.deploy", "Deploy"),
+    "governance": ("src.governance", "Governance"),
+    "index": ("src.indexer", "Index"),
+}
 
 
 class Client(object):
     def __init__(self, shell="http://localhost:8732", key="edsk3QoqBuvdamxouPhin7swCvkQNgq4jP5KZPbwWNnwdZpSpJiEbq"):
-        client: PyTezosClient = pytezos.using(
-            key=key,
-            shell=shell)
-        self.minter = Minter(client)
-        self.token = Token(client)
-        self.quorum = Quorum(client)
-        self.deploy = Deploy(client)
-        self.governance = Governance(client)
+        self._shell = shell
+        self._key = key
+        self._client = None
+        self._helpers = {}
+
+    @property
+    def minter(self):
+        return self._helper("minter")
+
+    @property
+    def token(self):
+        return self._helper("token")
+
+    @property
+    def quorum(self):
+        return self._helper("quorum")
+
+    @property
+    def deploy(self):
+        return self._helper("deploy")
+
+    @property
+    def governance(self):
+        return self._helper("governance")
+
+    @property
+    def index(self):
+        return self._helper("index")
+
+    def _helper(self, name):
+        if name not in self._helpers:
+            module, cls = commands[name]
+            self._helpers[name] = getattr(import_module(module), cls)(self._pytezos())
+        return self._helpers[name]
+
+    def _pytezos(self):
+        if self._client is None:
+            from pytezos import pytezos
+            self._client = pytezos.using(key=self._key, shell=self._shell_query())
+        return self._client
+
+    def _shell_query(self):
+        """
+        The shell as given, or a pool of nodes when several RPC URLs are given
+        (comma separated, or a list).
+        """
+        shells = self._shell.split(",") if isinstance(self._shell, str) else list(self._shell)
+        if len(shells) == 1:
+            return shells[0]
+        from pytezos.rpc.shell import ShellQuery
+        from src.transport import NodePool
+        return ShellQuery(NodePool(shells))
 
 
 if __name__ == '__main__':
@@ -1,18 +1,24 @@
 import fire
 import json
 
+from src.cache import atomic_write
 from src.ligo import LigoView
 
 
+def _write(destination, metadata):
+    atomic_write(destination, json.dumps(metadata, indent=4))
+
+
 class Views(object):
 
     def multi_asset(self, destination):
         views = LigoView("./ligo/fa2/multi_asset/views.mligo")
-        get_balance = views.compile("get_balance", "nat", "get_balance as defined in tzip-12")
-        total_supply = views.compile("total_supply", "nat", "get_total supply as defined in tzip-12")
-        is_operator = views.compile("is_operator", "bool", "is_operator as defined in tzip-12")
-        token_metadata = views.compile("token_metadata", "(pair nat (map string bytes))",
-                                       "token_metadata as defined in tzip-12")
+        get_balance, total_supply, is_operator, token_metadata = views.compile_all([
+            ("get_balance", "nat", "get_balance as defined in tzip-12"),
+            ("total_supply", "nat", "get_total supply as defined in tzip-12"),
+            ("is_operator", "bool", "is_operator as defined in tzip-12"),
+            ("token_metadata", "(pair nat (map string bytes))", "token_metadata as defined in tzip-12"),
+        ])
         meta = {
             "interfaces": ["TZIP-012", "TZIP-016", "TZIP-021"],
             "name": "Wrap protocol FA2 tokens",
@@ -31,16 +37,16 @@ class Views(object):
                 token_metadata
             ]
         }
-        with open(destination, 'w') as outfile:
-            json.dump(meta, outfile, indent=4)
+        _write(destination, meta)
 
     def nft(self, destination):
         views = LigoView("./ligo/fa2/nft/views.mligo")
-        get_balance = views.compile("get_balance", "nat", "get_balance as defined in tzip-12")
-        total_supply = views.compile("total_supply", "nat", "get_total supply as defined in tzip-12")
-        is_operator = views.compile("is_operator", "bool", "is_operator as defined in tzip-12")
-        token_metadata = views.compile("token_metadata", "(pair nat (map string bytes))",
-                                       "token_metadata as defined in tzip-12")
+        get_balance, total_supply, is_operator, token_metadata = views.compile_all([
+            ("get_balance", "nat", "get_balance as defined in tzip-12"),
+            ("total_supply", "nat", "get_total supply as defined in tzip-12"),
+            ("is_operator", "bool", "is_operator as defined in tzip-12"),
+            ("token_metadata", "(pair nat (map string bytes))", "token_metadata as defined in tzip-12"),
+        ])
         meta = {
             "interfaces": ["TZIP-012", "TZIP-016"],
             "name": "Wrap protocol NFT token",
@@ -59,8 +65,7 @@ class Views(object):
                 total_supply
             ]
         }
-        with open(destination, 'w') as outfile:
-            json.dump(meta, outfile, indent=4)
+        _write(destination, meta)
 
     def quorum(self, destination):
         metadata = {
@@ -69,8 +74,7 @@ class Views(object):
             "interfaces": ["TZIP-016"],
             "license": {"name": "MIT"},
         }
-        with open(destination, 'w') as outfile:
-            json.dump(metadata, outfile, indent=4)
+        _write(destination, metadata)
 
     def minter(self, destination):
         metadata = {
@@ -79,19 +83,18 @@ class Views(object):
             "homepage": "https://github.com/bender-labs/wrap-tz-contracts",
             "license": {"name": "MIT"},
         }
-        with open(destination, 'w') as outfile:
-            json.dump(metadata, outfile, indent=4)
+        _write(destination, metadata)
 
     def governance_token(self, destination):
         views = LigoView("./ligo/fa2/governance/views.mligo")
-        all_tokens = views.compile("all_tokens", "list(nat)", "all_tokens as defined in tzip-12")
-        get_balance = views.compile("get_balance", "nat", "get_balance as defined in tzip-12")
-        total_supply = views.compile("total_supply", "nat", "get_total supply as defined in tzip-12")
-        is_operator = views.compile("is_operator", "bool", "is_operator as defined in tzip-12")
-        token_metadata = views.compile("token_metadata", "(pair nat (map string bytes))",
-                                       "token_metadata as defined in tzip-12")
-        distributed = views.compile("tokens_distributed", "nat",
-                                       "How many governance tokens have already been distributed")                                       
+        all_tokens, get_balance, total_supply, is_operator, token_metadata, distributed = views.compile_all([
+            ("all_tokens", "list(nat)", "all_tokens as defined in tzip-12"),
+            ("get_balance", "nat", "get_balance as defined in tzip-12"),
+            ("total_supply", "nat", "get_total supply as defined in tzip-12"),
+            ("is_operator", "bool", "is_operator as defined in tzip-12"),
+            ("token_metadata", "(pair nat (map string bytes))", "token_metadata as defined in tzip-12"),
+            ("tokens_distributed", "nat", "How many governance tokens have already been distributed"),
+        ])
         meta = {
             "interfaces": ["TZIP-012", "TZIP-016", "TZIP-021"],
             "name": "Wrap protocol governance token",
@@ -112,7 +115,8 @@ class Views(object):
                 distributed
             ]
         }
-        with open(destination, 'w') as outfile:
-            json.dump(meta, outfile, indent=4)
+        _write(destination, meta)
+
+
 if __name__ == '__main__':
     fire.Fire(Views)
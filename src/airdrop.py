@@ -0,0 +1,272 @@
+import csv
+import hashlib
+import json
+import sqlite3
+from decimal import Decimal
+
+from pytezos import PyTezosClient
+from pytezos.operation.fees import hard_gas_limit_per_operation
+from pytezos.operation.forge import forge_operation
+from pytezos.operation.result import OperationResult
+from pytezos.rpc.errors import RpcError
+
+from src.fee_planner import chunk
+from src.interfaces import interface_cache
+from src.relayer import branch_size, hard_gas_limit_per_block, max_operation_data_length, signature_size, \
+    with_limits
+from src.tracker import OperationTracker
+
+decimals = 8
+branch_offset = 50
+max_operations_ttl = 60
+default_chunk_size = 200
+
+
+def read_recipients(path):
+    """
+    Streams (address, amount in $WRAP units, 8 decimals) from a CSV file with
+    `address,amount` rows, header optional, or a JSON lines file of
+    {"address": ..., "amount": ...}.
+    """
+    with open(path, newline="") as f:
+        rows = (json.loads(line) for line in f if line.strip()) if str(path).endswith(".jsonl") \
+            else ({"address": r[0], "amount": r[1]} for r in csv.reader(f) if r)
+        for n, row in enumerate(rows):
+            if n == 0 and row["address"].strip() == "address":
+                continue
+            amount = Decimal(str(row["amount"]).strip()).scaleb(decimals)
+            if amount != amount.to_integral_value() or amount <= 0:
+                raise ValueError(f"Bad amount for {row['address']}: {row['amount']}")
+            yield row["address"].strip(), int(amount)
+
+
+def file_digest(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class Checkpoint:
+    def __init__(self, path):
+        """
+        SQLite file holding the recipients, their amounts merged by address,
+        and the groups paying them. Rows are written before a group is
+        injected and settled once it is confirmed, so a run resumed after a
+        crash pays nobody twice.
+        """
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.executescript("""
+            create table if not exists meta (key text primary key, value text);
+            create table if not exists recipients (address text primary key, amount integer not null,
+                                                   batch integer);
+            create table if not exists batches (id integer primary key, hash text not null, level integer not null,
+                                                status text not null);
+            create index if not exists recipients_batch on recipients (batch);
+        """)
+
+    def load(self, source):
+        """
+        Reads the recipients file once. A checkpoint can only resume the file it was created from.
+        """
+        digest = file_digest(source)
+        loaded = self.db.execute("select value from meta where key = 'source'").fetchone()
+        if loaded is not None:
+            if loaded[0] != digest:
+                raise ValueError(f"{self.path} was created for another recipients file")
+            return
+        with self.db:
+            self.db.executemany("""
+                insert into recipients (address, amount) values (?, ?)
+                on conflict (address) do update set amount = amount + excluded.amount
+            """, read_recipients(source))
+            self.db.execute("insert into meta values ('source', ?)", (digest,))
+
+    def pending(self, limit):
+        """
+        :return: up to limit (address, amount) not paid nor being paid
+        """
+        return self.db.execute("select address, amount from recipients where batch is null order by address limit ?",
+                               (limit,)).fetchall()
+
+    def pending_total(self):
+        return self.db.execute("select coalesce(sum(amount), 0) from recipients where batch is null").fetchone()[0]
+
+    def record(self, recipients, op_hash, level):
+        """
+        Assigns recipients to a group about to be injected.
+        :param level: head level when injected
+        :return: group id
+        """
+        with self.db:
+            batch = self.db.execute("insert into batches (hash, level, status) values (?, ?, 'injected')",
+                                    (op_hash, level)).lastrowid
+            self.db.executemany("update recipients set batch = ? where address = ?",
+                                [(batch, address) for address, _ in recipients])
+        return batch
+
+    def injected(self):
+        """
+        :return: list of (group id, operation hash, level) not settled yet
+        """
+        return self.db.execute("select id, hash, level from batches where status = 'injected'").fetchall()
+
+    def settle(self, batch, status):
+        """
+        :param status: applied; failed, its recipients are left out; or
+        expired, its recipients are paid by a next group
+        """
+        with self.db:
+            self.db.execute("update batches set status = ? where id = ?", (status, batch))
+            if status == "expired":
+                self.db.execute("update recipients set batch = null where batch = ?", (batch,))
+
+    def summary(self):
+        """
+        :return: dict status -> (recipients, amount), `pending` for the ones without group
+        """
+        rows = self.db.execute("""
+            select coalesce(b.status, 'pending'), count(*), sum(r.amount)
+            from recipients r left join batches b on r.batch = b.id group by 1
+        """).fetchall()
+        return {status: (count, amount) for status, count, amount in rows}
+
+    def close(self):
+        self.db.close()
+
+
+class Airdrop:
+    def __init__(self, client: PyTezosClient, contract_id, checkpoint: Checkpoint,
+                 call_gas_budget=hard_gas_limit_per_operation * 9 // 10, gas_budget=hard_gas_limit_per_block // 2,
+                 size_budget=max_operation_data_length, chunk_size=default_chunk_size, max_in_flight=4,
+                 confirmations=1):
+        """
+        Pays the recipients of a checkpoint with governance token `distribute`
+        calls. Recipients are split in calls fitting in call_gas_budget, calls
+        are packed in groups fitting in gas_budget and size_budget, and groups
+        are injected max_in_flight at a time.
+        :param chunk_size: recipients tried in the first call
+        """
+        self.client = client
+        self.contract = interface_cache.contract(client, contract_id)
+        self.checkpoint = checkpoint
+        self.call_gas_budget = call_gas_budget
+        self.gas_budget = gas_budget
+        self.size_budget = size_budget
+        self.chunk_size = chunk_size
+        self.max_in_flight = max_in_flight
+        self.confirmations = confirmations
+
+    def check_supply(self):
+        """
+        :raise ValueError: if paying the pending recipients goes over max_supply
+        """
+        oracle = self.contract.storage["oracle"]()
+        available = oracle["max_supply"] - oracle["distributed"]
+        total = self.checkpoint.pending_total()
+        if total > available:
+            raise ValueError(f"Distributing {total} exceeds the {available} left under max_supply")
+        return total, available
+
+    def resume(self):
+        """
+        Settles the groups injected by a previous run: confirmed, failed, or
+        expired without being included.
+        """
+        for batch, op_hash, level in self.checkpoint.injected():
+            self._settle(batch, op_hash, level)
+
+    def run(self):
+        self.resume()
+        self.check_supply()
+        while True:
+            recipients = self.checkpoint.pending(self.chunk_size * self.max_in_flight * 4)
+            if not recipients:
+                break
+            calls = chunk(recipients, self._gas, self.call_gas_budget, self.chunk_size)
+            self.chunk_size = len(calls[0][0])
+            groups = self._groups(calls)
+            for start in range(0, len(groups), self.max_in_flight):
+                self._send(groups[start:start + self.max_in_flight])
+        return self.checkpoint.summary()
+
+    def _call(self, recipients):
+        return self.contract.distribute([{"to_": address, "amount": amount} for address, amount in recipients])
+
+    def _gas(self, recipients):
+        result = self.client.bulk(self._call(recipients)).fill().run()
+        if OperationResult.is_applied(result):
+            return OperationResult.consumed_gas(result)
+        errors = OperationResult.errors(result)
+        if any("gas_exhausted" in e.get("id", "") for e in errors):
+            return None
+        raise RpcError.from_errors(errors)
+
+    def _groups(self, calls):
+        """
+        Packs calls, in order, in groups under the group gas and size budgets.
+        :param calls: list of (recipients, gas)
+        :return: list of lists of recipients lists
+        """
+        groups, group, gas, size = [], [], 0, branch_size + signature_size
+        for recipients, call_gas in calls:
+            call_size = self._size(self._call(recipients))
+            if group and (gas + call_gas > self.gas_budget or size + call_size > self.size_budget):
+                groups.append(group)
+                group, gas, size = [], 0, branch_size + signature_size
+            group.append(recipients)
+            gas, size = gas + call_gas, size + call_size
+        return groups + [group] if group else groups
+
+    def _size(self, call):
+        """
+        Forged size of a call, limits and counter set to values it will not exceed.
+        """
+        content = dict(call.as_transaction().contents[0], source=self.client.key.public_key_hash(),
+                       fee=str(10 ** 7), counter=str(2 ** 40), gas_limit=str(hard_gas_limit_per_operation),
+                       storage_limit=str(60_000))
+        return len(forge_operation(content))
+
+    def _send(self, groups):
+        counter = int(self.client.shell.contracts[self.client.key.public_key_hash()]()["counter"])
+        injected = []
+        for group in groups:
+            calls = [self._call(recipients) for recipients in group]
+            result = self.client.bulk(*calls).fill(branch_offset=branch_offset).run()
+            if not OperationResult.is_applied(result):
+                raise RpcError.from_errors(OperationResult.errors(result))
+            extra_size = (branch_size + signature_size) // len(calls) + 1
+            contents = [with_limits(content, extra_size)[0] for content in result["contents"]]
+            for i, content in enumerate(contents):
+                content["counter"] = str(counter + i + 1)
+            opg = self.client.bulk(*calls).fill(counter=counter, branch_offset=branch_offset)
+            opg.contents = contents
+            opg = opg.sign()
+            level = self.client.shell.head.header()["level"]
+            # recorded first: a crash after injecting must not pay these recipients again
+            batch = self.checkpoint.record([r for recipients in group for r in recipients], opg.hash(), level)
+            opg.inject(_async=True, preapply=False)
+            print(f"Injected {opg.hash()} paying {sum(len(r) for r in group)} recipients")
+            injected.append((batch, opg.hash(), level))
+            counter += len(contents)
+        for batch, op_hash, level in injected:
+            self._settle(batch, op_hash, level)
+
+    def _settle(self, batch, op_hash, level):
+        head = self.client.shell.head.header()["level"]
+        expiry = level - branch_offset + max_operations_ttl
+        tracker = OperationTracker(self.client, confirmations=self.confirmations,
+                                   timeout_blocks=max(expiry - head, 0) + 1, lookback=head - level + 2)
+        try:
+            tracker.wait_for_ops(op_hash)
+        except TimeoutError:
+            print(f"{op_hash} expired, its recipients are paid again")
+            self.checkpoint.settle(batch, "expired")
+            return
+        except RpcError as e:
+            print(f"{op_hash} failed: {e}")
+            self.checkpoint.settle(batch, "failed")
+            return
+        self.checkpoint.settle(batch, "applied")
@@ -0,0 +1,92 @@
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+
+from src.includes import include_closure
+
+default_cache_dir = Path(__file__).parent.parent / ".ligo_cache"
+
+
+def file_digest(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def sources_digest(ligo_file, *extra):
+    """
+    Hashes a LIGO source file together with every file it includes and the
+    extra values given (entry point name, ligo version...).
+    :return: hex digest
+    """
+    h = hashlib.sha256()
+    for value in extra:
+        h.update(str(value).encode())
+        h.update(b"\0")
+    base = Path(ligo_file).resolve().parent
+    for source in sorted(include_closure(ligo_file)):
+        h.update(os.path.relpath(source, base).encode())
+        h.update(b"\0")
+        h.update(file_digest(source).encode())
+    return h.hexdigest()
+
+
+class CompileCache:
+    def __init__(self, directory=None):
+        """
+        :param directory: where cached artifacts are stored. Defaults to
+        $LIGO_CACHE_DIR, or .ligo_cache at the repository root
+        """
+        self.directory = Path(directory or os.environ.get("LIGO_CACHE_DIR") or default_cache_dir)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, suffix=".tz"):
+        """
+        Returns the cached content for key, or None.
+        """
+        path = self._path(key, suffix)
+        try:
+            content = path.read_text()
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return content
+
+    def put(self, key, content, suffix=".tz"):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        atomic_write(self._path(key, suffix), content)
+        return content
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
+
+    def clear(self):
+        if self.directory.exists():
+            for f in self.directory.iterdir():
+                f.unlink()
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key, suffix):
+        return self.directory / f"{key}{suffix}"
+
+
+def atomic_write(destination, content):
+    """
+    Writes content next to destination then renames it over, so readers never
+    see a partially written file.
+    """
+    destination = Path(destination)
+    fd, tmp = tempfile.mkstemp(dir=destination.parent, prefix=f".{destination.name}.")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(content)
+        os.replace(tmp, destination)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+compile_cache = CompileCache()
@@ -1,12 +1,17 @@
 import json
+from functools import cached_property
 from pathlib import Path
 from typing import TypedDict
 
 from pytezos import ContractInterface, PyTezosClient
 from pytezos.operation.result import OperationResult
 
+from src.deploy_planner import DeployPlanner
+from src.ligo import load_contract_file
 from src.token import Token
 
+_michelson_dir = Path(__file__).parent.parent / "michelson"
+
 _fa2_default_meta = "https://gist.githubusercontent.com/BodySplash/" \
                     "1a44558b64ce7c0edd77e1ba37d6d8bf/raw/multi_asset.json"
 
@@ -58,37 +63,59 @@ class Deploy(object):
     def __init__(self, client: PyTezosClient):
         self.client = client
 
-        root_dir = Path(__file__).parent.parent / "michelson"
-        self.minter_contract = ContractInterface.from_file(root_dir / "minter.tz")
-        self.quorum_contract = ContractInterface.from_file(root_dir / "quorum.tz")
-        self.fa2_contract = ContractInterface.from_file(root_dir / "multi_asset.tz")
-        self.nft_contract = ContractInterface.from_file(root_dir / "nft.tz")
-        self.governance_contract = ContractInterface.from_file(root_dir / "governance_token.tz")
+    @cached_property
+    def minter_contract(self) -> ContractInterface:
+        return load_contract_file(_michelson_dir / "minter.tz")
 
-    def run(self, signers: dict[str, str], governance_token, tokens: list[TokenType], nft: list[NftType],
-            threshold=1):
-        originations = [self._fa2_origination(tokens), self._governance_token_origination(governance_token)]
-        originations.extend([self._nft_origination(v) for k, v in enumerate(nft)])
-        print("Deploying FA2s and nfts")
-        opg = self.client.bulk(*originations).autofill().sign().inject(_async=False)
-        originated_contracts = OperationResult.originated_contracts(opg)
-        for o in originated_contracts:
-            _print_contract(o)
-        fa2 = originated_contracts[0]
-        governance = originated_contracts[1]
-        nft_contracts = dict((v["eth_contract"][2:], originated_contracts[k + 2]) for k, v in enumerate(nft))
+    @cached_property
+    def quorum_contract(self) -> ContractInterface:
+        return load_contract_file(_michelson_dir / "quorum.tz")
 
-        print("Deploying quorum contract")
-        quorum = self._originate_single_contract(self._quorum_origination(signers, threshold))
+    @cached_property
+    def fa2_contract(self) -> ContractInterface:
+        return load_contract_file(_michelson_dir / "multi_asset.tz")
+
+    @cached_property
+    def nft_contract(self) -> ContractInterface:
+        return load_contract_file(_michelson_dir / "nft.tz")
+
+    @cached_property
+    def governance_contract(self) -> ContractInterface:
+        return load_contract_file(_michelson_dir / "governance_token.tz")
 
-        minter = self._deploy_minter(quorum, tokens, fa2,
-                                     {'tezos': governance, 'eth': governance_token}, nft_contracts)
-        admin_calls = self._set_tokens_minter(minter, fa2, governance, nft_contracts)
-        print("Setting and confirming FA2s administrator")
-        self.client.bulk(*admin_calls).autofill().sign().inject(_async=False)
+    def run(self, signers: dict[str, str], governance_token, tokens: list[TokenType], nft: list[NftType],
+            threshold=1):
+        """
+        Originates the FA2s, nfts, quorum and minter, and sets the minter of
+        every token, in three blocks: the minter is built with the addresses
+        the other originations got once included, and the set_minter calls
+        with the minter's once it is included.
+        """
+        planner = DeployPlanner(self.client)
+        planner.add("fa2", lambda _: self._fa2_origination(tokens), originates=True)
+        planner.add("governance", lambda _: self._governance_token_origination(governance_token), originates=True)
+        nft_steps = {}
+        for token in nft:
+            nft_steps[token["eth_contract"][2:]] = f"nft {token['symbol']}"
+            planner.add(f"nft {token['symbol']}", lambda _, t=token: self._nft_origination(t), originates=True)
+        planner.add("quorum", lambda _: self._quorum_origination(signers, threshold), originates=True)
+        planner.add("minter",
+                    lambda a: self._minter_origination(a["quorum"], tokens, a["fa2"],
+                                                       {'tezos': a["governance"], 'eth': governance_token},
+                                                       {k: a[v] for k, v in nft_steps.items()}),
+                    originates=True, uses=["quorum", "fa2", "governance", *nft_steps.values()])
+        token = Token(self.client)
+        for name in ["fa2", "governance", *nft_steps.values()]:
+            planner.add(f"set_minter {name}", lambda a, n=name: token.set_minter_call(a[n], a["minter"]),
+                        uses=["minter"], waits=[name])
+        addresses = planner.run()
+        for name in ["fa2", "governance", *nft_steps.values(), "quorum", "minter"]:
+            _print_contract(addresses[name])
+        nft_contracts = {k: addresses[v] for k, v in nft_steps.items()}
         print(f"Nfts contracts: {nft_contracts}\n")
         print(
-            f"FA2 contract: {fa2}\nGovernance token: {governance}\nQuorum contract: {quorum}\nMinter contract: {minter}")
+            f"FA2 contract: {addresses['fa2']}\nGovernance token: {addresses['governance']}\n"
+            f"Quorum contract: {addresses['quorum']}\nMinter contract: {addresses['minter']}")
 
     def governance_token(self, eth_address, meta_uri=_governance_default_meta):
         print("Deploying governance token")
@@ -212,19 +239,12 @@ class Deploy(object):
         origination = self.nft_contract.originate(initial_storage=initial_storage)
         return origination
 
-    def _set_tokens_minter(self, minter, fa2, governance, nfts):
-        token = Token(self.client)
-        calls = [token.set_minter_call(fa2, minter), token.set_minter_call(governance, minter)]
-        calls.extend([token.set_minter_call(v, minter) for (i, v) in nfts.items()])
-        return calls
-
-    def _deploy_minter(self, quorum_contract,
-                       tokens: list[TokenType],
-                       fa2_contract,
-                       governance,
-                       nft_contracts,
-                       meta_uri=_minter_default_meta):
-        print("Deploying minter contract")
+    def _minter_origination(self, quorum_contract,
+                            tokens: list[TokenType],
+                            fa2_contract,
+                            governance,
+                            nft_contracts,
+                            meta_uri=_minter_default_meta):
         fungible_tokens = dict((v["eth_contract"][2:], [fa2_contract, k]) for k, v in enumerate(tokens))
         fungible_tokens[governance['eth']] = [governance['tezos'], 0]
         metadata = _metadata_encode_uri(meta_uri)
@@ -243,7 +263,15 @@ class Deploy(object):
             "fees": {
                 "signers": {},
                 "tokens": {},
-                "xtz": {}
+                "xtz": {},
+                "shares": {
+                    "holders": {},
+                    "tokens": [],
+                    "tokens_per_share": {},
+                    "xtz_per_share": 0,
+                    "token_checkpoints": {},
+                    "xtz_checkpoints": {}
+                }
             },
             "governance": {
                 "contract": self.client.key.public_key_hash(),
@@ -261,9 +289,7 @@ class Deploy(object):
             },
             "metadata": metadata
         }
-        print(initial_storage)
-        origination = self.minter_contract.originate(initial_storage=initial_storage)
-        return self._originate_single_contract(origination)
+        return self.minter_contract.originate(initial_storage=initial_storage)
 
     def quorum(self, signers: dict[str, str],
                threshold,
@@ -0,0 +1,160 @@
+from pytezos import PyTezosClient
+from pytezos.operation.fees import hard_gas_limit_per_operation
+from pytezos.operation.forge import forge_operation
+from pytezos.operation.result import OperationResult
+from pytezos.rpc.errors import RpcError
+
+from src.relayer import branch_size, hard_gas_limit_per_block, max_operation_data_length, signature_size, \
+    with_limits
+from src.tracker import OperationTracker
+
+
+class Step:
+    def __init__(self, name, build, originates, uses, waits):
+        self.name = name
+        self.build = build
+        self.originates = originates
+        self.uses = list(uses)
+        self.waits = list(waits)
+        self.operation = None
+
+
+def _content(operation):
+    group = operation.as_transaction() if hasattr(operation, "as_transaction") else operation
+    return group.contents[0]
+
+
+class DeployPlanner:
+    def __init__(self, client: PyTezosClient, gas_budget=hard_gas_limit_per_block // 2,
+                 size_budget=max_operation_data_length, confirmations=1, tracker=None):
+        """
+        Injects originations and contract calls in as few blocks as their
+        dependencies allow. A step using the address of a contract, or calling
+        it, waits for the group originating it to be included and applied: the
+        address is read from the originated contracts of the included group.
+        Ready steps are packed in groups under the gas and size budgets and
+        injected with consecutive counters.
+        :param gas_budget: gas of a whole group
+        :param size_budget: bytes of a signed group
+        """
+        self.client = client
+        self.gas_budget = gas_budget
+        self.size_budget = size_budget
+        self.tracker = tracker or OperationTracker(client, confirmations=confirmations)
+        self.steps = {}
+        # step name -> originated address, once included
+        self.addresses = {}
+        # step name -> hash of the group holding it
+        self.groups = {}
+        # group hash -> names of the originating steps, in the group order
+        self._originations = {}
+        self._included = set()
+        self._counter = None
+
+    def add(self, name, build, originates=False, uses=(), waits=()):
+        """
+        :param build: function of the addresses originated so far returning a
+        ContractCall or an origination
+        :param originates: True for an origination, its address is then given
+        to the steps using it under this name
+        :param uses: steps whose originated address is needed to build this one,
+        they must be included before it is built
+        :param waits: steps which must be included before this one is sent
+        """
+        for dependency in list(uses) + list(waits):
+            if dependency not in self.steps:
+                raise ValueError(f"{name} depends on unknown step {dependency}")
+        self.steps[name] = Step(name, build, originates, uses, waits)
+
+    def run(self):
+        """
+        :return: dict step name -> originated address, for originations
+        """
+        sent = set()
+        while len(sent) < len(self.steps):
+            ready = [s for s in self.steps.values()
+                     if s.name not in sent and all(d in self._included for d in s.uses + s.waits)]
+            if not ready:
+                self._wait({self.groups[d] for s in self.steps.values() if s.name not in sent
+                            for d in s.uses + s.waits if d not in self._included})
+                continue
+            for step in ready:
+                step.operation = step.build(self.addresses)
+            for group in self._pack(ready):
+                self._inject(group)
+                sent.update(s.name for s in group)
+        self._wait({op_hash for name, op_hash in self.groups.items() if name not in self._included})
+        return self.addresses
+
+    def _pack(self, steps):
+        """
+        Splits steps, in order, in groups under the size budget.
+        """
+        groups, group, size = [], [], branch_size + signature_size
+        for step in steps:
+            step_size = self._size(step.operation)
+            if group and size + step_size > self.size_budget:
+                groups.append(group)
+                group, size = [], branch_size + signature_size
+            group.append(step)
+            size += step_size
+        return groups + [group] if group else groups
+
+    def _size(self, operation):
+        """
+        Forged size of an operation, limits and counter set to values it will not exceed.
+        """
+        content = dict(_content(operation), source=self.client.key.public_key_hash(), fee=str(10 ** 7),
+                       counter=str(2 ** 40), gas_limit=str(hard_gas_limit_per_operation), storage_limit=str(60_000))
+        return len(forge_operation(content))
+
+    def _inject(self, steps):
+        """
+        Limits come from a simulation at the chain counter, the node rejects
+        counters ahead of it. Steps of a group over the gas budget go to a
+        group of their own.
+        """
+        operations = [s.operation for s in steps]
+        result = self.client.bulk(*operations).fill().run()
+        if not OperationResult.is_applied(result):
+            raise RpcError.from_errors(OperationResult.errors(result))
+        extra_size = (branch_size + signature_size) // len(steps) + 1
+        contents, gas = [], 0
+        for content in result["contents"]:
+            content, consumed = with_limits(content, extra_size)
+            if contents and gas + consumed > self.gas_budget:
+                break
+            contents.append(content)
+            gas += consumed
+        steps, rest = steps[:len(contents)], steps[len(contents):]
+
+        if self._counter is None:
+            self._counter = int(self.client.shell.contracts[self.client.key.public_key_hash()]()["counter"])
+        for i, content in enumerate(contents):
+            content["counter"] = str(self._counter + i + 1)
+        opg = self.client.bulk(*operations[:len(contents)]).fill(counter=self._counter)
+        opg.contents = contents
+        opg = opg.sign()
+        op_hash = opg.hash()
+        for step in steps:
+            self.groups[step.name] = op_hash
+        self._originations[op_hash] = [s.name for s in steps if s.originates]
+        opg.inject(_async=True, preapply=False)
+        self._counter += len(contents)
+        print(f"Injected {op_hash}: {', '.join(s.name for s in steps)}")
+        if rest:
+            self._inject(rest)
+
+    def _wait(self, op_hashes):
+        """
+        Waits for groups to be included, the tracker raises if one failed, and
+        reads the addresses they originated.
+        """
+        op_hashes = sorted(op_hashes)
+        for op_hash, operation in zip(op_hashes, self.tracker.wait_for_ops(*op_hashes)):
+            names = self._originations[op_hash]
+            originated = OperationResult.originated_contracts(operation)
+            if len(originated) != len(names):
+                raise RpcError(f"{op_hash} originated {originated}, expected contracts for {', '.join(names)}")
+            self.addresses.update(zip(names, originated))
+        self._included.update(name for name, op_hash in self.groups.items() if op_hash in op_hashes)
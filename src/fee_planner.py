@@ -0,0 +1,158 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from pytezos import PyTezosClient
+from pytezos.operation.fees import hard_gas_limit_per_operation
+from pytezos.operation.result import OperationResult
+from pytezos.rpc.errors import RpcError
+
+from src.interfaces import interface_cache
+from src.relayer import branch_size, signature_size, with_limits
+from src.tracker import OperationTracker
+
+batch_limits_file = Path(__file__).parent.parent / "bench" / "batch_limits.json"
+default_chunk_size = 100
+
+
+def chunk(tokens, gas_of, gas_budget, size):
+    """
+    Splits tokens in consecutive chunks each fitting in the gas budget. A
+    chunk over budget is shrunk in proportion to its excess, or halved when it
+    runs out of gas, and the size found is kept for the next chunks.
+    :param gas_of: function returning the gas of a chunk, None if it runs out of gas
+    :param size: first chunk size tried
+    :return: list of (chunk, gas)
+    """
+    chunks = []
+    start = 0
+    while start < len(tokens):
+        candidate = tokens[start:start + size]
+        gas = gas_of(candidate)
+        if gas is not None and gas <= gas_budget:
+            chunks.append((candidate, gas))
+            start += len(candidate)
+            continue
+        if len(candidate) == 1:
+            raise ValueError(f"Distributing {candidate[0]} alone does not fit in {gas_budget} gas")
+        size = len(candidate) // 2 if gas is None else len(candidate) * gas_budget * 9 // (gas * 10)
+        size = max(1, min(size, len(candidate) - 1))
+    return chunks
+
+
+def measured_chunk_size(path=batch_limits_file):
+    """
+    Largest distribute_tokens list found by bench.scaling, if it was run.
+    """
+    try:
+        return json.loads(Path(path).read_text())["distribute_tokens"]["max_size"] or None
+    except (FileNotFoundError, KeyError, ValueError):
+        return None
+
+
+class FeePlanner:
+    def __init__(self, client: PyTezosClient, quorum_contract, minter_contract,
+                 gas_budget=hard_gas_limit_per_operation * 9 // 10, chunk_size=None, max_in_flight=4,
+                 confirmations=1, tracker=None):
+        """
+        Plans the quorum distribute_tokens calls sharing every token fee the
+        minter holds: tokens without fees are left out, the others are split
+        in calls fitting in the gas budget.
+        :param gas_budget: gas of one call
+        :param chunk_size: tokens tried in the first call, defaults to the
+        limit measured by bench.scaling or 100
+        :param max_in_flight: calls injected before waiting for their inclusion
+        """
+        self.client = client
+        self.quorum = interface_cache.contract(client, quorum_contract)
+        self.minter = interface_cache.contract(client, minter_contract)
+        self.minter_contract = minter_contract
+        self.gas_budget = gas_budget
+        self.chunk_size = chunk_size or measured_chunk_size() or default_chunk_size
+        self.max_in_flight = max_in_flight
+        self.tracker = tracker or OperationTracker(client, confirmations=confirmations)
+
+    def balances(self):
+        """
+        :return: list of ((fa2, token id), fees held by the minter), fees > 0 only
+        """
+        storage = self.minter.storage
+        ledger = storage["fees"]["tokens"].data
+        tokens = sorted(set(storage["assets"]["erc20_tokens"]().values()))
+
+        def balance(token):
+            value = ledger[(self.minter_contract, token)]
+            return 0 if value is None else value.to_python_object()
+
+        with ThreadPoolExecutor(8) as executor:
+            balances = list(executor.map(balance, tokens))
+        return [(token, amount) for token, amount in zip(tokens, balances) if amount > 0]
+
+    def plan(self, tokens):
+        """
+        :param tokens: list of (fa2, token id)
+        :return: list of (tokens, gas, simulated content) of the calls to send
+        """
+        simulated = {}
+
+        def gas_of(candidate):
+            gas, content = self._simulate(candidate)
+            simulated[tuple(candidate)] = content
+            return gas
+
+        chunks = chunk(list(tokens), gas_of, self.gas_budget, self.chunk_size)
+        return [(tokens, gas, simulated[tuple(tokens)]) for tokens, gas in chunks]
+
+    def run(self, plan):
+        """
+        Injects the calls of a plan, max_in_flight at a time, without waiting
+        for one to be included before sending the next.
+        :return: list of (tokens, operation hash, error)
+        """
+        results = []
+        for start in range(0, len(plan), self.max_in_flight):
+            window = plan[start:start + self.max_in_flight]
+            counter = self._chain_counter()
+            injected = []
+            for tokens, _, content in window:
+                try:
+                    injected.append((tokens, self._inject(tokens, content, counter)))
+                    counter += 1
+                except RpcError as e:
+                    results.append((tokens, None, e))
+            for tokens, op_hash in injected:
+                try:
+                    self.tracker.wait_for_ops(op_hash)
+                    results.append((tokens, op_hash, None))
+                except (RpcError, TimeoutError) as e:
+                    results.append((tokens, op_hash, e))
+        return results
+
+    def _call(self, tokens):
+        return self.quorum.distribute_tokens_with_quorum(self.minter_contract, [list(t) for t in tokens])
+
+    def _simulate(self, tokens):
+        """
+        :return: (gas, simulated content), gas is None when the call runs out of gas
+        """
+        result = self.client.bulk(self._call(tokens)).fill().run()
+        if OperationResult.is_applied(result):
+            return OperationResult.consumed_gas(result), result["contents"][0]
+        errors = OperationResult.errors(result)
+        if any("gas_exhausted" in e.get("id", "") for e in errors):
+            return None, None
+        raise RpcError.from_errors(errors)
+
+    def _inject(self, tokens, content, counter):
+        """
+        Limits come from the simulation made by plan(), at the chain counter:
+        the node rejects counters ahead of it.
+        """
+        content, _ = with_limits(content, branch_size + signature_size + 1)
+        content["counter"] = str(counter + 1)
+        opg = self.client.bulk(self._call(tokens)).fill(counter=counter)
+        opg.contents = [content]
+        return opg.sign().inject(_async=True, preapply=False)["hash"]
+
+    def _chain_counter(self):
+        return int(self.client.shell.contracts[self.client.key.public_key_hash()]()["counter"])
@@ -1,5 +1,7 @@
 from pytezos import PyTezosClient
 
+from src.interfaces import interface_cache
+
 
 class Governance(object):
 
@@ -8,8 +10,30 @@ class Governance(object):
 
     def distribute(self, contract_id, to, amount):
         print(f"Distributing {amount} to {to}")
-        contract = self.client.contract(contract_id)
+        contract = interface_cache.contract(self.client, contract_id)
         call = self.client.bulk(contract.distribute([(to, amount * 10 ** 8)]))
 
         res = call.autofill().sign().inject(_async=False)
-        print(f"Done {res[0]['hash']}")
\ No newline at end of file
+        print(f"Done {res[0]['hash']}")
+
+    def distribute_bulk(self, contract_id, recipients, checkpoint=None, max_in_flight=4, dry_run=False):
+        """
+        Distributes $WRAP to every recipient of a file, resuming where a previous run stopped.
+        :param recipients: CSV file of `address,amount` rows, or JSON lines of
+        {"address", "amount"}, amounts in $WRAP. Addresses listed twice get the sum
+        :param checkpoint: SQLite file tracking what was paid, defaults to <recipients>.db
+        :param dry_run: only checks the total fits under max_supply
+        """
+        from src.airdrop import Airdrop, Checkpoint
+        checkpoint = Checkpoint(checkpoint or f"{recipients}.db")
+        try:
+            checkpoint.load(recipients)
+            airdrop = Airdrop(self.client, contract_id, checkpoint, max_in_flight=max_in_flight)
+            if dry_run:
+                total, available = airdrop.check_supply()
+                print(f"Would distribute {total} of the {available} left")
+                return
+            for status, (count, amount) in sorted(airdrop.run().items()):
+                print(f"{status}: {count} recipients, {amount}")
+        finally:
+            checkpoint.close()
@@ -0,0 +1,165 @@
+import re
+from pathlib import Path
+
+root_dir = Path(__file__).parent.parent
+
+_directive_re = re.compile(r'^\s*#\s*(?P<name>include|define|undef|if|ifdef|ifndef|elif|else|endif)\b\s*(?P<arg>.*?)\s*$',
+                           re.MULTILINE)
+_include_re = re.compile(r'"(?P<path>[^"]+)"')
+
+
+def parse_directives(ligo_file):
+    """
+    Returns the preprocessor directives of a LIGO source file, in order.
+    :param ligo_file: path to the LIGO source file
+    :return: list of (directive, argument). Include arguments are resolved
+    relatively to the including file.
+    """
+    ligo_file = Path(ligo_file)
+    directives = []
+    for m in _directive_re.finditer(ligo_file.read_text()):
+        name, arg = m.group("name"), m.group("arg")
+        if name == "include":
+            included = _include_re.search(arg)
+            if not included:
+                continue
+            arg = (ligo_file.parent / included.group("path")).resolve()
+        directives.append((name, arg))
+    return directives
+
+
+def parse_includes(ligo_file):
+    """
+    Returns the files directly included by a LIGO source file, whatever
+    preprocessor branch they sit in.
+    :param ligo_file: path to the LIGO source file
+    :return: list of pathlib.Path
+    """
+    return [arg for (name, arg) in parse_directives(ligo_file) if name == "include"]
+
+
+def _evaluate(condition, defines):
+    """
+    Evaluates `#if` conditions made of symbols, `!`, `&&` and `||`.
+    """
+    def term(t):
+        t = t.strip()
+        if t.startswith("!"):
+            return not term(t[1:])
+        if t.startswith("defined"):
+            t = t[len("defined"):].strip("() ")
+        return t in defines
+
+    return any(all(term(t) for t in alternative.split("&&")) for alternative in condition.split("||"))
+
+
+class _Preprocessor:
+    def __init__(self, defines=()):
+        self.defines = set(defines)
+        self.files = {}
+        self._reading = set()
+
+    def visit(self, ligo_file):
+        self.files[ligo_file] = None
+        if ligo_file in self._reading:
+            return
+        try:
+            directives = parse_directives(ligo_file)
+        except FileNotFoundError:
+            return
+        self._reading.add(ligo_file)
+        self._expand(directives)
+        self._reading.discard(ligo_file)
+
+    def _expand(self, directives):
+        # each frame: (parent block active, one branch of this block already taken)
+        stack = []
+        active = True
+        for name, arg in directives:
+            if name in ("if", "ifdef", "ifndef"):
+                if name == "ifdef":
+                    taken = arg in self.defines
+                elif name == "ifndef":
+                    taken = arg not in self.defines
+                else:
+                    taken = _evaluate(arg, self.defines)
+                stack.append((active, taken))
+                active = active and taken
+            elif name == "elif" and stack:
+                parent, done = stack[-1]
+                taken = not done and _evaluate(arg, self.defines)
+                stack[-1] = (parent, done or taken)
+                active = parent and taken
+            elif name == "else" and stack:
+                parent, done = stack[-1]
+                stack[-1] = (parent, True)
+                active = parent and not done
+            elif name == "endif" and stack:
+                active, _ = stack.pop()
+            elif not active:
+                continue
+            elif name == "define":
+                self.defines.add(arg.split()[0] if arg else arg)
+            elif name == "undef":
+                self.defines.discard(arg)
+            elif name == "include":
+                self.visit(arg)
+
+
+def include_closure(ligo_file, defines=()):
+    """
+    Returns the LIGO source file and every file the preprocessor reads while
+    expanding it, in reading order. `#if`/`#define` guards are honoured the
+    same way ligo does, so an include that sits in a branch that is never
+    taken is not part of the closure. Included files that do not exist
+    (generated files for instance) are listed too.
+    :param ligo_file: path to the LIGO source file
+    :param defines: symbols defined before reading the file
+    :return: list of pathlib.Path
+    """
+    preprocessor = _Preprocessor(defines)
+    preprocessor.visit(Path(ligo_file).resolve())
+    return list(preprocessor.files)
+
+
+class IncludeGraph:
+    def __init__(self, directories=("ligo", "admin"), base=root_dir):
+        """
+        Indexes every LIGO file found under the given directories.
+        :param directories: directories to scan, relative to base
+        :param base: repository root
+        """
+        self.base = Path(base).resolve()
+        self.files = sorted(f.resolve() for d in directories for f in (self.base / d).rglob("*.mligo"))
+        self._closures = {}
+
+    def dependencies(self, ligo_file):
+        """
+        Returns every file ligo_file depends on, including itself.
+        """
+        ligo_file = self._resolve(ligo_file)
+        if ligo_file not in self._closures:
+            self._closures[ligo_file] = frozenset(include_closure(ligo_file))
+        return self._closures[ligo_file]
+
+    def dependents(self, changed):
+        """
+        Returns the indexed files that must be rebuilt when any of the changed
+        files is modified.
+        :param changed: iterable of paths, relative to the repository root or absolute
+        """
+        changed = {self._resolve(c) for c in changed}
+        return [f for f in self.files if changed & self.dependencies(f)]
+
+    def affected(self, targets, changed):
+        """
+        Filters targets depending on at least one changed file.
+        :param targets: dict of target name to main LIGO file
+        :param changed: iterable of changed paths
+        :return: list of target names
+        """
+        changed = {self._resolve(c) for c in changed}
+        return [name for name, ligo_file in targets.items() if changed & self.dependencies(ligo_file)]
+
+    def _resolve(self, path):
+        return (self.base / path).resolve()
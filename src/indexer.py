@@ -0,0 +1,403 @@
+import hashlib
+import json
+import os
+import sqlite3
+
+from pytezos import PyTezosClient
+from pytezos.michelson.forge import forge_script_expr
+from pytezos.michelson.types.base import MichelsonType
+
+default_index_file = "index.db"
+# levels kept in the undo log, deeper reorgs need a new index
+max_reorg_depth = 60
+_manager_pass = 3
+_event_id_type = MichelsonType.match({"prim": "pair", "args": [{"prim": "bytes"}, {"prim": "nat"}]})
+
+
+def big_maps_of(type_expr, value_expr, path=()):
+    """
+    Finds the big_maps of a storage.
+    :param type_expr: micheline of the storage type
+    :param value_expr: micheline of the storage value, big_maps given by id
+    :return: list of (path of field annotations joined by dots, big_map id, big_map type)
+    """
+    return [(path, int(value["int"]), ty) for path, ty, value in storage_fields(type_expr, value_expr)
+            if ty["prim"] == "big_map"]
+
+
+def storage_fields(type_expr, value_expr, path=()):
+    """
+    Splits a storage into the fields of its records.
+    :return: list of (path of field annotations joined by dots, type, value) micheline
+    """
+    annots = [a[1:] for a in type_expr.get("annots", []) if a.startswith("%")]
+    path = path + tuple(annots)
+    if type_expr["prim"] != "pair":
+        return [(".".join(path), type_expr, value_expr)]
+    args = type_expr["args"]
+    values = value_expr if isinstance(value_expr, list) else value_expr["args"]
+    if len(args) > 2:
+        args = [args[0], {"prim": "pair", "args": args[1:]}]
+    if len(values) > 2:
+        values = [values[0], values[1:]]
+    return [found for arg, value in zip(args, values) for found in storage_fields(arg, value, path)]
+
+
+def mint_key(block_hash, log_index):
+    """
+    Key of an ethereum event in the minter's mints: blake2b hash of the packed event id.
+    :param block_hash: bytes
+    """
+    packed = _event_id_type.from_python_object((block_hash, log_index)).pack()
+    return hashlib.blake2b(packed, digest_size=32).digest()
+
+
+def _json(py_obj):
+    return json.dumps(py_obj, sort_keys=True, default=_encode)
+
+
+def _encode(o):
+    if isinstance(o, bytes):
+        return o.hex()
+    if isinstance(o, (set, frozenset)):
+        return sorted(o)
+    return str(o)
+
+
+def _diffs(result):
+    """
+    :return: list of (big_map id, action, updates) of an applied operation result
+    """
+    if result.get("status") != "applied":
+        return []
+    if "lazy_storage_diff" in result:
+        return [(int(d["id"]), d["diff"]["action"], d["diff"].get("updates", []))
+                for d in result["lazy_storage_diff"] if d["kind"] == "big_map"]
+    return [(int(d["big_map"]), d["action"], [d] if d["action"] == "update" else [])
+            for d in result.get("big_map_diff", []) if "big_map" in d]
+
+
+class BigMapIndex:
+    def __init__(self, client: PyTezosClient, path=None):
+        """
+        SQLite copy of the big_maps of watched contracts, kept up to date by
+        applying the big_map diffs of every block. Changes of the last
+        max_reorg_depth levels are kept to undo blocks left by a reorg.
+        :param path: database file, defaults to $INDEX_FILE or index.db
+        """
+        self.client = client
+        self.path = path or os.environ.get("INDEX_FILE") or default_index_file
+        self.db = sqlite3.connect(self.path)
+        self.db.executescript("""
+            create table if not exists blocks (level integer primary key, hash text not null);
+            create table if not exists big_maps (id integer primary key, contract text not null, path text not null,
+                                                 type text not null);
+            create table if not exists entries (big_map integer not null, key_hash text not null,
+                                                key text not null, value text,
+                                                primary key (big_map, key_hash));
+            create table if not exists undo (level integer not null, big_map integer not null, key_hash text not null,
+                                             key text, value text);
+            create index if not exists undo_level on undo (level);
+        """)
+        self._types = {}
+
+    def watch(self, address):
+        """
+        Indexes the big_maps of a contract from now on. Sync from the
+        contract's origination level to get the entries it already has.
+        """
+        script = self.client.shell.contracts[address].script()
+        storage_type = next(s for s in script["code"] if s["prim"] == "storage")["args"][0]
+        with self.db:
+            for path, ptr, type_expr in big_maps_of(storage_type, script["storage"]):
+                self.db.execute("insert or replace into big_maps values (?, ?, ?, ?)",
+                                (ptr, address, path, json.dumps(type_expr)))
+
+    def level(self):
+        """
+        :return: last indexed level, None before the first sync
+        """
+        return self.db.execute("select max(level) from blocks").fetchone()[0]
+
+    def sync(self, from_level=None, to_level=None):
+        """
+        Applies the blocks baked since the last sync, undoing first the ones a reorg replaced.
+        :param from_level: first level indexed, only used by the first sync. Defaults to head
+        :param to_level: last level indexed, defaults to head
+        :return: last indexed level
+        """
+        head = self.client.shell.blocks["head"].header()["level"]
+        target = min(to_level or head, head)
+        while self.level() is not None and self._hash(self.level()) != self._node_hash(self.level()):
+            self._rollback(self.level())
+        while True:
+            last = self.level()
+            level = (from_level or target) if last is None else last + 1
+            if level > target:
+                return last
+            block = self.client.shell.blocks[level]()
+            if last is not None and block["header"]["predecessor"] != self._hash(last):
+                self._rollback(last)
+                continue
+            self._apply(level, block)
+
+    def get(self, address, path, key):
+        """
+        :param key: python value of the key, as given to pytezos
+        :return: python value of the entry, None if missing
+        """
+        ptr, ty = self._big_map(address, path)
+        row = self.db.execute("select value from entries where big_map = ? and key_hash = ?",
+                              (ptr, self._key_hash(ty, key))).fetchone()
+        return None if row is None or row[0] is None else json.loads(row[0])
+
+    def entries(self, address, path):
+        """
+        :return: list of (key, value) python values
+        """
+        ptr, _ = self._big_map(address, path)
+        return [(json.loads(k), json.loads(v)) for k, v in
+                self.db.execute("select key, value from entries where big_map = ? order by key", (ptr,))]
+
+    def minted(self, minter, block_hash, log_index):
+        """
+        :return: True if the ethereum event was already minted
+        """
+        block_hash = bytes.fromhex(block_hash.removeprefix("0x"))
+        ptr, ty = self._big_map(minter, "assets.mints")
+        if self._hashed_mints(ptr):
+            key = mint_key(block_hash, log_index)
+        else:
+            key = {"block_hash": block_hash, "log_index": log_index}
+        return self.db.execute("select 1 from entries where big_map = ? and key_hash = ?",
+                               (ptr, self._key_hash(ty, key))).fetchone() is not None
+
+    def mint_events(self, minter):
+        """
+        Events minted by a minter keying mints by event id, to import them in
+        a minter keying them by hash.
+        :return: sorted list of (block hash hex, log index) of the events minted
+        """
+        ptr, _ = self._big_map(minter, "assets.mints")
+        if self._hashed_mints(ptr):
+            raise ValueError(f"Mints of {minter} are keyed by hash, their events cannot be listed")
+        return sorted((key["block_hash"], key["log_index"]) for key, _ in self.entries(minter, "assets.mints"))
+
+    def fee_balances(self, minter, beneficiary=None):
+        """
+        Balances a withdrawal would pay: the settled ones plus the signers'
+        shares distributed since they were last settled, read from the
+        storage at the indexed level.
+        :param beneficiary: address, all beneficiaries if not given
+        :return: dict beneficiary -> {"xtz": mutez, "tokens": {(fa2, token id): amount}}
+        """
+        balances = {}
+        for owner, amount in self.entries(minter, "fees.xtz"):
+            balances.setdefault(owner, {"xtz": 0, "tokens": {}})["xtz"] = amount
+        for key, amount in self.entries(minter, "fees.tokens"):
+            owner, fa2, token_id = _flatten(key)
+            balances.setdefault(owner, {"xtz": 0, "tokens": {}})["tokens"][(fa2, token_id)] = amount
+        for owner, pending in self._unsettled_shares(minter).items():
+            balance = balances.setdefault(owner, {"xtz": 0, "tokens": {}})
+            balance["xtz"] += pending["xtz"]
+            for token, amount in pending["tokens"].items():
+                balance["tokens"][token] = balance["tokens"].get(token, 0) + amount
+        return balances if beneficiary is None else {beneficiary: balances.get(beneficiary, {"xtz": 0, "tokens": {}})}
+
+    def balances(self, fa2, owner):
+        """
+        Balances in an FA2 ledger: multi asset (owner, token id) -> amount,
+        single asset owner -> amount or nft token id -> owner.
+        :return: dict token id -> amount
+        """
+        result = {}
+        for key, value in self.entries(fa2, "assets.ledger"):
+            if isinstance(key, list):
+                key_owner, token_id = _flatten(key)
+                if key_owner == owner:
+                    result[token_id] = value
+            elif isinstance(key, int):
+                if value == owner:
+                    result[key] = 1
+            elif key == owner:
+                result[0] = value
+        return result
+
+    def close(self):
+        self.db.close()
+
+    def _apply(self, level, block):
+        with self.db:
+            for ptr, action, updates in self._block_diffs(block):
+                if action == "remove":
+                    for key_hash, key, value in self.db.execute(
+                            "select key_hash, key, value from entries where big_map = ?", (ptr,)).fetchall():
+                        self.db.execute("insert into undo values (?, ?, ?, ?, ?)", (level, ptr, key_hash, key, value))
+                    self.db.execute("delete from entries where big_map = ?", (ptr,))
+                for update in updates:
+                    self._update(level, ptr, update)
+            self.db.execute("insert into blocks values (?, ?)", (level, block["hash"]))
+            self.db.execute("delete from blocks where level <= ?", (level - max_reorg_depth,))
+            self.db.execute("delete from undo where level <= ?", (level - max_reorg_depth,))
+
+    def _block_diffs(self, block):
+        watched = {row[0] for row in self.db.execute("select id from big_maps")}
+        diffs = []
+        for operation in block["operations"][_manager_pass]:
+            for content in operation["contents"]:
+                metadata = content.get("metadata", {})
+                results = [metadata.get("operation_result", {})]
+                results.extend(r["result"] for r in metadata.get("internal_operation_results", []))
+                diffs.extend(d for result in results for d in _diffs(result) if d[0] in watched)
+        return diffs
+
+    def _update(self, level, ptr, update):
+        previous = self.db.execute("select key, value from entries where big_map = ? and key_hash = ?",
+                                   (ptr, update["key_hash"])).fetchone()
+        self.db.execute("insert into undo values (?, ?, ?, ?, ?)",
+                        (level, ptr, update["key_hash"], *(previous or (None, None))))
+        if update.get("value") is None:
+            self.db.execute("delete from entries where big_map = ? and key_hash = ?", (ptr, update["key_hash"]))
+            return
+        ty = self._type(ptr)
+        key = ty.args[0].from_micheline_value(update["key"]).to_python_object()
+        value = ty.args[1].from_micheline_value(update["value"]).to_python_object()
+        self.db.execute("insert or replace into entries values (?, ?, ?, ?)",
+                        (ptr, update["key_hash"], _json(key), _json(value)))
+
+    def _rollback(self, level):
+        """
+        Undoes the changes of the last indexed level, in reverse order.
+        """
+        if not self.db.execute("select 1 from blocks where level < ?", (level,)).fetchone():
+            raise ValueError(f"Reorg below the first level kept, level {level}: rebuild the index")
+        print(f"Reorg: undoing level {level}")
+        with self.db:
+            for ptr, key_hash, key, value in self.db.execute(
+                    "select big_map, key_hash, key, value from undo where level = ? order by rowid desc",
+                    (level,)).fetchall():
+                if key is None:
+                    self.db.execute("delete from entries where big_map = ? and key_hash = ?", (ptr, key_hash))
+                else:
+                    self.db.execute("insert or replace into entries values (?, ?, ?, ?)", (ptr, key_hash, key, value))
+            self.db.execute("delete from undo where level = ?", (level,))
+            self.db.execute("delete from blocks where level = ?", (level,))
+
+    def _hash(self, level):
+        return self.db.execute("select hash from blocks where level = ?", (level,)).fetchone()[0]
+
+    def _node_hash(self, level):
+        return self.client.shell.blocks[level].hash()
+
+    def _big_map(self, address, path):
+        row = self.db.execute("select id from big_maps where contract = ? and path = ?", (address, path)).fetchone()
+        if row is None:
+            raise ValueError(f"{path} of {address} is not indexed")
+        return row[0], self._type(row[0])
+
+    def _unsettled_shares(self, minter):
+        """
+        Holders' shares times what was distributed per share since their
+        checkpoints, as the minter settles them.
+        :return: dict holder -> {"xtz": mutez, "tokens": {(fa2, token id): amount}}
+        """
+        fields = self._storage_fields(minter)
+        if "fees.shares.holders" not in fields:
+            # minter without signer shares, balances are all settled
+            return {}
+        holders = fields["fees.shares.holders"]
+        xtz_checkpoints = dict(self.entries(minter, "fees.shares.xtz_checkpoints"))
+        token_checkpoints = {_flatten(key): index
+                             for key, index in self.entries(minter, "fees.shares.token_checkpoints")}
+        tokens_per_share = [(_flatten(key), index)
+                            for key, index in self.entries(minter, "fees.shares.tokens_per_share")]
+        unsettled = {}
+        for holder, shares in holders.items():
+            pending = {"xtz": (fields["fees.shares.xtz_per_share"] - xtz_checkpoints.get(holder, 0)) * shares,
+                       "tokens": {}}
+            for token, index in tokens_per_share:
+                amount = (index - token_checkpoints.get((holder, *token), 0)) * shares
+                if amount:
+                    pending["tokens"][token] = amount
+            if pending["xtz"] or pending["tokens"]:
+                unsettled[holder] = pending
+        return unsettled
+
+    def _storage_fields(self, address):
+        """
+        :return: dict path -> python value of the storage fields which are not big_maps, at the indexed level
+        """
+        script = self.client.shell.blocks[self.level() or "head"].context.contracts[address].script()
+        storage_type = next(s for s in script["code"] if s["prim"] == "storage")["args"][0]
+        return {path: MichelsonType.match(ty).from_micheline_value(value).to_python_object()
+                for path, ty, value in storage_fields(storage_type, script["storage"]) if ty["prim"] != "big_map"}
+
+    def _hashed_mints(self, ptr):
+        """
+        :return: True for mints keyed by the hash of the event id
+        """
+        type_expr = json.loads(self.db.execute("select type from big_maps where id = ?", (ptr,)).fetchone()[0])
+        return type_expr["args"][0]["prim"] == "bytes"
+
+    def _type(self, ptr):
+        if ptr not in self._types:
+            type_expr = self.db.execute("select type from big_maps where id = ?", (ptr,)).fetchone()[0]
+            self._types[ptr] = MichelsonType.match(json.loads(type_expr))
+        return self._types[ptr]
+
+    @staticmethod
+    def _key_hash(ty, key):
+        return forge_script_expr(ty.args[0].from_python_object(key).pack(legacy=True))
+
+
+def _flatten(key):
+    """
+    Nested pairs of a key as a flat tuple.
+    """
+    if isinstance(key, list):
+        return tuple(v for k in key for v in _flatten(k))
+    return key,
+
+
+class Index(object):
+    def __init__(self, client: PyTezosClient):
+        self.client = client
+
+    def sync(self, contracts: list[str], from_level=None, index_file=None):
+        """
+        Indexes the big_maps of the contracts up to head.
+        :param contracts: minter, quorum or FA2 addresses
+        :param from_level: level to start from on the first sync, the
+        origination of the contracts to index their existing entries
+        """
+        index = BigMapIndex(self.client, index_file)
+        try:
+            watched = {row[0] for row in index.db.execute("select contract from big_maps")}
+            for address in contracts:
+                if address not in watched:
+                    index.watch(address)
+            print(f"Indexed up to level {index.sync(from_level)}")
+        finally:
+            index.close()
+
+    def minted(self, minter_contract, block_hash, log_index, index_file=None):
+        index = BigMapIndex(self.client, index_file)
+        try:
+            print(index.minted(minter_contract, block_hash, log_index))
+        finally:
+            index.close()
+
+    def fees(self, minter_contract, beneficiary=None, index_file=None):
+        index = BigMapIndex(self.client, index_file)
+        try:
+            for owner, balance in index.fee_balances(minter_contract, beneficiary).items():
+                print(f"{owner}: {balance['xtz']} mutez, tokens {balance['tokens']}")
+        finally:
+            index.close()
+
+    def balances(self, fa2_contract, owner, index_file=None):
+        index = BigMapIndex(self.client, index_file)
+        try:
+            print(index.balances(fa2_contract, owner))
+        finally:
+            index.close()
@@ -0,0 +1,145 @@
+import hashlib
+import json
+import os
+import threading
+import weakref
+from pathlib import Path
+
+from pytezos import ContractInterface, PyTezosClient
+from pytezos.context.impl import ExecutionContext
+from pytezos.michelson.program import MichelsonProgram
+from pytezos.rpc.errors import RpcError
+
+from src.cache import atomic_write
+
+
+def code_hash(code):
+    """
+    :param code: micheline of the contract code, [parameter, storage, code]
+    :return: hex digest, independent of the JSON formatting
+    """
+    return hashlib.sha256(json.dumps(code, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+
+class InterfaceCache:
+    def __init__(self, directory=None):
+        """
+        Contract interfaces by address. A contract's code never changes once
+        originated, so its script is fetched once and parsed once per code
+        hash: contracts originated from the same code share the parsed program.
+        Entries are bound to the chain they were read from, identified by its
+        first block, so a restarted sandbox reusing the same addresses does not
+        get stale interfaces.
+        :param directory: where scripts are persisted between runs. Defaults to
+        $CONTRACT_CACHE_DIR, memory only if unset
+        """
+        directory = directory or os.environ.get("CONTRACT_CACHE_DIR")
+        self.directory = Path(directory) if directory else None
+        self.fetches = 0
+        self.hits = 0
+        # (chain, address) -> code hash
+        self._addresses = {}
+        # code hash -> (code, ContractInterface subclass)
+        self._programs = {}
+        # client context -> {address: ContractInterface}
+        self._interfaces = weakref.WeakKeyDictionary()
+        # shell -> chain key
+        self._chains = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def contract(self, client: PyTezosClient, address) -> ContractInterface:
+        """
+        Same as client.contract(address), without the script request and
+        parsing once the address is known.
+        """
+        with self._lock:
+            interfaces = self._interfaces.setdefault(client.context, {})
+            if address in interfaces:
+                self.hits += 1
+                return interfaces[address]
+            chain = self._chain(client)
+            digest = self._addresses.get((chain, address)) or self._load(chain, address)
+            if digest is None:
+                digest = self._fetch(client, chain, address)
+            else:
+                self.hits += 1
+            code, cls = self._programs[digest]
+            interface = cls(ExecutionContext(shell=client.context.shell, key=client.context.key, address=address,
+                                             script={"code": code}, mode=client.context.mode))
+            interfaces[address] = interface
+            return interface
+
+    def forget(self, address):
+        """
+        Drops an address, from the disk too. The next call fetches its script.
+        """
+        with self._lock:
+            self._addresses = {k: v for k, v in self._addresses.items() if k[1] != address}
+            for interfaces in self._interfaces.values():
+                interfaces.pop(address, None)
+            if self.directory is not None:
+                self._path(address).unlink(missing_ok=True)
+
+    def stats(self):
+        return {"fetches": self.fetches, "hits": self.hits}
+
+    def _chain(self, client):
+        shell = client.context.shell
+        if shell not in self._chains:
+            try:
+                self._chains[shell] = shell.blocks[1].hash()
+            except RpcError:
+                # history pruned below level 1, the chain id is the best we have
+                self._chains[shell] = shell.chains.main.chain_id()
+        return self._chains[shell]
+
+    def _fetch(self, client, chain, address):
+        try:
+            script = client.context.shell.contracts[address].script()
+        except RpcError as e:
+            raise RpcError(f'Contract {address} not found', *e.args)
+        self.fetches += 1
+        digest = self._register(chain, address, script["code"])
+        if self.directory is not None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            atomic_write(self._path(address),
+                         json.dumps({"chain": chain, "code_hash": digest, "code": script["code"]}))
+        return digest
+
+    def _load(self, chain, address):
+        """
+        Reads a persisted script, ignored if it was read from another chain or
+        does not match its code hash.
+        :return: code hash, None if not usable
+        """
+        if self.directory is None:
+            return None
+        try:
+            entry = json.loads(self._path(address).read_text())
+        except (FileNotFoundError, ValueError):
+            return None
+        if entry.get("chain") != chain or code_hash(entry.get("code")) != entry.get("code_hash"):
+            return None
+        return self._register(chain, address, entry["code"])
+
+    def _register(self, chain, address, code):
+        digest = code_hash(code)
+        if digest not in self._programs:
+            program = MichelsonProgram.load(ExecutionContext(script={"code": code}), with_code=True)
+            cls = type(ContractInterface.__name__, (ContractInterface,), dict(program=program))
+            self._programs[digest] = (code, cls)
+        self._addresses[(chain, address)] = digest
+        return digest
+
+    def _path(self, address):
+        return self.directory / f"{address}.json"
+
+
+interface_cache = InterfaceCache()
+
+
+def contract(client: PyTezosClient, address) -> ContractInterface:
+    """
+    Contract interface from the shared cache.
+    """
+    return interface_cache.contract(client, address)
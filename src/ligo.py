@@ -1,12 +1,17 @@
+import asyncio
 import json
 import os
-from io import TextIOWrapper
+import re
+import shlex
+import tempfile
 from pathlib import Path
-from subprocess import Popen, PIPE
 
 from pytezos import pytezos, ContractInterface, michelson_to_micheline
 from pytezos.operation.result import OperationResult
-from pytezos.rpc.errors import RpcError
+
+from src.cache import compile_cache, file_digest, sources_digest
+from src.runner import run_command, run_command_async
+from src.tracker import OperationTracker
 
 ligo_version = "0.10.0"
 # ligo_cmd = (
@@ -16,17 +21,26 @@ ligo_cmd = (
     f'ligo'
 )
 
+ligo_timeout = 600
 
-def execute_command(command):
-    wd = Path(__file__).parent.parent
-    with Popen(command, stdout=PIPE, stderr=PIPE, shell=True, cwd=wd) as p:
-        with TextIOWrapper(p.stdout) as out, TextIOWrapper(p.stderr) as err:
-            michelson = out.read()
-            if not michelson:
-                msg = err.read()
-                raise Exception(msg)
-            else:
-                return michelson
+root_dir = Path(__file__).parent.parent
+
+
+def ligo_command(*args):
+    return shlex.split(ligo_cmd) + [str(a) for a in args]
+
+
+async def execute_command_async(command, timeout=ligo_timeout):
+    """
+    Runs a ligo command, see src.runner.run_command_async.
+    :param command: list of program arguments, see ligo_command
+    :return: stdout of the command
+    """
+    return await run_command_async(command, cwd=root_dir, timeout=timeout)
+
+
+def execute_command(command, timeout=ligo_timeout):
+    return run_command(command, cwd=root_dir, timeout=timeout)
 
 
 class LigoView:
@@ -34,6 +48,32 @@ class LigoView:
         self.ligo_file = ligo_file
 
     def compile(self, view_name, return_type, description=""):
+        return asyncio.run(self.compile_async(view_name, return_type, description))
+
+    async def compile_async(self, view_name, return_type, description=""):
+        code, parameter = await asyncio.gather(self._compile_expression(view_name),
+                                               self._compile_parameter(view_name))
+        return self._storage_view(view_name, return_type, description, code, parameter)
+
+    def compile_all(self, views):
+        """
+        Compiles several views of the same file. Parameter types of all views
+        are extracted from a single contract compilation, and the view
+        expressions are compiled concurrently.
+        :param views: list of (view_name, return_type, description)
+        :return: list of TZIP-16 view definitions, in the same order
+        """
+        return asyncio.run(self.compile_all_async(views))
+
+    async def compile_all_async(self, views):
+        names = [v[0] for v in views]
+        parameters, *codes = await asyncio.gather(self._compile_parameters(names),
+                                                  *[self._compile_expression(n) for n in names])
+        return [self._storage_view(name, return_type, description, code, parameter)
+                for (name, return_type, description), code, parameter in zip(views, codes, parameters)]
+
+    @staticmethod
+    def _storage_view(view_name, return_type, description, code, parameter):
         return_type = michelson_to_micheline(return_type)
         result = {
             "name": view_name,
@@ -43,42 +83,124 @@ class LigoView:
                 {
                     "michelsonStorageView": {
                         "returnType": return_type,
-                        "code": self._compile_expression(view_name)
+                        "code": code
                     }
                 }
             ]
         }
-        parameter = self._compile_parameter(view_name)
         if parameter != json.loads('{"prim": "unit"}'):
             result["implementations"][0]["michelsonStorageView"]["parameter"] = parameter
 
         return result
 
-    def _compile_expression(self, view_name):
-        command = f"{ligo_cmd} compile-expression " \
-                  f"--michelson-format=json " \
-                  f"--init-file={self.ligo_file} " \
-                  f"cameligo " \
-                  f"'{view_name}_view'"
-        return json.loads(execute_command(command))
-
-    def _compile_parameter(self, view_name):
-        command = f"{ligo_cmd} compile-contract " \
-                  f"--michelson-format=json " \
-                  f"{self.ligo_file} " \
-                  f"'{view_name}'_main"
-        result = json.loads(execute_command(command))
+    async def _compile_expression(self, view_name):
+        command = ligo_command("compile-expression",
+                               "--michelson-format=json",
+                               f"--init-file={self.ligo_file}",
+                               "cameligo",
+                               f"{view_name}_view")
+        return json.loads(await execute_command_async(command))
+
+    async def _compile_parameter(self, view_name):
+        command = ligo_command("compile-contract",
+                               "--michelson-format=json",
+                               self.ligo_file,
+                               f"{view_name}_main")
+        result = json.loads(await execute_command_async(command))
         return result[0]['args'][0]
 
+    async def _compile_parameters(self, view_names):
+        """
+        Compiles one contract whose parameter is a comb of every view
+        parameter, then splits it back into one type per view.
+        """
+        if len(view_names) == 1:
+            return [await self._compile_parameter(view_names[0])]
+        source = self._batch_source(view_names)
+        with tempfile.TemporaryDirectory() as tmp:
+            batch_file = Path(tmp) / "views_batch.mligo"
+            batch_file.write_text(source)
+            command = ligo_command("compile-contract",
+                                   "--michelson-format=json",
+                                   batch_file,
+                                   "views_batch_main")
+            result = json.loads(await execute_command_async(command))
+        node = result[0]['args'][0]
+        parameters = []
+        for i in range(len(view_names)):
+            if i < len(view_names) - 1:
+                branch, node = node['args']
+            else:
+                branch = node
+            parameters.append(_strip_annotation(branch, f"%view_{i}"))
+        return parameters
+
+    def _batch_source(self, view_names):
+        views_file = (root_dir / self.ligo_file).resolve()
+        text = views_file.read_text()
+        signatures = [_view_main_signature(text, name) for name in view_names]
+        storage_type = signatures[0][1]
+        constructors = "\n".join(f"| View_{i} of {parameter}" for i, (parameter, _) in enumerate(signatures))
+        return f'#include "{views_file}"\n\n' \
+               f"type views_batch_parameter =\n[@layout:comb]\n{constructors}\n\n" \
+               f"let views_batch_main ((p, s): (views_batch_parameter * {storage_type})) " \
+               f": (operation list * {storage_type}) = (([]: operation list), s)\n"
+
+
+def _view_main_signature(text, view_name):
+    """
+    Finds parameter and storage types in the signature of <view_name>_main.
+    The parameter type may itself hold parentheses and tuples, the storage
+    type is what follows the last `*` outside of them.
+    """
+    pattern = rf"let\s+{view_name}_main\s*\(+\s*\w+\s*,\s*\w+\s*\)?\s*:"
+    match = re.search(pattern, text)
+    if not match:
+        raise Exception(f"cannot find {view_name}_main signature")
+    depth, end = 0, match.end()
+    while end < len(text) and (depth or text[end] != ")"):
+        depth += {"(": 1, ")": -1}.get(text[end], 0)
+        end += 1
+    pair = text[match.end():end].strip()
+    if pair.startswith("(") and _closing_parenthesis(pair, 0) == len(pair) - 1:
+        pair = pair[1:-1]
+    depth, star = 0, None
+    for i, c in enumerate(pair):
+        depth += {"(": 1, ")": -1}.get(c, 0)
+        if c == "*" and depth == 0:
+            star = i
+    if star is None:
+        raise Exception(f"cannot find {view_name}_main storage type")
+    return pair[:star].strip(), pair[star + 1:].strip()
+
+
+def _closing_parenthesis(text, start):
+    depth = 0
+    for i in range(start, len(text)):
+        depth += {"(": 1, ")": -1}.get(text[i], 0)
+        if depth == 0:
+            return i
+    return None
+
+
+def _strip_annotation(node, annotation):
+    annots = [a for a in node.get('annots', []) if a != annotation]
+    node = {k: v for k, v in node.items() if k != 'annots'}
+    if annots:
+        node['annots'] = annots
+    return node
+
 
 class LigoContract:
-    def __init__(self, ligo_file, main_func):
+    def __init__(self, ligo_file, main_func, cache=compile_cache):
         """
         :param ligo_file: path to the contract LIGO source file.
         :param main_func: name of the contract entry point function
+        :param cache: CompileCache used to skip ligo when sources did not change, None to disable it
         """
         self.ligo_file = ligo_file
         self.main_func = main_func
+        self.cache = cache
         self.contract_interface = None
 
     def __call__(self):
@@ -87,15 +209,38 @@ class LigoContract:
     def compile_contract(self):
         """
         Force compilation of LIGO contract from source file and loads it into
-        pytezos.
+        pytezos. The Michelson is taken from the compile cache when neither the
+        sources nor the ligo version changed.
         :return: pytezos.ContractInterface
         """
-        command = f"{ligo_cmd} compile-contract {self.ligo_file} {self.main_func}"
-        michelson = execute_command(command)
-
+        michelson = self.compile_michelson()
         self.contract_interface = ContractInterface.from_michelson(michelson)
         return self.contract_interface
 
+    def compile_michelson(self):
+        """
+        Returns the Michelson source of the contract, from the compile cache if
+        possible.
+        :return: str
+        """
+        return asyncio.run(self.compile_michelson_async())
+
+    async def compile_michelson_async(self):
+        if self.cache is None:
+            return await self._run_compile()
+        key = self.cache_key()
+        michelson = self.cache.get(key)
+        if michelson is None:
+            michelson = self.cache.put(key, await self._run_compile())
+        return michelson
+
+    def cache_key(self):
+        return sources_digest(self.ligo_file, self.main_func, ligo_version)
+
+    async def _run_compile(self):
+        command = ligo_command("compile-contract", self.ligo_file, self.main_func)
+        return await execute_command_async(command)
+
     def get_contract(self):
         """
         Returns pytezos contract. If it is not loaded et, compiles it from LIGO
@@ -119,6 +264,24 @@ class LigoContract:
             return stripped
 
 
+def load_contract_file(path, cache=compile_cache):
+    """
+    Loads a Michelson file into pytezos. The Micheline parsed from the file is
+    cached under the hash of its content, so each version of the file is
+    tokenized only once.
+    :param path: path to the .tz file
+    :param cache: CompileCache holding parsed files, None to disable it
+    :return: pytezos.ContractInterface
+    """
+    if cache is None:
+        return ContractInterface.from_file(path)
+    key = file_digest(path)
+    micheline = cache.get(key, suffix=".json")
+    if micheline is None:
+        micheline = cache.put(key, json.dumps(michelson_to_micheline(Path(path).read_text())), suffix=".json")
+    return ContractInterface.from_micheline(json.loads(micheline))
+
+
 def get_consumed_gas(op_res):
     gs = (r["consumed_gas"] for r in OperationResult.iter_results(op_res))
     return [int(g) for g in gs]
@@ -135,15 +298,17 @@ def pformat_consumed_gas(op_res):
 
 
 class PtzUtils:
-    def __init__(self, client: pytezos, block_depth=5, num_blocks_wait=3):
+    def __init__(self, client: pytezos, block_depth=5, num_blocks_wait=3, confirmations=1):
         """
         :param client: PyTezosClient
         :param block_depth number of recent blocks to test when checking for operation status
         :param num_blocks_wait number of backed blocks to retry wait until failing with timeout
+        :param confirmations number of blocks an operation must be buried under, 1 for its own block
         """
         self.client: pytezos = client
         self.block_depth = block_depth
         self.num_blocks_wait = num_blocks_wait
+        self.confirmations = confirmations
 
     def using(self, shell=None, key=None):
         new_client = self.client.using(
@@ -153,44 +318,24 @@ class PtzUtils:
             new_client,
             block_depth=self.block_depth,
             num_blocks_wait=self.num_blocks_wait,
+            confirmations=self.confirmations,
         )
 
+    def tracker(self):
+        return OperationTracker(self.client, confirmations=self.confirmations,
+                                timeout_blocks=self.num_blocks_wait + self.confirmations - 1,
+                                lookback=self.block_depth)
+
     def wait_for_ops(self, *ops):
         """
         Waits for specified operations to be completed successfully.
         If any of the operations fails, raises exception.
         :param *ops: list of operation descriptors returned by inject()
         """
+        return asyncio.run(self.wait_for_ops_async(*ops))
 
-        for _ in range(self.num_blocks_wait):
-            chr = (self._check_op(op) for op in ops)
-            res = [op_res for op_res in chr if op_res]
-            if len(ops) == len(res):
-                return res
-            try:
-                self.client.shell.wait_next_block()
-            except AssertionError:
-                print("block waiting timed out")
-
-        raise TimeoutError("waiting for operations")
-
-    def _check_op(self, op):
-        """
-        Returns None if operation is not completed
-        Raises error if operation failed
-        Return operation result if operation is completed
-        """
-
-        op_data = op[0] if isinstance(op, tuple) else op
-        op_hash = op_data["hash"]
-
-        blocks = self.client.shell.blocks[-self.block_depth:]
-        try:
-            res = blocks.find_operation(op_hash)
-            if not OperationResult.is_applied(res):
-                raise RpcError.from_errors(OperationResult.errors(res)) from op_hash
+    async def wait_for_ops_async(self, *ops):
+        results = await self.tracker().wait(*ops)
+        for res in results:
             print(pformat_consumed_gas(res))
-            return res
-        except StopIteration:
-            # not found
-            return None
+        return results
@@ -1,12 +1,21 @@
+from functools import cached_property
+
 from pytezos import PyTezosClient
 from pytezos.operation.result import OperationResult
 
+from src.interfaces import interface_cache
+
 
 class Minter(object):
 
     def __init__(self, client: PyTezosClient):
         self.client = client
 
+    @cached_property
+    def preflight(self):
+        from src.preflight import Preflight
+        return Preflight(self.client)
+
     def unwrap_erc20(self, contract_id, erc_20, amount, fees, destination):
         contract = self._contract(contract_id)
         op = contract.unwrap_erc20(erc_20=erc_20, amount=int(amount), fees=int(fees), destination=destination) \
@@ -23,7 +32,7 @@ class Minter(object):
     def confirm_admin(self, contract_id, fa2_contracts):
         print(f"Confirming admin on {contract_id} for {fa2_contracts}")
         call = self.confirm_admin_call(contract_id, fa2_contracts)
-        op = call.autofill().sign().inject(_async=False)
+        op = self.preflight.fill(call).sign().inject(_async=False)
         self._print(op)
 
     def confirm_admin_call(self, contract_id, fa2_contracts):
@@ -57,8 +66,30 @@ class Minter(object):
         op = contract.withdraw_all_tokens(fa2, tokens).inject(_async=False)
         self._print(op)
 
+    def import_mints(self, contract_id, former_minter, batch_size=200, index_file=None):
+        """
+        Copies the mints of a former minter, keying them by event id, into a
+        new, paused one, so events wrapped by the former cannot be minted
+        again. The former minter must be paused and indexed from its
+        origination (index sync).
+        :param batch_size: events imported per operation
+        """
+        from src.indexer import BigMapIndex
+        index = BigMapIndex(self.client, index_file)
+        try:
+            events = index.mint_events(former_minter)
+        finally:
+            index.close()
+        contract = self._contract(contract_id)
+        for start in range(0, len(events), batch_size):
+            batch = [{"block_hash": bytes.fromhex(block_hash), "log_index": log_index}
+                     for block_hash, log_index in events[start:start + batch_size]]
+            op = self.preflight.fill(contract.import_mints(batch)).sign().inject(_async=False)
+            self._print(op)
+        print(f"Imported {len(events)} mints from {former_minter}")
+
     def _contract(self, contract_id):
-        return self.client.contract(contract_id)
+        return interface_cache.contract(self.client, contract_id)
 
     def _print(self, opg):
         res = OperationResult.from_operation_group(opg)
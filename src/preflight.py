@@ -0,0 +1,244 @@
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+
+from pytezos import PyTezosClient
+from pytezos.context.impl import ExecutionContext
+from pytezos.michelson.forge import forge_micheline
+from pytezos.michelson.program import MichelsonProgram
+from pytezos.michelson.stack import MichelsonStack
+from pytezos.operation.fees import calculate_fee, hard_gas_limit_per_operation
+from pytezos.operation.result import OperationResult
+from pytezos.rpc.errors import RpcError
+
+from src.cache import atomic_write
+from src.interfaces import code_hash
+
+gas_reserve = 100
+burn_reserve = 100
+# paid on top of key and value by a new big_map entry: its key hash
+big_map_entry_size = 65
+# parameter types whose size, and so gas, depends on the caller
+_unbounded_prims = {"list", "set", "map", "lambda"}
+
+
+def bounded(type_expr):
+    """
+    :param type_expr: micheline of a parameter type
+    :return: True if the type has no list, set, map or lambda, gas then hardly
+    depends on the value
+    """
+    if isinstance(type_expr, list):
+        return all(bounded(e) for e in type_expr)
+    if type_expr.get("prim") in _unbounded_prims:
+        return False
+    return all(bounded(a) for a in type_expr.get("args", []))
+
+
+def expr_size(expr):
+    return len(forge_micheline(expr))
+
+
+def big_map_size_diff(updates, lookup):
+    """
+    Bytes added to big_maps by a lazy storage diff.
+    :param updates: list of (big_map id, update) with update as in a big_map
+    lazy diff, `value` missing for removals
+    :param lookup: function (big_map id, key hash) -> current value, None if missing
+    """
+    size = 0
+    for ptr, update in updates:
+        old, new = lookup(ptr, update["key_hash"]), update.get("value")
+        if old is None and new is not None:
+            size += big_map_entry_size + expr_size(update["key"]) + expr_size(new)
+        elif old is not None and new is None:
+            size -= big_map_entry_size + expr_size(update["key"]) + expr_size(old)
+        elif old is not None:
+            size += expr_size(new) - expr_size(old)
+    return size
+
+
+class _CachedContext(ExecutionContext):
+    def __init__(self, preflight, **kwargs):
+        super().__init__(shell=preflight.client.shell, block_id=preflight.block, **kwargs)
+        self.preflight = preflight
+
+    def get_big_map_value(self, ptr, key_hash):
+        return self.preflight._big_map_value(ptr, key_hash)
+
+
+class Preflight:
+    def __init__(self, client: PyTezosClient, margin=0.1, gas_file=None):
+        """
+        Runs contract calls in pytezos' interpreter against the state of the
+        contracts at head, fetched once per block, to find calls bound to fail
+        and the limits of the others before anything is sent to the node.
+        The interpreter does not count gas: the gas of an entrypoint is taken
+        from a node simulation of a previous call, and only reused for
+        entrypoints whose parameter has no list, set or map.
+        :param margin: added to the gas measured for an entrypoint
+        :param gas_file: JSON file keeping the measured gas between runs.
+        Defaults to $PREFLIGHT_GAS_FILE, memory only if unset
+        """
+        self.client = client
+        self.margin = margin
+        gas_file = gas_file or os.environ.get("PREFLIGHT_GAS_FILE")
+        self.gas_file = Path(gas_file) if gas_file else None
+        # "code hash:entrypoint" -> highest gas measured
+        self.gas = json.loads(self.gas_file.read_text()) if self.gas_file and self.gas_file.exists() else {}
+        self.block = None
+        self._now = None
+        self._level = None
+        self._chain_id = None
+        # address -> {"code", "storage", "balance"} at self.block
+        self._contracts = {}
+        # (big_map id, key hash) -> value at self.block, None if missing
+        self._big_maps = {}
+        # changes made by the calls being checked
+        self._pending_contracts = {}
+        self._pending_big_maps = {}
+        self._bounded = {}
+
+    def check(self, *calls):
+        """
+        Runs the calls and their internal operations in order, each one seeing
+        the storage left by the previous ones.
+        :param calls: ContractCall
+        :return: list of {"gas": gas limit, None if never measured, "storage": storage limit}
+        :raise MichelsonRuntimeError: on the first call failing, with the
+        FAILWITH value as last argument
+        """
+        self._refresh()
+        self._pending_contracts, self._pending_big_maps = {}, {}
+        try:
+            return [self._check(call) for call in calls]
+        finally:
+            self._pending_contracts, self._pending_big_maps = {}, {}
+
+    def fill(self, *calls):
+        """
+        Replaces autofill(): checks the calls locally then builds their
+        operation group with the limits found. The node is only asked to
+        simulate when a call's gas is not known yet.
+        :return: OperationGroup ready to be signed
+        """
+        estimates = self.check(*calls)
+        opg = self.client.bulk(*calls).fill()
+        if any(e["gas"] is None for e in estimates):
+            self._simulate(opg, calls, estimates)
+        extra_size = (32 + 64) // len(opg.contents) + 1
+        for content, estimate in zip(opg.contents, estimates):
+            content.update(gas_limit=str(estimate["gas"]), storage_limit=str(estimate["storage"]))
+            content["fee"] = str(calculate_fee(content, estimate["gas"], extra_size))
+        return opg
+
+    def _simulate(self, opg, calls, estimates):
+        result = opg.run()
+        if not OperationResult.is_applied(result):
+            raise RpcError.from_errors(OperationResult.errors(result))
+        for call, content, estimate in zip(calls, result["contents"], estimates):
+            consumed = OperationResult.consumed_gas(content)
+            if self._is_bounded(call):
+                key = self._gas_key(call)
+                self.gas[key] = max(consumed, self.gas.get(key, 0))
+            estimate["gas"] = estimate["gas"] or consumed + gas_reserve
+            paid = OperationResult.paid_storage_size_diff(content) + OperationResult.burned(content)
+            estimate["storage"] = max(estimate["storage"], paid + burn_reserve)
+        if self.gas_file is not None:
+            atomic_write(self.gas_file, json.dumps(self.gas, indent=2, sort_keys=True))
+
+    def _check(self, call):
+        source = self.client.key.public_key_hash()
+        queue = [(call.address, call.parameters["entrypoint"], call.parameters["value"], int(call.amount), source)]
+        storage = 0
+        # internal operations run after their parent, breadth first as on edo
+        while queue:
+            address, entrypoint, value, amount, sender = queue.pop(0)
+            size_diff, operations = self._run(address, entrypoint, value, amount, sender, source)
+            storage += max(size_diff, 0)
+            for op in operations:
+                if op["kind"] != "transaction":
+                    continue
+                self._state(address)["balance"] -= int(op["amount"])
+                if op["destination"].startswith("KT"):
+                    parameters = op.get("parameters", {"entrypoint": "default", "value": {"prim": "Unit"}})
+                    queue.append((op["destination"], parameters["entrypoint"], parameters["value"],
+                                  int(op["amount"]), address))
+        gas = self.gas.get(self._gas_key(call)) if self._is_bounded(call) else None
+        if gas is not None:
+            gas = min(int(gas * (1 + self.margin)) + gas_reserve, hard_gas_limit_per_operation)
+        return {"gas": gas, "storage": storage + burn_reserve}
+
+    def _run(self, address, entrypoint, value, amount, sender, source):
+        """
+        :return: (bytes added to the contract storage, internal operations)
+        """
+        state = self._state(address)
+        state["balance"] += amount
+        context = _CachedContext(self, amount=amount, balance=state["balance"], chain_id=self._chain_id,
+                                 sender=sender, source=source, address=address, now=self._now, level=self._level,
+                                 script={"code": state["code"]})
+        program = MichelsonProgram.load(context, with_code=True)
+        res = program.instantiate(entrypoint=entrypoint, parameter=value, storage=state["storage"])
+        stack, stdout = MichelsonStack(), []
+        res.begin(stack, stdout, context)
+        res.execute(stack, stdout, context)
+        operations, storage, lazy_diff, _ = res.end(stack, stdout)
+
+        updates = [(int(d["id"]), u) for d in lazy_diff if d["kind"] == "big_map" for u in d["diff"]["updates"]]
+        size_diff = expr_size(storage) - expr_size(state["storage"]) + big_map_size_diff(updates, self._big_map_value)
+        if any(d["diff"]["action"] != "update" for d in lazy_diff if d["kind"] == "big_map"):
+            # ids of big_maps created by the interpreter are not the node's
+            self._pending_contracts.pop(address, None)
+            self._contracts.pop(address, None)
+        else:
+            state["storage"] = storage
+            for ptr, update in updates:
+                self._pending_big_maps[(ptr, update["key_hash"])] = update.get("value")
+        return size_diff, operations
+
+    def _state(self, address):
+        if address not in self._pending_contracts:
+            if address not in self._contracts:
+                contract = self.client.shell.blocks[self.block].context.contracts[address]()
+                code = contract["script"]["code"]
+                storage_section = MichelsonProgram.load(ExecutionContext(script={"code": code})).storage
+                storage = storage_section.from_micheline_value(contract["script"]["storage"]).to_micheline_value()
+                self._contracts[address] = {"code": code, "storage": storage, "balance": int(contract["balance"])}
+            self._pending_contracts[address] = dict(self._contracts[address])
+        return self._pending_contracts[address]
+
+    def _big_map_value(self, ptr, key_hash):
+        if (ptr, key_hash) in self._pending_big_maps:
+            return self._pending_big_maps[(ptr, key_hash)]
+        if (ptr, key_hash) not in self._big_maps:
+            try:
+                value = self.client.shell.blocks[self.block].context.big_maps[ptr][key_hash]()
+            except RpcError:
+                value = None
+            self._big_maps[(ptr, key_hash)] = value
+        return self._big_maps[(ptr, key_hash)]
+
+    def _refresh(self):
+        header = self.client.shell.blocks["head"].header()
+        if header["hash"] == self.block:
+            return
+        self.block = header["hash"]
+        self._level = int(header["level"])
+        self._now = int(datetime.fromisoformat(header["timestamp"].replace("Z", "+00:00")).timestamp())
+        self._chain_id = header["chain_id"]
+        self._contracts.clear()
+        self._big_maps.clear()
+
+    def _is_bounded(self, call):
+        key = self._gas_key(call)
+        if key not in self._bounded:
+            program = MichelsonProgram.load(ExecutionContext(script=call.context.script))
+            ty = program.parameter.list_entrypoints()[call.parameters["entrypoint"]]
+            self._bounded[key] = bounded(ty.as_micheline_expr())
+        return self._bounded[key]
+
+    @staticmethod
+    def _gas_key(call):
+        return f"{code_hash(call.context.script['code'])}:{call.parameters['entrypoint']}"
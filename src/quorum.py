@@ -1,6 +1,10 @@
+import json
+
 from pytezos import PyTezosClient
 from pytezos.operation.result import OperationResult
 
+from src.interfaces import interface_cache
+
 
 class Quorum(object):
     def __init__(self, client: PyTezosClient):
@@ -8,54 +12,109 @@ class Quorum(object):
 
     def mint_erc20(self, contract_id, minter_contract, owner, amount, block_hash, log_index, erc_20, signer_id,
                    signature):
-        contract = self.client.contract(contract_id)
+        from src.relayer import minter_call
+        contract = interface_cache.contract(self.client, contract_id)
         mint = {"amount": amount, "owner": owner,
                 "erc_20": erc_20,
                 "event_id": {
                     "block_hash": block_hash,
                     "log_index": log_index}}
-        op = contract \
-            .minter(signatures=[[signer_id, signature]],
-                    action={"target": f"{minter_contract}",
-                            "entrypoint": {"mint_erc20": mint}},
-                    ) \
+        op = minter_call(contract, minter_contract, "mint_erc20", mint, [(signer_id, signature)]) \
             .inject(_async=False)
         self.print_opg(op)
 
     def mint_erc721(self, contract_id, minter_contract, owner, token_id, block_hash, log_index, erc_721, signer_id,
                     signature):
-        contract = self.client.contract(contract_id)
+        from src.relayer import minter_call
+        contract = interface_cache.contract(self.client, contract_id)
         mint = {"token_id": token_id, "owner": owner,
                 "erc_721": erc_721,
                 "event_id": {
                     "block_hash": block_hash,
                     "log_index": log_index}}
-        op = contract \
-            .minter(signatures=[[signer_id, signature]],
-                    action={"target": f"{minter_contract}",
-                            "entrypoint": {"mint_erc721": mint}},
-                    ) \
-            .with_amount(500_000) \
+        op = minter_call(contract, minter_contract, "mint_erc721", mint, [(signer_id, signature)], amount=500_000) \
             .inject(_async=False)
         self.print_opg(op)
 
+    def relay(self, contract_id, minter_contract, actions_file, confirmations=1, max_batch=100, max_in_flight=4):
+        """
+        Relays signed mints in batches, see src.relayer.MintRelayer.
+        :param actions_file: JSON lines file, one mint per line with keys
+        `entrypoint`, `mint`, `signatures` and optionally `amount`
+        """
+        from src.relayer import MintRelayer
+        with open(actions_file) as f:
+            actions = (json.loads(line) for line in f if line.strip())
+            relayer = MintRelayer(self.client, contract_id, minter_contract, max_batch=max_batch,
+                                  max_in_flight=max_in_flight, confirmations=confirmations)
+            confirmed, failed = relayer.run(actions)
+        for op_hash, group in relayer.injected:
+            print(f"Injected {op_hash} with {len(group)} mints")
+        print(f"Confirmed {len(confirmed)} mints")
+        for action, error in failed:
+            print(f"Failed {action['mint']['event_id']}: {error}")
+
+    def aggregate(self, contract_id, minter_contract, signatures_file, output_file):
+        """
+        Checks signers' signatures off chain and writes the mints reaching the
+        quorum threshold to output_file, ready for `relay`.
+        :param signatures_file: JSON lines file, one signature per line with
+        keys `entrypoint`, `mint`, optionally `amount`, `signer_id` and `signature`
+        """
+        from src.signatures import SignatureAggregator
+        aggregator = SignatureAggregator(self.client, contract_id, minter_contract)
+        try:
+            with open(signatures_file) as f:
+                lines = (json.loads(line) for line in f if line.strip())
+                ready, rejected = aggregator.collect(
+                    ({k: v for k, v in line.items() if k not in ("signer_id", "signature")},
+                     line["signer_id"], line["signature"]) for line in lines)
+            with open(output_file, "a") as f:
+                for action in ready:
+                    f.write(json.dumps(action) + "\n")
+            print(f"{len(ready)} mints ready")
+            for action, signer_id, reason in rejected:
+                print(f"Rejected {signer_id} for {action['mint']['event_id']}: {reason}")
+            for action, valid in aggregator.waiting():
+                print(f"Waiting {action['mint']['event_id']}: {valid}/{aggregator.threshold} signatures")
+        finally:
+            aggregator.close()
+
     def change(self, contract_id, signers: dict[str, str], threshold=1):
-        contract = self.client.contract(contract_id)
+        contract = interface_cache.contract(self.client, contract_id)
         opg = contract.change_quorum(threshold, signers).inject(_async=False)
         self.print_opg(opg)
 
     def distribute_xtz(self, contract_id, minter_contract):
-        contract = self.client.contract(contract_id)
+        contract = interface_cache.contract(self.client, contract_id)
         opg = contract.distribute_xtz_with_quorum(minter_contract).inject(_async=False)
         self.print_opg(opg)
 
     def distribute_tokens(self, contract_id, minter_contract, tokens: [tuple[str, int]]):
-        contract = self.client.contract(contract_id)
+        contract = interface_cache.contract(self.client, contract_id)
         opg = contract.distribute_tokens_with_quorum(minter_contract, tokens).inject(_async=False)
         self.print_opg(opg)
 
+    def distribute_all_tokens(self, contract_id, minter_contract, dry_run=False, chunk_size=None, max_in_flight=4):
+        """
+        Distributes every token fee held by the minter, in as many calls as the gas limit requires.
+        :param dry_run: only print the plan
+        """
+        from src.fee_planner import FeePlanner
+        planner = FeePlanner(self.client, contract_id, minter_contract, chunk_size=chunk_size,
+                             max_in_flight=max_in_flight)
+        balances = planner.balances()
+        print(f"{len(balances)} tokens with fees to distribute")
+        plan = planner.plan([token for token, _ in balances])
+        for tokens, gas, _ in plan:
+            print(f"  {len(tokens)} tokens, {gas} gas")
+        if dry_run:
+            return
+        for tokens, op_hash, error in planner.run(plan):
+            print(f"Failed {tokens}: {error}" if error else f"Done {op_hash}")
+
     def set_payment_address(self, contract_id, minter_contract, signer_id, signature):
-        contract = self.client.contract(contract_id)
+        contract = interface_cache.contract(self.client, contract_id)
         payment_address = self.client.address
         print(f"Using {payment_address}")
         opg = contract.set_signer_payment_address(minter_contract=minter_contract, signature=signature,
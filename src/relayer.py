@@ -0,0 +1,237 @@
+import asyncio
+from collections import deque
+
+from pytezos import PyTezosClient
+from pytezos.operation.fees import calculate_fee
+from pytezos.operation.forge import forge_operation
+from pytezos.operation.result import OperationResult
+from pytezos.rpc.errors import RpcError
+
+from src.interfaces import interface_cache
+from src.tracker import OperationTracker
+
+hard_gas_limit_per_block = 10_400_000
+max_operation_data_length = 32 * 1024
+branch_size = 32
+signature_size = 64
+gas_reserve = 100
+burn_reserve = 100
+
+
+def minter_call(quorum, minter_contract, entrypoint, mint, signatures, amount=0):
+    """
+    Builds the quorum `minter` call relaying a signed mint to the minter contract.
+    :param quorum: quorum ContractInterface
+    :param entrypoint: mint_erc20 or mint_erc721
+    :param mint: mint parameters, as expected by the minter entrypoint
+    :param signatures: list of (signer id, signature), sent sorted by signer id as the quorum requires
+    :param amount: mutez sent with the call, the erc721 wrapping fees
+    """
+    call = quorum.minter(signatures=[list(s) for s in sorted(signatures, key=lambda s: s[0])],
+                         action={"target": f"{minter_contract}", "entrypoint": {entrypoint: mint}})
+    return call.with_amount(amount) if amount else call
+
+
+def minter_batch_call(quorum, minter_contract, mints, signatures, amounts=()):
+    """
+    Builds the quorum `minter_batch` call relaying several mints under one signature set.
+    :param mints: list of (entrypoint, mint parameters), as for minter_call
+    :param signatures: list of (signer id, signature) of the packed list of actions
+    :param amounts: mutez sent with each mint, missing ones are 0
+    :raise ValueError: BAD_AMOUNT if there are more amounts than mints, the quorum rejects them
+    """
+    if len(amounts) > len(mints):
+        raise ValueError(f"BAD_AMOUNT: {len(amounts)} amounts for {len(mints)} mints")
+    call = quorum.minter_batch(signatures=[list(s) for s in sorted(signatures, key=lambda s: s[0])],
+                               actions=[{"target": f"{minter_contract}", "entrypoint": {entrypoint: mint}}
+                                        for entrypoint, mint in mints],
+                               amounts=list(amounts))
+    return call.with_amount(sum(amounts)) if sum(amounts) else call
+
+
+def with_limits(content, extra_size):
+    """
+    Operation content ready to be signed from a simulated one.
+    :param content: content of a run_operation result
+    :param extra_size: share of the branch and signature bytes paid by the content
+    :return: (content with its gas limit, storage limit and fee, gas limit)
+    """
+    gas = OperationResult.consumed_gas(content) + gas_reserve
+    storage_limit = OperationResult.paid_storage_size_diff(content) + OperationResult.burned(content) + burn_reserve
+    content = {k: v for k, v in content.items() if k != "metadata"}
+    content.update(gas_limit=str(gas), storage_limit=str(storage_limit),
+                   fee=str(calculate_fee(content, gas, extra_size)))
+    return content, gas
+
+
+class MintRelayer:
+    def __init__(self, client: PyTezosClient, quorum_contract, minter_contract, max_batch=100,
+                 gas_budget=hard_gas_limit_per_block // 2, size_budget=max_operation_data_length,
+                 max_in_flight=4, confirmations=1, tracker=None):
+        """
+        Packs signed mints into as few operation groups as the limits allow,
+        injects them without waiting for inclusion and tracks them in the
+        background. Mints of a group failing on chain are retried one by one.
+        :param client: PyTezosClient holding the key paying for the operations
+        :param quorum_contract: quorum contract address
+        :param minter_contract: minter contract address
+        :param max_batch: most mints simulated together for a group
+        :param gas_budget: gas of a whole group
+        :param size_budget: bytes of a signed group
+        :param max_in_flight: groups injected and not confirmed yet
+        :param confirmations: blocks on top of which a group is considered done
+        :param tracker: OperationTracker, one is created if not given
+
+        Hashes of the injected groups are appended to `injected` with their
+        mints as soon as they are sent.
+        """
+        self.client = client
+        self.quorum = interface_cache.contract(client, quorum_contract)
+        self.minter_contract = minter_contract
+        self.max_batch = max_batch
+        self.gas_budget = gas_budget
+        self.size_budget = size_budget
+        self.max_in_flight = max_in_flight
+        self.tracker = tracker or OperationTracker(client, confirmations=confirmations)
+        self.injected = []
+        self.confirmed = []
+        self.failed = []
+        self._retries = deque()
+        self._counter = None
+        self._in_flight = set()
+
+    async def relay(self, actions):
+        """
+        Relays a stream of signed mints.
+        :param actions: iterable of dicts with keys `entrypoint` (mint_erc20 or
+        mint_erc721), `mint`, `signatures` and optionally `amount`
+        :return: (confirmed, failed): confirmed is a list of (action, operation
+        hash), failed a list of (action, error)
+        """
+        source = iter(actions)
+        pending = deque()
+        while True:
+            while len(pending) < self.max_batch:
+                action = next(source, None)
+                if action is None:
+                    break
+                pending.append(action)
+            if not pending and not self._retries:
+                if not self._in_flight:
+                    break
+                await asyncio.wait(self._in_flight, return_when=asyncio.FIRST_COMPLETED)
+                continue
+            while len(self._in_flight) >= self.max_in_flight:
+                await asyncio.wait(self._in_flight, return_when=asyncio.FIRST_COMPLETED)
+            if self._retries:
+                batch, retry = [self._retries.popleft()], True
+            else:
+                batch, retry = [pending.popleft() for _ in range(min(self.max_batch, len(pending)))], False
+            packed, rest = await asyncio.to_thread(self._pack, batch)
+            pending.extendleft(reversed(rest))
+            if packed:
+                await self._inject(*packed, retry)
+        return self.confirmed, self.failed
+
+    def run(self, actions):
+        """
+        Blocking version of relay().
+        """
+        return asyncio.run(self.relay(actions))
+
+    def _calls(self, actions):
+        return [minter_call(self.quorum, self.minter_contract, a["entrypoint"], a["mint"], a["signatures"],
+                            a.get("amount", 0))
+                for a in actions]
+
+    def _pack(self, actions):
+        """
+        Simulates the mints together and keeps the longest prefix fitting in the
+        gas and size budgets. A mint failing its simulation is set aside.
+        :return: ((actions, contents) of the group or None, actions left for the next groups)
+        """
+        result = self._simulate(actions)
+        if not OperationResult.is_applied(result):
+            if len(actions) == 1:
+                self.failed.append((actions[0], RpcError.from_errors(OperationResult.errors(result))))
+                return None, []
+            return self._isolate(actions)
+
+        contents, gas, size = [], 0, branch_size + signature_size
+        extra_size = (branch_size + signature_size) // len(actions) + 1
+        for content in result["contents"]:
+            content, consumed = with_limits(content, extra_size)
+            content_size = len(forge_operation(content))
+            if contents and (gas + consumed > self.gas_budget or size + content_size > self.size_budget):
+                break
+            contents.append(content)
+            gas, size = gas + consumed, size + content_size
+        return (actions[:len(contents)], contents), actions[len(contents):]
+
+    def _isolate(self, actions):
+        """
+        Simulates each mint alone to find the failing ones. When every mint
+        passes alone they only fail together, the group is then cut to the
+        longest prefix simulating cleanly.
+        :return: (group packed from the prefix or None, mints left for the next groups)
+        """
+        valid = []
+        for action in actions:
+            result = self._simulate([action])
+            if OperationResult.is_applied(result):
+                valid.append(action)
+            else:
+                self.failed.append((action, RpcError.from_errors(OperationResult.errors(result))))
+        if len(valid) < len(actions):
+            return None, valid
+        applied, rejected = 1, len(actions)
+        while rejected - applied > 1:
+            size = (applied + rejected) // 2
+            if OperationResult.is_applied(self._simulate(actions[:size])):
+                applied = size
+            else:
+                rejected = size
+        packed, rest = self._pack(actions[:applied])
+        return packed, rest + actions[applied:]
+
+    def _simulate(self, actions):
+        return self.client.bulk(*self._calls(actions)).fill(counter=self._chain_counter()).run()
+
+    def _chain_counter(self):
+        return int(self.client.shell.contracts[self.client.key.public_key_hash()]()["counter"])
+
+    async def _inject(self, actions, contents, retry):
+        if self._counter is None:
+            self._counter = await asyncio.to_thread(self._chain_counter)
+        for i, content in enumerate(contents):
+            content["counter"] = str(self._counter + i + 1)
+        opg = self.client.bulk(*self._calls(actions)).fill(counter=self._counter)
+        opg.contents = contents
+        try:
+            injected = await asyncio.to_thread(lambda: opg.sign().inject(_async=True, preapply=False))
+        except RpcError as e:
+            # counters above the rejected group are not used: settle then resync
+            if self._in_flight:
+                await asyncio.wait(self._in_flight)
+            self._counter = None
+            self._fail_or_retry(actions, e, retry)
+            return
+        self._counter += len(contents)
+        self.injected.append((injected["hash"], actions))
+        task = asyncio.create_task(self._track(actions, injected["hash"], retry))
+        self._in_flight.add(task)
+        task.add_done_callback(self._in_flight.discard)
+
+    async def _track(self, actions, op_hash, retry):
+        try:
+            await self.tracker.wait(op_hash)
+        except (RpcError, TimeoutError) as e:
+            self._fail_or_retry(actions, e, retry)
+            return
+        self.confirmed.extend((a, op_hash) for a in actions)
+
+    def _fail_or_retry(self, actions, error, retry):
+        if retry:
+            self.failed.extend((a, error) for a in actions)
+        else:
+            self._retries.extend(actions)
@@ -0,0 +1,55 @@
+import asyncio
+import os
+import weakref
+
+max_concurrency = os.cpu_count() or 1
+
+_semaphores = weakref.WeakKeyDictionary()
+
+
+class CommandError(Exception):
+    def __init__(self, args, returncode, stderr):
+        self.command = args
+        self.returncode = returncode
+        self.stderr = stderr
+        super().__init__(stderr or f"{args[0]} exited with code {returncode}")
+
+
+def _semaphore():
+    loop = asyncio.get_running_loop()
+    if loop not in _semaphores:
+        _semaphores[loop] = asyncio.Semaphore(max_concurrency)
+    return _semaphores[loop]
+
+
+async def run_command_async(args, cwd=None, timeout=None):
+    """
+    Runs a command without a shell, reading stdout and stderr concurrently.
+    At most `max_concurrency` commands run at the same time per event loop.
+    The process is killed on timeout or cancellation.
+    :param args: program and its arguments
+    :param cwd: working directory
+    :param timeout: seconds before giving up, None to wait forever
+    :return: decoded stdout
+    """
+    args = [str(a) for a in args]
+    async with _semaphore():
+        process = await asyncio.create_subprocess_exec(
+            *args, cwd=cwd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+        try:
+            out, err = await asyncio.wait_for(process.communicate(), timeout)
+        except BaseException:
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+            raise
+    if process.returncode != 0:
+        raise CommandError(args, process.returncode, err.decode())
+    return out.decode()
+
+
+def run_command(args, cwd=None, timeout=None):
+    """
+    Blocking version of run_command_async.
+    """
+    return asyncio.run(run_command_async(args, cwd=cwd, timeout=timeout))
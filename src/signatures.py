@@ -0,0 +1,166 @@
+import json
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, wait
+
+from pytezos import Key, PyTezosClient
+from pytezos.context.impl import ExecutionContext
+from pytezos.michelson.program import MichelsonProgram
+from pytezos.michelson.types.base import MichelsonType
+
+from src.interfaces import interface_cache
+from src.relayer import minter_call
+
+
+def verify(public_key, signature, message):
+    """
+    Runs in the worker processes.
+    :return: True if signature is the signature of message by public_key
+    """
+    try:
+        Key.from_encoded_key(public_key).verify(signature, message)
+        return True
+    except ValueError:
+        return False
+
+
+def action_key(action):
+    """
+    Identifies a mint whatever the order of its fields.
+    """
+    return json.dumps([action["entrypoint"], action["mint"], action.get("amount", 0)], sort_keys=True)
+
+
+class _Pending:
+    def __init__(self, action):
+        self.action = action
+        # signer id -> signature checked valid
+        self.valid = {}
+        self.released = False
+
+
+class SignatureAggregator:
+    def __init__(self, client: PyTezosClient, quorum_contract, minter_contract, executor=None):
+        """
+        Collects the signers' signatures of mints and checks them off chain
+        against the quorum's keys, in a pool of worker processes. A mint is
+        released once it has threshold valid signatures from distinct
+        signers, so no operation is sent to fail on MISSING_SIGNATURES or
+        BAD_SIGNATURE.
+        :param executor: concurrent.futures executor running the checks,
+        defaults to a process pool
+        """
+        self.client = client
+        self.quorum = interface_cache.contract(client, quorum_contract)
+        self.quorum_contract = quorum_contract
+        self.minter_contract = minter_contract
+        self.executor = executor or ProcessPoolExecutor()
+        self.threshold = None
+        self.signers = {}
+        self.chain_id = None
+        # signed payload by action key, packed once per mint
+        self._payloads = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._action_type = None
+        self.refresh()
+
+    def refresh(self):
+        """
+        Reloads the quorum threshold and signer keys.
+        """
+        storage = self.quorum.storage()
+        self.threshold = storage["threshold"]
+        self.signers = dict(storage["signers"])
+        self.chain_id = self.client.shell.blocks["head"].header()["chain_id"]
+
+    def add(self, action, signer_id, signature):
+        """
+        Queues the check of a signature.
+        :param action: mint as relayed, dict with keys `entrypoint` (mint_erc20
+        or mint_erc721), `mint` and optionally `amount`
+        :return: future of (valid, reason): reason says why an invalid signature was rejected
+        """
+        result = Future()
+        with self._lock:
+            pending = self._pending.setdefault(action_key(action), _Pending(action))
+            if signer_id not in self.signers:
+                result.set_result((False, "SIGNER_UNKNOWN"))
+                return result
+            if pending.valid.get(signer_id) == signature:
+                result.set_result((True, None))
+                return result
+        message = self.payload(action)
+
+        def checked(future):
+            valid = future.exception() is None and future.result()
+            with self._lock:
+                if valid:
+                    pending.valid.setdefault(signer_id, signature)
+            result.set_result((valid, None if valid else "BAD_SIGNATURE"))
+
+        self.executor.submit(verify, self.signers[signer_id], signature, message).add_done_callback(checked)
+        return result
+
+    def collect(self, signatures):
+        """
+        Checks a batch of signatures.
+        :param signatures: iterable of (action, signer id, signature)
+        :return: (mints ready, as returned by ready(), list of (action, signer id, reason) rejected)
+        """
+        checks = [(action, signer_id, self.add(action, signer_id, signature))
+                  for action, signer_id, signature in signatures]
+        wait([future for _, _, future in checks])
+        rejected = [(action, signer_id, future.result()[1]) for action, signer_id, future in checks
+                    if not future.result()[0]]
+        return self.ready(), rejected
+
+    def payload(self, action):
+        """
+        :return: bytes signed by the signers, Bytes.pack(((chain_id, quorum), action))
+        """
+        key = action_key(action)
+        if key not in self._payloads:
+            self._payloads[key] = self._pack(action)
+        return self._payloads[key]
+
+    def ready(self):
+        """
+        Mints with enough valid signatures, each returned once, ready for MintRelayer.
+        :return: list of actions with their `signatures`: threshold (signer id,
+        signature) pairs sorted by signer id
+        """
+        released = []
+        with self._lock:
+            for pending in self._pending.values():
+                if pending.released or len(pending.valid) < self.threshold:
+                    continue
+                pending.released = True
+                signatures = sorted(pending.valid.items())[:self.threshold]
+                released.append(dict(pending.action, signatures=[list(s) for s in signatures]))
+        return released
+
+    def waiting(self):
+        """
+        :return: list of (action, valid signatures) of the mints not released yet
+        """
+        with self._lock:
+            return [(p.action, len(p.valid)) for p in self._pending.values() if not p.released]
+
+    def close(self):
+        self.executor.shutdown()
+
+    def _pack(self, action):
+        call = minter_call(self.quorum, self.minter_contract, action["entrypoint"], action["mint"], [])
+        action_value = call.parameters["value"]["args"][1]
+        payload_type = {"prim": "pair", "args": [{"prim": "pair", "args": [{"prim": "chain_id"}, {"prim": "address"}]},
+                                                 self._invocation_type()]}
+        payload = {"prim": "Pair", "args": [{"prim": "Pair", "args": [{"string": self.chain_id},
+                                                                      {"string": self.quorum_contract}]},
+                                            action_value]}
+        return MichelsonType.match(payload_type).from_micheline_value(payload).pack()
+
+    def _invocation_type(self):
+        if self._action_type is None:
+            program = MichelsonProgram.load(ExecutionContext(script=self.quorum.context.script))
+            self._action_type = program.parameter.list_entrypoints()["minter"].as_micheline_expr()["args"][1]
+        return self._action_type
@@ -1,25 +1,34 @@
+from functools import cached_property
+
 from pytezos import PyTezosClient
 
+from src.interfaces import interface_cache
+
 
 class Token(object):
 
     def __init__(self, client: PyTezosClient):
         self.client = client
 
+    @cached_property
+    def preflight(self):
+        from src.preflight import Preflight
+        return Preflight(self.client)
+
     def set_admin(self, contract_id, new_admin):
         print(f"Setting fa2 admin on {contract_id} to {new_admin}")
         call = self.set_admin_call(contract_id, new_admin)
-        res = call.autofill().sign().inject(_async=False)
+        res = self.preflight.fill(call).sign().inject(_async=False)
         print(f"Done {res[0]['hash']}")
 
     def set_admin_call(self, contract_id, new_admin):
-        contract = self.client.contract(contract_id)
+        contract = interface_cache.contract(self.client, contract_id)
         op = contract \
             .set_admin(new_admin)
         return op
 
     def set_minter_call(self, contract_id, new_admin):
-        contract = self.client.contract(contract_id)
+        contract = interface_cache.contract(self.client, contract_id)
         op = contract \
             .set_minter(new_admin)
         return op
\ No newline at end of file
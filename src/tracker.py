@@ -0,0 +1,201 @@
+import asyncio
+import threading
+
+from pytezos.operation.result import OperationResult
+from pytezos.rpc.errors import RpcError
+
+_manager_pass = 3
+
+
+def operation_hash(op):
+    """
+    :param op: operation hash, or operation descriptor returned by inject()
+    """
+    if isinstance(op, str):
+        return op
+    op_data = op[0] if isinstance(op, tuple) else op
+    return op_data["hash"]
+
+
+class OperationTracker:
+    def __init__(self, client, confirmations=1, timeout_blocks=10, lookback=5, poll_interval=1.0):
+        """
+        Follows the chain head and matches the manager operations of every new
+        block against the tracked operation hashes. Each block is fetched once,
+        however many operations are tracked.
+        :param client: PyTezosClient
+        :param confirmations: blocks on top of which an operation is reported, 1
+        reports it in the block including it
+        :param timeout_blocks: new blocks to wait for an operation to be included
+        :param lookback: blocks scanned before the head when the tracker starts
+        and kept indexed, to find operations included before they were tracked
+        :param poll_interval: seconds between two head requests
+        """
+        self.client = client
+        self.confirmations = confirmations
+        self.timeout_blocks = timeout_blocks
+        self.lookback = lookback
+        self.poll_interval = poll_interval
+        # hash -> level after which the operation times out
+        self.pending = {}
+        # hash -> (level, block hash, operation) for tracked operations waiting confirmations
+        self.included = {}
+        self._chain = {}
+        self._recent = {}
+        self._head_level = None
+        self._lock = threading.Lock()
+        self._futures = {}
+        self._task = None
+
+    def track(self, *ops):
+        """
+        Starts tracking operations. Results are returned by the following poll() calls.
+        """
+        with self._lock:
+            for op in ops:
+                op_hash = operation_hash(op)
+                if op_hash in self.pending or op_hash in self.included:
+                    continue
+                if op_hash in self._recent:
+                    self.included[op_hash] = self._recent[op_hash]
+                else:
+                    self.pending[op_hash] = None if self._head_level is None \
+                        else self._head_level + self.timeout_blocks
+
+    def poll(self):
+        """
+        Fetches the blocks baked since the last call and resolves operations.
+        :return: list of (hash, operation, error). error is an RpcError if the
+        operation failed, TimeoutError if it was not included in time
+        """
+        head = self._header("head")
+        blocks = self._new_blocks(head)
+        operations = [(header, self._operations(header["hash"])) for header in blocks]
+        with self._lock:
+            self._reorg(head, blocks)
+            for header, ops in operations:
+                self._index(header, ops)
+            self._head_level = head["level"]
+            self._prune()
+            return self._resolve()
+
+    async def wait(self, *ops):
+        """
+        Waits for operations to get `confirmations` blocks. Several wait() calls
+        running on the same event loop share the block polling.
+        :param ops: operation hashes or descriptors returned by inject()
+        :return: operation results, in the order of ops
+        """
+        loop = asyncio.get_running_loop()
+        futures = []
+        for op in ops:
+            future = loop.create_future()
+            self._futures.setdefault(operation_hash(op), []).append(future)
+            futures.append(future)
+        self.track(*ops)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return await asyncio.gather(*futures)
+
+    def wait_for_ops(self, *ops):
+        """
+        Blocking version of wait().
+        """
+        return asyncio.run(self.wait(*ops))
+
+    async def _run(self):
+        while self._futures:
+            try:
+                events = await asyncio.to_thread(self.poll)
+            except Exception as e:
+                self._fail_all(e)
+                return
+            for op_hash, operation, error in events:
+                for future in self._futures.pop(op_hash, []):
+                    if future.done():
+                        continue
+                    if error is None:
+                        future.set_result(operation)
+                    else:
+                        future.set_exception(error)
+            if self._futures:
+                await asyncio.sleep(self.poll_interval)
+
+    def _fail_all(self, error):
+        for futures in self._futures.values():
+            for future in futures:
+                if not future.done():
+                    future.set_exception(error)
+        self._futures.clear()
+
+    def _header(self, block_id):
+        return self.client.shell.blocks[block_id].header()
+
+    def _operations(self, block_hash):
+        return self.client.shell.blocks[block_hash].operations[_manager_pass]()
+
+    def _new_blocks(self, head):
+        """
+        Walks back from head to the last block already scanned.
+        :return: headers of the blocks to scan, oldest first
+        """
+        first_level = head["level"] - self.lookback + 1 if self._head_level is None else None
+        blocks = []
+        header = head
+        while self._chain.get(header["level"]) != header["hash"]:
+            if first_level is not None and header["level"] < first_level:
+                break
+            if first_level is None and header["level"] < min(self._chain, default=header["level"]):
+                break
+            blocks.append(header)
+            header = self._header(header["predecessor"])
+        return list(reversed(blocks))
+
+    def _reorg(self, head, blocks):
+        """
+        Forgets blocks replaced by the new branch or above the new head, and puts
+        the tracked operations they included back to pending.
+        """
+        replaced = {b["level"] for b in blocks if b["level"] in self._chain}
+        replaced |= {level for level in self._chain if level > head["level"]}
+        if not replaced:
+            return
+        for level in replaced:
+            del self._chain[level]
+        self._recent = {h: v for h, v in self._recent.items() if v[0] not in replaced}
+        for op_hash, (level, _, _) in list(self.included.items()):
+            if level in replaced:
+                del self.included[op_hash]
+                self.pending[op_hash] = head["level"] + self.timeout_blocks
+
+    def _index(self, header, ops):
+        self._chain[header["level"]] = header["hash"]
+        for op in ops:
+            entry = (header["level"], header["hash"], op)
+            self._recent[op["hash"]] = entry
+            if op["hash"] in self.pending:
+                del self.pending[op["hash"]]
+                self.included[op["hash"]] = entry
+
+    def _prune(self):
+        oldest = self._head_level - max(self.lookback, self.confirmations)
+        self._chain = {level: h for level, h in self._chain.items() if level > oldest}
+        self._recent = {op_hash: v for op_hash, v in self._recent.items() if v[0] > oldest}
+
+    def _resolve(self):
+        events = []
+        for op_hash, (level, _, operation) in list(self.included.items()):
+            if self._head_level - level + 1 < self.confirmations:
+                continue
+            del self.included[op_hash]
+            if OperationResult.is_applied(operation):
+                events.append((op_hash, operation, None))
+            else:
+                events.append((op_hash, operation, RpcError.from_errors(OperationResult.errors(operation))))
+        for op_hash, deadline in list(self.pending.items()):
+            if deadline is None:
+                self.pending[op_hash] = self._head_level + self.timeout_blocks
+            elif self._head_level > deadline:
+                del self.pending[op_hash]
+                events.append((op_hash, None, TimeoutError(f"operation {op_hash} not included")))
+        return events
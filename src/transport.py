@@ -0,0 +1,180 @@
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from pytezos.rpc.node import RpcError, RpcNode, urljoin
+
+_head_header = "chains/main/blocks/head/header"
+_block_hash_path = re.compile(r"blocks/B[1-9A-HJ-NP-Za-km-z]{50}")
+# statuses of proxies and load balancers in front of a node, not of the node itself
+_unavailable = (502, 503, 504)
+
+
+class Endpoint:
+    def __init__(self, uri, pool_size):
+        """
+        A node of the pool, with its own keep-alive connections.
+        :param pool_size: connections kept open to the node
+        """
+        self.uri = uri
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.healthy = True
+        self.level = None
+        self.latency = None
+        self.in_flight = 0
+        self.requests = 0
+        self.error = None
+
+    def request(self, method, path, **kwargs) -> requests.Response:
+        return self.session.request(method=method, url=urljoin(self.uri, path),
+                                    headers={'content-type': 'application/json', 'user-agent': 'PyTezos'},
+                                    **kwargs)
+
+    def down(self, error):
+        self.healthy = False
+        self.error = error
+
+    def __repr__(self):
+        state = "up" if self.healthy else f"down ({self.error})"
+        return f"{self.uri} level={self.level} latency={self.latency} {state}"
+
+
+class NodePool(RpcNode):
+    def __init__(self, uris, max_lag=2, check_interval=10.0, timeout=30.0, pool_size=16):
+        """
+        RPC transport over several nodes, for ShellQuery(NodePool([...])).
+        Reads of a block given by its hash don't change and are spread: each
+        goes to the healthy node with the fewest requests in flight, so slower
+        nodes get less of the load, then the fewest requests sent. Every other
+        request, injections, simulations and reads of the head (counter,
+        branch, storage...), goes to one node as long as it is healthy, so a
+        sequence of them sees a single chain and mempool. A node is
+        healthy when it answers and its head is at most max_lag levels behind
+        the highest head of the pool; health is checked every check_interval
+        seconds, on the request crossing it. A request failing to reach a node
+        is sent to the next one and the node is set aside until the next check.
+        Errors returned by a node (script rejected, counter in the past...) are
+        raised as with RpcNode.
+        :param uris: node RPC URLs
+        :param max_lag: levels a node can be behind the others
+        :param check_interval: seconds between health checks
+        :param timeout: seconds to wait for a node's answer
+        :param pool_size: keep-alive connections per node
+        """
+        self.uri = list(uris)
+        self.nodes = [Endpoint(uri, pool_size) for uri in self.uri]
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._checking = threading.Lock()
+        self._next_check = 0.0
+        # node answering the requests which are not spread
+        self._primary = None
+
+    def __repr__(self):
+        return "\n".join([super(RpcNode, self).__repr__(), '\nNode addresses', *map(repr, self.nodes)])
+
+    def request(self, method, path, **kwargs) -> requests.Response:
+        if time.monotonic() >= self._next_check:
+            self.check(wait=self._next_check == 0.0)
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout
+        spread = method == "GET" and _block_hash_path.search(path) is not None
+        tried = []
+        error = None
+        while True:
+            node = self._pick(tried, spread)
+            if node is None:
+                raise RpcError(f"No node could answer {method} {path}", error)
+            tried.append(node)
+            try:
+                res = node.request(method, path, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+                node.down(e)
+                continue
+            finally:
+                with self._lock:
+                    node.in_flight -= 1
+            if res.status_code in _unavailable:
+                error = f"{res.status_code} {res.reason}"
+                node.down(error)
+                continue
+            if res.status_code == 404:
+                # a node behind the others does not know the block yet
+                if _block_hash_path.search(path) and len(tried) < len(self.nodes):
+                    error = f"Not found: {path}"
+                    continue
+                raise RpcError(f'Not found: {path}')
+            if res.status_code != 200:
+                raise RpcError.from_response(res)
+            return res
+
+    def check(self, wait=True):
+        """
+        Fetches the head of every node and flags the ones unreachable or lagging.
+        :param wait: wait for a check already run by another thread
+        """
+        if not self._checking.acquire(blocking=wait):
+            return
+        try:
+            if wait and self._next_check > time.monotonic():
+                # checked by another thread meanwhile
+                return
+            with ThreadPoolExecutor(len(self.nodes)) as executor:
+                list(executor.map(self._check_node, self.nodes))
+            levels = [n.level for n in self.nodes if n.healthy]
+            best = max(levels, default=None)
+            for node in self.nodes:
+                if node.healthy and best - node.level > self.max_lag:
+                    node.down(f"{best - node.level} levels behind")
+            self._next_check = time.monotonic() + self.check_interval
+        finally:
+            self._checking.release()
+
+    def stats(self):
+        """
+        :return: uri -> requests sent
+        """
+        return {n.uri: n.requests for n in self.nodes}
+
+    def _check_node(self, node):
+        start = time.perf_counter()
+        try:
+            res = node.request("GET", _head_header, timeout=min(self.timeout, self.check_interval))
+            res.raise_for_status()
+            level = res.json()["level"]
+        except (requests.RequestException, ValueError, KeyError) as e:
+            node.down(e)
+            return
+        node.latency = time.perf_counter() - start
+        node.level = level
+        node.healthy = True
+        node.error = None
+
+    def _pick(self, tried, spread):
+        """
+        Healthy node with the fewest requests in flight, then the nodes set
+        aside, which may be back up. Requests not spread keep the node picked
+        for them until it fails.
+        """
+        with self._lock:
+            candidates = [n for n in self.nodes if n not in tried]
+            if not candidates:
+                return None
+            if not spread and self._primary in candidates and self._primary.healthy:
+                node = self._primary
+            else:
+                node = min(candidates, key=lambda n: (not n.healthy, n.in_flight, n.requests))
+                if not spread:
+                    self._primary = node
+            node.in_flight += 1
+            node.requests += 1
+            return node
@@ -0,0 +1,26 @@
+from pathlib import Path
+
+from builder import contracts
+from src.ligo import LigoContract
+
+root_dir = Path(__file__).parent.parent
+
+_compiled = {}
+
+
+def ligo_contract(name):
+    ligo_file, main_func = contracts[name]
+    return LigoContract(root_dir / ligo_file, main_func)
+
+
+def contract(name):
+    """
+    Returns the compiled contract shared by every test of the run. It is
+    compiled at most once per process, and loaded from the compile cache when
+    the sources did not change since the last run.
+    :param name: contract name, as in builder.contracts
+    :return: pytezos.ContractInterface
+    """
+    if name not in _compiled:
+        _compiled[name] = ligo_contract(name).get_contract()
+    return _compiled[name]
@@ -0,0 +1,97 @@
+"""
+Runs the test suite with test classes split across worker processes.
+
+    python test/parallel.py --jobs=4
+
+Contracts are compiled once in the parent process to fill the compile cache,
+so every worker loads them from disk instead of running ligo.
+"""
+import asyncio
+import io
+import os
+import sys
+import time
+import unittest
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+test_dir = Path(__file__).parent
+sys.path[:0] = [str(test_dir.parent), str(test_dir)]
+
+import fire  # noqa: E402
+
+from builder import contracts  # noqa: E402
+from contracts import ligo_contract  # noqa: E402
+
+
+def _warm_compile_cache():
+    async def compile_all():
+        await asyncio.gather(*[ligo_contract(name).compile_michelson_async() for name in contracts])
+
+    asyncio.run(compile_all())
+
+
+def _tests(suite):
+    for test in suite:
+        if isinstance(test, unittest.TestSuite):
+            yield from _tests(test)
+        else:
+            yield test
+
+
+def _split(test_ids, jobs):
+    """
+    Groups tests by class, so setUpClass runs once per class, and spreads the
+    classes over `jobs` buckets, largest classes first.
+    """
+    classes = defaultdict(list)
+    for test_id in test_ids:
+        classes[test_id.rsplit(".", 1)[0]].append(test_id)
+    buckets = [[] for _ in range(jobs)]
+    for tests in sorted(classes.values(), key=len, reverse=True):
+        min(buckets, key=len).extend(tests)
+    return [b for b in buckets if b]
+
+
+def _run_tests(test_ids):
+    return _run_suite(unittest.defaultTestLoader.loadTestsFromNames(test_ids))
+
+
+def _run_suite(suite):
+    stream = io.StringIO()
+    result = unittest.TextTestRunner(stream=stream, verbosity=0).run(suite)
+    return result.testsRun, len(result.failures), len(result.errors), len(result.skipped), stream.getvalue()
+
+
+def run(jobs=None, pattern="test*.py"):
+    """
+    :param jobs: number of worker processes, defaults to the core count
+    :param pattern: test files pattern, as for unittest discover
+    """
+    jobs = int(jobs or os.cpu_count() or 1)
+    start = time.perf_counter()
+    _warm_compile_cache()
+    suite = unittest.defaultTestLoader.discover(str(test_dir), pattern=pattern, top_level_dir=str(test_dir))
+    tests = list(_tests(suite))
+    # modules that failed to import cannot be loaded by name in the workers
+    broken = [t for t in tests if t.id().startswith("unittest.loader.")]
+    buckets = _split([t.id() for t in tests if t not in broken], jobs)
+
+    total = failures = errors = skipped = 0
+    with ProcessPoolExecutor(max_workers=len(buckets) or 1) as pool:
+        results = [_run_suite(unittest.TestSuite(broken))] + list(pool.map(_run_tests, buckets))
+        for ran, failed, errored, skip, output in results:
+            total, failures, errors, skipped = total + ran, failures + failed, errors + errored, skipped + skip
+            if failed or errored:
+                print(output)
+
+    print(f"Ran {total} tests in {time.perf_counter() - start:.3f}s on {len(buckets)} workers")
+    if failures or errors:
+        print(f"FAILED (failures={failures}, errors={errors}, skipped={skipped})")
+        raise SystemExit(1)
+    print(f"OK (skipped={skipped})" if skipped else "OK")
+
+
+if __name__ == '__main__':
+    fire.Fire(run)
@@ -0,0 +1,94 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from src.airdrop import Checkpoint, read_recipients
+
+
+class ReadRecipientsTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = Path(self.directory.name)
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def test_reads_csv_with_header_in_smallest_units(self):
+        source = self.path / "recipients.csv"
+        source.write_text("address,amount\ntz1alice,1.5\ntz1bob,0.00000001\n")
+
+        self.assertEqual([("tz1alice", 150_000_000), ("tz1bob", 1)], list(read_recipients(source)))
+
+    def test_reads_json_lines(self):
+        source = self.path / "recipients.jsonl"
+        source.write_text('{"address": "tz1alice", "amount": 2}\n\n{"address": "tz1bob", "amount": "3"}\n')
+
+        self.assertEqual([("tz1alice", 200_000_000), ("tz1bob", 300_000_000)], list(read_recipients(source)))
+
+    def test_rejects_amounts_below_smallest_unit(self):
+        source = self.path / "recipients.csv"
+        source.write_text("tz1alice,0.000000001\n")
+
+        with self.assertRaises(ValueError):
+            list(read_recipients(source))
+
+
+class CheckpointTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = Path(self.directory.name)
+        self.source = self.path / "recipients.csv"
+        self.source.write_text("tz1carol,1\ntz1alice,1\ntz1bob,2\ntz1alice,3\n")
+        self.checkpoint = Checkpoint(self.path / "checkpoint.db")
+        self.checkpoint.load(self.source)
+
+    def tearDown(self) -> None:
+        self.checkpoint.close()
+        self.directory.cleanup()
+
+    def test_merges_duplicate_addresses(self):
+        self.assertEqual([("tz1alice", 400_000_000), ("tz1bob", 200_000_000), ("tz1carol", 100_000_000)],
+                         self.checkpoint.pending(10))
+        self.assertEqual(700_000_000, self.checkpoint.pending_total())
+
+    def test_reloading_same_file_keeps_progress(self):
+        self.checkpoint.record(self.checkpoint.pending(1), "oo1", 10)
+
+        self.checkpoint.load(self.source)
+
+        self.assertEqual(["tz1bob", "tz1carol"], [a for a, _ in self.checkpoint.pending(10)])
+
+    def test_refuses_another_file(self):
+        other = self.path / "other.csv"
+        other.write_text("tz1dave,1\n")
+
+        with self.assertRaises(ValueError):
+            self.checkpoint.load(other)
+
+    def test_recorded_recipients_are_not_pending(self):
+        batch = self.checkpoint.record(self.checkpoint.pending(2), "oo1", 10)
+
+        self.assertEqual([(batch, "oo1", 10)], self.checkpoint.injected())
+        self.assertEqual([("tz1carol", 100_000_000)], self.checkpoint.pending(10))
+
+    def test_expired_group_recipients_are_pending_again(self):
+        batch = self.checkpoint.record(self.checkpoint.pending(2), "oo1", 10)
+
+        self.checkpoint.settle(batch, "expired")
+
+        self.assertEqual([], self.checkpoint.injected())
+        self.assertEqual(3, len(self.checkpoint.pending(10)))
+
+    def test_summary_by_status(self):
+        applied = self.checkpoint.record(self.checkpoint.pending(1), "oo1", 10)
+        self.checkpoint.settle(applied, "applied")
+        self.checkpoint.record(self.checkpoint.pending(1), "oo2", 11)
+
+        self.assertEqual({"applied": (1, 400_000_000), "injected": (1, 200_000_000), "pending": (1, 100_000_000)},
+                         self.checkpoint.summary())
+
+
+if __name__ == '__main__':
+    unittest.main()
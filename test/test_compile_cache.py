@@ -0,0 +1,54 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from src.cache import CompileCache, sources_digest
+from src.includes import include_closure
+
+
+class CompileCacheTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        (self.root / "lib").mkdir()
+        (self.root / "lib" / "types.mligo").write_text("type t = nat\n")
+        (self.root / "lib" / "helpers.mligo").write_text('#include "types.mligo"\nlet f (x: t) = x\n')
+        (self.root / "main.mligo").write_text('#include "lib/helpers.mligo"\n#include "lib/types.mligo"\n')
+        self.main = self.root / "main.mligo"
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def test_should_follow_includes_transitively(self):
+        files = include_closure(self.main)
+
+        self.assertEqual({self.main.resolve(),
+                          (self.root / "lib" / "helpers.mligo").resolve(),
+                          (self.root / "lib" / "types.mligo").resolve()}, set(files))
+
+    def test_digest_should_change_with_included_file(self):
+        before = sources_digest(self.main, "main", "0.10.0")
+
+        (self.root / "lib" / "types.mligo").write_text("type t = int\n")
+
+        self.assertNotEqual(before, sources_digest(self.main, "main", "0.10.0"))
+
+    def test_digest_should_change_with_entry_point_and_version(self):
+        digest = sources_digest(self.main, "main", "0.10.0")
+
+        self.assertNotEqual(digest, sources_digest(self.main, "other_main", "0.10.0"))
+        self.assertNotEqual(digest, sources_digest(self.main, "main", "0.11.0"))
+
+    def test_should_count_hits_and_misses(self):
+        cache = CompileCache(self.root / "cache")
+
+        self.assertIsNone(cache.get("key"))
+        cache.put("key", "parameter unit;")
+        self.assertEqual("parameter unit;", cache.get("key"))
+
+        self.assertEqual({"hits": 1, "misses": 1}, cache.stats())
+
+
+if __name__ == '__main__':
+    unittest.main()
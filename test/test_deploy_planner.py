@@ -0,0 +1,187 @@
+import unittest
+
+from pytezos import Key
+from pytezos.crypto.encoding import base58_encode
+from pytezos.rpc.errors import RpcError
+
+from src.deploy_planner import DeployPlanner
+
+deployer = Key.generate(export=False).public_key_hash()
+
+code = [{"prim": "parameter", "args": [{"prim": "unit"}]},
+        {"prim": "storage", "args": [{"prim": "pair", "args": [{"prim": "string"}, {"prim": "string"}]}]},
+        {"prim": "code", "args": [[{"prim": "CDR"}, {"prim": "NIL", "args": [{"prim": "operation"}]},
+                                   {"prim": "PAIR"}]]}]
+
+
+def op_hash(i):
+    return base58_encode(i.to_bytes(32, "big"), b"o").decode()
+
+
+def _name(content):
+    return content["script"]["storage"]["args"][0]["string"]
+
+
+class FakeOperation:
+    def __init__(self, name, size=100, gas=1000):
+        """
+        :param size: bytes of padding in the originated storage
+        """
+        self.name = name
+        self.gas = gas
+        self.contents = [{"kind": "origination", "source": deployer, "fee": "0", "counter": "0", "gas_limit": "0",
+                          "storage_limit": "0", "balance": "0",
+                          "script": {"code": code,
+                                     "storage": {"prim": "Pair", "args": [{"string": name}, {"string": "0" * size}]}}}]
+
+
+class FakeGroup:
+    def __init__(self, client, operations):
+        self.client = client
+        self.operations = operations
+        self.contents = [o.contents[0] for o in operations]
+
+    def fill(self, counter=None):
+        return self
+
+    def run(self):
+        return {"contents": [dict(c, metadata={"operation_result": {"status": "applied", "consumed_gas": str(o.gas)}})
+                             for o, c in zip(self.operations, self.contents)]}
+
+    def sign(self):
+        return self
+
+    def hash(self):
+        return op_hash(len(self.client.injected))
+
+    def inject(self, _async=True, preapply=True):
+        self.client.injected.append((self.hash(), [_name(c) for c in self.contents],
+                                     [int(c["counter"]) for c in self.contents]))
+
+
+class FakeKey:
+    def public_key_hash(self):
+        return deployer
+
+
+class FakeContract:
+    def __call__(self):
+        return {"counter": "7"}
+
+
+class FakeShell:
+    contracts = {deployer: FakeContract()}
+
+
+class FakeClient:
+    key = FakeKey()
+    shell = FakeShell()
+
+    def __init__(self):
+        self.injected = []
+
+    def bulk(self, *operations):
+        return FakeGroup(self, operations)
+
+
+def address(name):
+    return f"KT1{name}"
+
+
+class FakeTracker:
+    def __init__(self, client, calls=(), failed=()):
+        """
+        :param calls: steps calling a contract, the others are originations
+        :param failed: steps whose group fails
+        """
+        self.client = client
+        self.calls = set(calls)
+        self.failed = set(failed)
+        self.waits = []
+
+    def wait_for_ops(self, *ops):
+        self.waits.append((len(self.client.injected), list(ops)))
+        groups = {h: names for h, names, _ in self.client.injected}
+        if any(name in self.failed for op in ops for name in groups[op]):
+            raise RpcError("script_rejected")
+        return [{"hash": op, "contents": [
+            {"kind": "transaction", "metadata": {"operation_result": {"status": "applied"}}} if name in self.calls
+            else {"kind": "origination",
+                  "metadata": {"operation_result": {"status": "applied", "originated_contracts": [address(name)]}}}
+            for name in groups[op]]} for op in ops]
+
+
+class DeployPlannerTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.client = FakeClient()
+        self.tracker = FakeTracker(self.client)
+        self.planner = DeployPlanner(self.client, gas_budget=10_000, size_budget=2000, tracker=self.tracker)
+
+    def test_builds_dependents_with_the_originated_addresses(self):
+        self.planner.add("fa2", lambda _: FakeOperation("fa2"), originates=True)
+        self.planner.add("quorum", lambda _: FakeOperation("quorum"), originates=True)
+        built = {}
+
+        def minter(addresses):
+            built.update(addresses)
+            return FakeOperation("minter")
+
+        self.planner.add("minter", minter, originates=True, uses=["fa2", "quorum"])
+
+        addresses = self.planner.run()
+
+        self.assertEqual([(op_hash(0), ["fa2", "quorum"], [8, 9]), (op_hash(1), ["minter"], [10])],
+                         self.client.injected)
+        self.assertEqual({"fa2": address("fa2"), "quorum": address("quorum")}, built)
+        self.assertEqual({"fa2": address("fa2"), "quorum": address("quorum"), "minter": address("minter")},
+                         addresses)
+        self.assertEqual([(1, [op_hash(0)]), (2, [op_hash(1)])], self.tracker.waits)
+
+    def test_calls_wait_for_the_contracts_they_call(self):
+        self.tracker.calls = {"set_minter"}
+        self.planner.add("fa2", lambda _: FakeOperation("fa2"), originates=True)
+        self.planner.add("minter", lambda _: FakeOperation("minter"), originates=True)
+        self.planner.add("set_minter", lambda _: FakeOperation("set_minter"), uses=["minter"], waits=["fa2"])
+
+        addresses = self.planner.run()
+
+        self.assertEqual([(op_hash(0), ["fa2", "minter"], [8, 9]), (op_hash(1), ["set_minter"], [10])],
+                         self.client.injected)
+        self.assertEqual((1, [op_hash(0)]), self.tracker.waits[0])
+        self.assertEqual(["fa2", "minter"], list(addresses))
+
+    def test_stops_when_a_dependency_fails(self):
+        self.tracker.failed = {"quorum"}
+        self.planner.add("quorum", lambda _: FakeOperation("quorum"), originates=True)
+        self.planner.add("minter", lambda _: FakeOperation("minter"), originates=True, uses=["quorum"])
+
+        with self.assertRaises(RpcError):
+            self.planner.run()
+
+        self.assertEqual([["quorum"]], [n for _, n, _ in self.client.injected])
+
+    def test_splits_groups_over_the_size_budget(self):
+        for i in range(5):
+            self.planner.add(f"nft {i}", lambda _, i=i: FakeOperation(f"nft {i}", size=700), originates=True)
+
+        self.planner.run()
+
+        self.assertEqual([["nft 0", "nft 1"], ["nft 2", "nft 3"], ["nft 4"]], [n for _, n, _ in self.client.injected])
+        self.assertEqual([8, 9, 10, 11, 12], [c for _, _, counters in self.client.injected for c in counters])
+
+    def test_splits_groups_over_the_gas_budget(self):
+        for i in range(3):
+            self.planner.add(f"nft {i}", lambda _, i=i: FakeOperation(f"nft {i}", gas=4000), originates=True)
+
+        self.planner.run()
+
+        self.assertEqual([["nft 0", "nft 1"], ["nft 2"]], [n for _, n, _ in self.client.injected])
+
+    def test_rejects_unknown_dependencies(self):
+        with self.assertRaises(ValueError):
+            self.planner.add("minter", lambda _: FakeOperation("minter"), uses=["quorum"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,146 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from src.fee_planner import FeePlanner, chunk, measured_chunk_size
+from src.relayer import gas_reserve
+
+planner_address = "tz1irF8HUsQp2dLhKNMhteG1qALNU9g3pfdN"
+
+
+def linear_gas(base, per_token, exhausted_above=None):
+    calls = []
+
+    def gas_of(tokens):
+        calls.append(len(tokens))
+        if exhausted_above is not None and len(tokens) > exhausted_above:
+            return None
+        return base + per_token * len(tokens)
+
+    return gas_of, calls
+
+
+class ChunkTest(unittest.TestCase):
+
+    def test_keeps_a_single_chunk_when_it_fits(self):
+        gas_of, calls = linear_gas(10_000, 1_000)
+
+        chunks = chunk(list(range(50)), gas_of, 100_000, 100)
+
+        self.assertEqual([(list(range(50)), 60_000)], chunks)
+        self.assertEqual([50], calls)
+
+    def test_shrinks_chunks_over_budget_and_keeps_the_size(self):
+        gas_of, calls = linear_gas(10_000, 1_000)
+
+        chunks = chunk(list(range(200)), gas_of, 100_000, 200)
+
+        self.assertTrue(all(gas <= 100_000 for _, gas in chunks))
+        self.assertEqual(list(range(200)), [t for tokens, _ in chunks for t in tokens])
+        self.assertEqual(len(chunks) + 1, len(calls))
+
+    def test_halves_chunks_running_out_of_gas(self):
+        gas_of, _ = linear_gas(10_000, 1_000, exhausted_above=30)
+
+        chunks = chunk(list(range(60)), gas_of, 1_000_000, 100)
+
+        self.assertTrue(all(len(tokens) <= 30 for tokens, _ in chunks))
+
+    def test_fails_when_a_single_token_does_not_fit(self):
+        gas_of, _ = linear_gas(200_000, 1_000)
+
+        with self.assertRaises(ValueError):
+            chunk([("KT1", 0)], gas_of, 100_000, 10)
+
+
+class FakeGroup:
+    def __init__(self, client, tokens):
+        self.client = client
+        self.tokens = tokens
+        self.contents = None
+
+    def fill(self, counter=None):
+        return self
+
+    def run(self):
+        self.client.simulated.append(len(self.tokens))
+        return {"contents": [{"kind": "transaction", "source": planner_address, "fee": "0", "counter": "6",
+                              "gas_limit": "1040000", "storage_limit": "60000", "amount": "0",
+                              "destination": "KT1RXpLtz22YgX24QQhxKVyKvtKZFaAVtTB9",
+                              "parameters": {"entrypoint": "distribute_tokens_with_quorum", "value": []},
+                              "metadata": {"operation_result": {"status": "applied",
+                                                                "consumed_gas": str(10_000 * len(self.tokens))}}}]}
+
+    def sign(self):
+        return self
+
+    def inject(self, _async, preapply):
+        self.client.injected.append(self.contents)
+        return {"hash": f"oo{len(self.client.injected)}"}
+
+
+class FakeClient:
+    def __init__(self):
+        self.key = self
+        self.shell = self
+        self.contracts = {planner_address: lambda: {"counter": "5"}}
+        self.simulated = []
+        self.injected = []
+
+    def public_key_hash(self):
+        return planner_address
+
+    def bulk(self, tokens):
+        return FakeGroup(self, tokens)
+
+
+class FakeQuorum:
+    def distribute_tokens_with_quorum(self, minter, tokens):
+        return tokens
+
+
+class FakeInterfaces:
+    def contract(self, client, address):
+        return FakeQuorum()
+
+
+class FakeTracker:
+    def wait_for_ops(self, op_hash):
+        return op_hash
+
+
+class FeePlannerTest(unittest.TestCase):
+
+    def test_injects_the_contents_simulated_by_the_plan(self):
+        client = FakeClient()
+        with patch("src.fee_planner.interface_cache", FakeInterfaces()):
+            planner = FeePlanner(client, "KT1RXpLtz22YgX24QQhxKVyKvtKZFaAVtTB9", "KT1Hd1hiG1PhZ7xRi1HUVoAXM7i7Pzta8EHW",
+                                 gas_budget=250_000, chunk_size=20, tracker=FakeTracker())
+
+        plan = planner.plan([("KT1", i) for i in range(30)])
+        simulations = len(client.simulated)
+        results = planner.run(plan)
+
+        self.assertEqual(simulations, len(client.simulated))
+        self.assertEqual([None] * len(plan), [error for _, _, error in results])
+        self.assertEqual([str(gas + gas_reserve) for _, gas, _ in plan],
+                         [content["gas_limit"] for [content] in client.injected])
+        self.assertEqual(["6", "7"], [content["counter"] for [content] in client.injected][:2])
+
+
+class MeasuredChunkSizeTest(unittest.TestCase):
+
+    def test_reads_scaling_results(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "batch_limits.json"
+            self.assertIsNone(measured_chunk_size(path))
+
+            path.write_text(json.dumps({"distribute_tokens": {"max_size": 320}}))
+
+            self.assertEqual(320, measured_chunk_size(path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import unittest
+
+from bench.gas import compare, _big_maps, _materialize
+from bench.mints_storage import by_event_id, by_hash, event_ids
+from bench.scaling import fit, estimate_max_size
+from src.indexer import mint_key
+from src.preflight import big_map_size_diff
+
+
+class GasBaselineTest(unittest.TestCase):
+
+    def test_flags_metrics_above_tolerance(self):
+        baseline = {"minter": {"mint_erc20": {"gas": 1000, "storage": 0, "parameter": 80}}}
+        results = {"minter": {"mint_erc20": {"gas": 1011, "storage": 0, "parameter": 80}}}
+
+        self.assertEqual(["minter.mint_erc20 gas: 1000 -> 1011"], compare(results, baseline, 0.01))
+        self.assertEqual([], compare(results, baseline, 0.02))
+
+    def test_flags_entrypoints_missing_from_baseline(self):
+        baseline = {"quorum": {"minter": {"gas": 1000, "storage": 10, "parameter": 80}}}
+        results = {"quorum": {"minter": {"gas": 1000, "storage": 10, "parameter": 80},
+                              "minter_batch": {"gas": 5000, "storage": 10, "parameter": 800}}}
+
+        self.assertEqual(["quorum.minter_batch: not in the baseline, record it with --update"],
+                         compare(results, baseline, 0))
+
+    def test_any_storage_growth_is_a_regression_when_baseline_is_zero(self):
+        baseline = {"nft": {"transfer": {"gas": 1000, "storage": 0, "parameter": 80}}}
+        results = {"nft": {"transfer": {"gas": 900, "storage": 1, "parameter": 80}}}
+
+        self.assertEqual(["nft.transfer storage: 0 -> 1"], compare(results, baseline, 0.5))
+
+
+class MaterializeTest(unittest.TestCase):
+
+    def test_replaces_big_map_ids_with_entries_from_diff(self):
+        result = {"lazy_storage_diff": [
+            {"kind": "big_map", "id": "4", "diff": {"action": "alloc", "updates": [
+                {"key_hash": "a", "key": {"int": "1"}, "value": {"string": "one"}},
+                {"key_hash": "b", "key": {"int": "2"}},
+            ]}}
+        ]}
+        ty = {"prim": "pair", "args": [{"prim": "nat"}, {"prim": "big_map", "args": [{"prim": "nat"},
+                                                                                    {"prim": "string"}]}]}
+
+        value = _materialize(ty, {"prim": "Pair", "args": [{"int": "0"}, {"int": "4"}]}, _big_maps(result))
+
+        self.assertEqual({"prim": "Pair", "args": [
+            {"int": "0"}, [{"prim": "Elt", "args": [{"int": "1"}, {"string": "one"}]}]]}, value)
+
+
+class ScalingFitTest(unittest.TestCase):
+
+    def test_fits_quadratic_growth(self):
+        points = [(n, 3000 + 150 * n + 2 * n * n) for n in (1, 10, 100, 1000)]
+
+        coefficients = fit(points)
+
+        for expected, c in zip([3000, 150, 2], coefficients):
+            self.assertAlmostEqual(expected, c, places=3)
+
+    def test_falls_back_to_linear_fit_with_two_points(self):
+        self.assertEqual(2, len(fit([(1, 1100), (10, 2000)])))
+
+    def test_estimates_largest_size_under_limit(self):
+        self.assertEqual(99, estimate_max_size([100, 10], 1090))
+        self.assertEqual(0, estimate_max_size([2000, 10], 1000))
+
+
+class MintsStorageTest(unittest.TestCase):
+
+    def test_mint_by_hash_pays_for_the_key(self):
+        [(block_hash, log_index)] = event_ids(1, 1)
+        key = {"bytes": mint_key(block_hash, log_index).hex()}
+        new_key = {"key_hash": "expruKey", "key": key, "value": {"prim": "Unit"}}
+
+        self.assertEqual([big_map_size_diff([(0, new_key)], lambda ptr, key_hash: None)],
+                         by_hash([(block_hash, log_index)]))
+
+    def test_mint_by_event_id_pays_for_the_key(self):
+        [(block_hash, log_index)] = event_ids(1, 1)
+        event_id = {"prim": "Pair", "args": [{"bytes": block_hash.hex()}, {"int": str(log_index)}]}
+        new_key = {"key_hash": "expruKey", "key": event_id, "value": {"prim": "Unit"}}
+
+        self.assertEqual([big_map_size_diff([(0, new_key)], lambda ptr, key_hash: None)],
+                         by_event_id([(block_hash, log_index)]))
+
+    def test_every_mint_by_hash_costs_less(self):
+        for events_per_block in (1, 2, 8):
+            ids = event_ids(100, events_per_block)
+
+            self.assertTrue(all(hashed < former for hashed, former in zip(by_hash(ids), by_event_id(ids))))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,9 +1,8 @@
-from pathlib import Path
 from unittest import TestCase
 
 from pytezos import Key, MichelsonRuntimeError
 
-from src.ligo import LigoContract
+from contracts import contract
 
 super_admin = Key.generate(export=False).public_key_hash()
 user = Key.generate(export=False).public_key_hash()
@@ -13,14 +12,9 @@ dao_address = 'KT1Hd1hiG1PhZ7xRi1HUVoAXM7i7Pzta8EHW'
 
 
 class GovernanceTokenTest(TestCase):
-    @classmethod
-    def compile_contract(cls):
-        root_dir = Path(__file__).parent.parent / "ligo"
-        cls.contract = LigoContract(root_dir / "fa2" / "governance" / "main.mligo", "main").compile_contract()
-
     @classmethod
     def setUpClass(cls):
-        cls.compile_contract()
+        cls.contract = contract("governance_token")
         cls.maxDiff = None
 
 
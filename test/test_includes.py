@@ -0,0 +1,50 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from src.includes import IncludeGraph, include_closure
+
+
+class IncludeGraphTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        ligo = self.root / "ligo"
+        (ligo / "common").mkdir(parents=True)
+        (ligo / "common" / "types.mligo").write_text('#if !TYPES\n#define TYPES\n#include "lib.mligo"\n#endif\n')
+        (ligo / "common" / "lib.mligo").write_text("let f (x: nat) = x\n")
+        (ligo / "common" / "debug.mligo").write_text("let d = 1n\n")
+        (ligo / "a.mligo").write_text('#include "common/types.mligo"\n#if DEBUG\n#include "common/debug.mligo"\n'
+                                      '#endif\n')
+        (ligo / "b.mligo").write_text('#include "common/debug.mligo"\n')
+        self.graph = IncludeGraph(directories=("ligo",), base=self.root)
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def test_skips_includes_in_branches_not_taken(self):
+        files = include_closure(self.root / "ligo" / "a.mligo")
+
+        self.assertNotIn((self.root / "ligo" / "common" / "debug.mligo").resolve(), files)
+        self.assertIn((self.root / "ligo" / "common" / "lib.mligo").resolve(), files)
+
+    def test_follows_includes_when_symbol_is_defined(self):
+        files = include_closure(self.root / "ligo" / "a.mligo", defines=["DEBUG"])
+
+        self.assertIn((self.root / "ligo" / "common" / "debug.mligo").resolve(), files)
+
+    def test_finds_targets_affected_by_a_change(self):
+        targets = {"a": "ligo/a.mligo", "b": "ligo/b.mligo"}
+
+        self.assertEqual(["a"], self.graph.affected(targets, ["ligo/common/lib.mligo"]))
+        self.assertEqual(["b"], self.graph.affected(targets, ["ligo/common/debug.mligo"]))
+
+    def test_finds_dependents_of_a_change(self):
+        dependents = self.graph.dependents(["ligo/common/lib.mligo"])
+
+        self.assertEqual({"a.mligo", "types.mligo", "lib.mligo"}, {f.name for f in dependents})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,308 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from pytezos import Key
+from pytezos.michelson.types.base import MichelsonType
+
+from src.indexer import BigMapIndex, big_maps_of, mint_key
+
+minter = "KT1minter"
+alice = Key.generate(export=False).public_key_hash()
+bob = Key.generate(export=False).public_key_hash()
+fa2 = "KT1RXpLtz22YgX24QQhxKVyKvtKZFaAVtTB9"
+address = {"prim": "address"}
+nat = {"prim": "nat"}
+mints_type = {"prim": "big_map", "annots": ["%mints"], "args": [
+    {"prim": "pair", "args": [{"prim": "bytes", "annots": ["%block_hash"]}, {"prim": "nat", "annots": ["%log_index"]}]},
+    {"prim": "unit"}]}
+xtz_type = {"prim": "big_map", "annots": ["%xtz"], "args": [address, {"prim": "mutez"}]}
+tokens_type = {"prim": "big_map", "annots": ["%tokens"],
+               "args": [{"prim": "pair", "args": [address, {"prim": "pair", "args": [address, nat]}]}, nat]}
+storage_type = {"prim": "pair", "args": [
+    {"prim": "pair", "annots": ["%assets"], "args": [{"prim": "map", "annots": ["%erc20_tokens"], "args": [nat, nat]},
+                                                     mints_type]},
+    {"prim": "pair", "annots": ["%fees"], "args": [tokens_type, xtz_type]}]}
+storage = {"prim": "Pair", "args": [{"prim": "Pair", "args": [[], {"int": "10"}]},
+                                    {"prim": "Pair", "args": [{"int": "11"}, {"int": "12"}]}]}
+
+
+hashed_mints_type = {"prim": "big_map", "annots": ["%mints"], "args": [{"prim": "bytes"}, {"prim": "unit"}]}
+hashed_storage_type = {"prim": "pair", "args": [
+    {"prim": "pair", "annots": ["%assets"], "args": [{"prim": "map", "annots": ["%erc20_tokens"], "args": [nat, nat]},
+                                                     hashed_mints_type]},
+    {"prim": "pair", "annots": ["%fees"], "args": [tokens_type, xtz_type]}]}
+
+token_type = {"prim": "pair", "args": [address, nat]}
+tokens_per_share_type = {"prim": "big_map", "annots": ["%tokens_per_share"], "args": [token_type, nat]}
+token_checkpoints_type = {"prim": "big_map", "annots": ["%token_checkpoints"],
+                          "args": [{"prim": "pair", "args": [address, token_type]}, nat]}
+xtz_checkpoints_type = {"prim": "big_map", "annots": ["%xtz_checkpoints"], "args": [address, {"prim": "mutez"}]}
+shares_type = {"prim": "pair", "annots": ["%shares"], "args": [
+    {"prim": "map", "annots": ["%holders"], "args": [address, nat]},
+    {"prim": "set", "annots": ["%tokens"], "args": [token_type]},
+    tokens_per_share_type,
+    {"prim": "mutez", "annots": ["%xtz_per_share"]},
+    token_checkpoints_type,
+    xtz_checkpoints_type]}
+shares_storage_type = {"prim": "pair", "args": [
+    {"prim": "pair", "annots": ["%assets"], "args": [{"prim": "map", "annots": ["%erc20_tokens"], "args": [nat, nat]},
+                                                     mints_type]},
+    {"prim": "pair", "annots": ["%fees"], "args": [tokens_type, xtz_type, shares_type]}]}
+
+
+def shares_storage(holders, xtz_per_share):
+    holders_expr = [{"prim": "Elt", "args": [{"string": a}, {"int": str(n)}]} for a, n in sorted(holders.items())]
+    return {"prim": "Pair", "args": [
+        {"prim": "Pair", "args": [[], {"int": "10"}]},
+        {"prim": "Pair", "args": [{"int": "11"}, {"int": "12"}, holders_expr, [], {"int": "13"},
+                                  {"int": str(xtz_per_share)}, {"int": "14"}, {"int": "15"}]}]}
+
+
+def key_hash(type_expr, key):
+    return BigMapIndex._key_hash(MichelsonType.match(type_expr), key)
+
+
+def update(type_expr, key, key_expr, value_expr=None):
+    result = {"key_hash": key_hash(type_expr, key), "key": key_expr}
+    if value_expr is not None:
+        result["value"] = value_expr
+    return result
+
+
+def mint(block_hash, log_index):
+    key = {"block_hash": bytes.fromhex(block_hash), "log_index": log_index}
+    key_expr = {"prim": "Pair", "args": [{"bytes": block_hash}, {"int": str(log_index)}]}
+    return 10, update(mints_type, key, key_expr, {"prim": "Unit"})
+
+
+def hashed_mint(block_hash, log_index):
+    key = mint_key(bytes.fromhex(block_hash), log_index)
+    return 10, update(hashed_mints_type, key, {"bytes": key.hex()}, {"prim": "Unit"})
+
+
+def xtz_fees(owner, amount):
+    return 12, update(xtz_type, owner, {"string": owner}, None if amount is None else {"int": str(amount)})
+
+
+def token_fees(owner, fa2, token_id, amount):
+    key_expr = {"prim": "Pair", "args": [{"string": owner}, {"prim": "Pair", "args": [{"string": fa2},
+                                                                                     {"int": str(token_id)}]}]}
+    return 11, update(tokens_type, (owner, fa2, token_id), key_expr, {"int": str(amount)})
+
+
+def tokens_per_share(fa2, token_id, index):
+    key_expr = {"prim": "Pair", "args": [{"string": fa2}, {"int": str(token_id)}]}
+    return 13, update(tokens_per_share_type, (fa2, token_id), key_expr, {"int": str(index)})
+
+
+def token_checkpoint(holder, fa2, token_id, index):
+    key_expr = {"prim": "Pair", "args": [{"string": holder}, {"prim": "Pair", "args": [{"string": fa2},
+                                                                                      {"int": str(token_id)}]}]}
+    return 14, update(token_checkpoints_type, (holder, fa2, token_id), key_expr, {"int": str(index)})
+
+
+def xtz_checkpoint(holder, index):
+    return 15, update(xtz_checkpoints_type, holder, {"string": holder}, {"int": str(index)})
+
+
+class FakeBlock:
+    def __init__(self, chain, level):
+        self.chain = chain
+        self.level = level
+
+    def __call__(self):
+        return self.chain.blocks[self.level]
+
+    def hash(self):
+        return self.chain.blocks[self.level]["hash"]
+
+    def header(self):
+        return {"level": len(self.chain.blocks) - 1}
+
+    @property
+    def context(self):
+        return self.chain.shell
+
+
+class FakeShell:
+    def __init__(self, chain):
+        self.chain = chain
+        self.contracts = {minter: chain}
+
+    @property
+    def blocks(self):
+        return {level: FakeBlock(self.chain, level)
+                for level in list(range(len(self.chain.blocks))) + ["head"]}
+
+
+class FakeChain:
+    def __init__(self, storage_type=storage_type, storage=storage):
+        self.storage_type = storage_type
+        self.storage = storage
+        self.blocks = [{"hash": "B0", "header": {"predecessor": None}, "operations": [[], [], [], []]}]
+        self.shell = FakeShell(self)
+
+    def script(self):
+        return {"code": [{"prim": "storage", "args": [self.storage_type]}], "storage": self.storage}
+
+    def bake(self, *diffs, fork=""):
+        level = len(self.blocks)
+        results = [{"status": "applied", "lazy_storage_diff": [
+            {"kind": "big_map", "id": str(ptr), "diff": {"action": "update", "updates": [u]}}]} for ptr, u in diffs]
+        contents = [{"kind": "transaction", "metadata": {"operation_result": {"status": "applied"},
+                                                         "internal_operation_results": [{"result": r}
+                                                                                        for r in results]}}]
+        self.blocks.append({"hash": f"B{level}{fork}", "header": {"predecessor": self.blocks[-1]["hash"]},
+                            "operations": [[], [], [], [{"contents": contents}]]})
+
+    def fork(self, level):
+        del self.blocks[level:]
+
+
+class FakeClient:
+    def __init__(self, chain):
+        self.shell = chain.shell
+
+
+class BigMapsOfTest(unittest.TestCase):
+
+    def test_finds_big_maps_by_annotation_path(self):
+        self.assertEqual([("assets.mints", 10), ("fees.tokens", 11), ("fees.xtz", 12)],
+                         [(path, ptr) for path, ptr, _ in big_maps_of(storage_type, storage)])
+
+
+class BigMapIndexTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.chain = FakeChain()
+        self.index = BigMapIndex(FakeClient(self.chain), Path(self.directory.name) / "index.db")
+        self.index.watch(minter)
+
+    def tearDown(self) -> None:
+        self.index.close()
+        self.directory.cleanup()
+
+    def test_applies_diffs_of_new_blocks(self):
+        self.chain.bake(mint("aa", 1), xtz_fees(alice, 500))
+        self.chain.bake(xtz_fees(alice, 700), xtz_fees(bob, 100))
+
+        self.assertEqual(2, self.index.sync(from_level=1))
+
+        self.assertTrue(self.index.minted(minter, "0xaa", 1))
+        self.assertFalse(self.index.minted(minter, "0xaa", 2))
+        self.assertEqual({alice: {"xtz": 700, "tokens": {}}, bob: {"xtz": 100, "tokens": {}}},
+                         self.index.fee_balances(minter))
+
+    def test_resumes_from_last_level(self):
+        self.chain.bake(xtz_fees(alice, 500))
+        self.index.sync(from_level=1)
+        self.chain.bake(xtz_fees(alice, None))
+
+        self.assertEqual(2, self.index.sync(from_level=1))
+
+        self.assertIsNone(self.index.get(minter, "fees.xtz", alice))
+
+    def test_undoes_blocks_replaced_by_a_reorg(self):
+        self.chain.bake(xtz_fees(alice, 500))
+        self.chain.bake(mint("aa", 1), xtz_fees(alice, 700))
+        self.index.sync(from_level=1)
+        self.chain.fork(2)
+        self.chain.bake(xtz_fees(bob, 100), fork="'")
+        self.chain.bake(fork="'")
+
+        self.assertEqual(3, self.index.sync())
+
+        self.assertFalse(self.index.minted(minter, "aa", 1))
+        self.assertEqual(500, self.index.get(minter, "fees.xtz", alice))
+        self.assertEqual(100, self.index.get(minter, "fees.xtz", bob))
+
+    def test_undoes_a_replaced_head(self):
+        self.chain.bake(xtz_fees(alice, 500))
+        self.chain.bake(xtz_fees(alice, 700))
+        self.index.sync(from_level=1)
+        self.chain.fork(2)
+        self.chain.bake(fork="'")
+
+        self.index.sync()
+
+        self.assertEqual(500, self.index.get(minter, "fees.xtz", alice))
+
+    def test_ignores_failed_operations(self):
+        self.chain.bake(xtz_fees(alice, 500))
+        result = self.chain.blocks[1]["operations"][3][0]["contents"][0]["metadata"]["internal_operation_results"][0]
+        result["result"]["status"] = "backtracked"
+
+        self.index.sync(from_level=1)
+
+        self.assertEqual([], self.index.entries(minter, "fees.xtz"))
+
+
+    def test_lists_mint_events(self):
+        self.chain.bake(mint("bb", 1), mint("aa", 2))
+        self.index.sync(from_level=1)
+
+        self.assertEqual([("aa", 2), ("bb", 1)], self.index.mint_events(minter))
+
+
+class HashedMintsTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.chain = FakeChain(hashed_storage_type)
+        self.index = BigMapIndex(FakeClient(self.chain), Path(self.directory.name) / "index.db")
+        self.index.watch(minter)
+
+    def tearDown(self) -> None:
+        self.index.close()
+        self.directory.cleanup()
+
+    def test_finds_events_by_hash(self):
+        self.chain.bake(hashed_mint("aa", 1))
+        self.chain.bake(hashed_mint("aa", 4), hashed_mint("bb", 0))
+
+        self.index.sync(from_level=1)
+
+        self.assertTrue(self.index.minted(minter, "0xaa", 4))
+        self.assertFalse(self.index.minted(minter, "0xaa", 2))
+        self.assertFalse(self.index.minted(minter, "0xcc", 1))
+
+    def test_cannot_list_events_by_hash(self):
+        self.chain.bake(hashed_mint("aa", 1))
+        self.index.sync(from_level=1)
+
+        with self.assertRaises(ValueError):
+            self.index.mint_events(minter)
+
+class SignerSharesTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.chain = FakeChain(shares_storage_type, shares_storage({alice: 2, bob: 1}, 100))
+        self.index = BigMapIndex(FakeClient(self.chain), Path(self.directory.name) / "index.db")
+        self.index.watch(minter)
+
+    def tearDown(self) -> None:
+        self.index.close()
+        self.directory.cleanup()
+
+    def test_adds_shares_distributed_since_the_checkpoints(self):
+        self.chain.bake(xtz_fees(alice, 500), token_fees(alice, fa2, 0, 7), tokens_per_share(fa2, 0, 30),
+                        xtz_checkpoint(alice, 50), token_checkpoint(alice, fa2, 0, 10))
+        self.index.sync(from_level=1)
+
+        self.assertEqual({alice: {"xtz": 500 + 50 * 2, "tokens": {(fa2, 0): 7 + 20 * 2}},
+                          bob: {"xtz": 100, "tokens": {(fa2, 0): 30}}},
+                         self.index.fee_balances(minter))
+
+    def test_leaves_out_settled_holders(self):
+        self.chain.bake(xtz_fees(bob, 100), tokens_per_share(fa2, 0, 30), xtz_checkpoint(bob, 100),
+                        token_checkpoint(bob, fa2, 0, 30))
+        self.index.sync(from_level=1)
+
+        self.assertEqual({bob: {"xtz": 100, "tokens": {}}}, self.index.fee_balances(minter, bob))
+
+
+if __name__ == '__main__':
+    unittest.main()
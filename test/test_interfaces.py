@@ -0,0 +1,129 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from src.interfaces import InterfaceCache
+
+minter_code = [{"prim": "parameter", "args": [{"prim": "nat"}]}, {"prim": "storage", "args": [{"prim": "nat"}]},
+               {"prim": "code", "args": [[{"prim": "CAR"}, {"prim": "NIL", "args": [{"prim": "operation"}]},
+                                          {"prim": "PAIR"}]]}]
+
+
+class FakeScript:
+    def __init__(self, shell, address):
+        self.shell = shell
+        self.address = address
+
+    def script(self):
+        self.shell.fetches.append(self.address)
+        return {"code": self.shell.codes[self.address], "storage": {"int": "0"}}
+
+
+class FakeBlock:
+    def __init__(self, shell):
+        self.shell = shell
+
+    def hash(self):
+        return self.shell.chain
+
+
+class FakeShell:
+    def __init__(self, chain="BLsandbox1"):
+        self.chain = chain
+        self.codes = {"KT1minter": minter_code, "KT1other": minter_code}
+        self.fetches = []
+        self.contracts = self
+        self.blocks = {1: FakeBlock(self)}
+
+    def __getitem__(self, address):
+        return FakeScript(self, address)
+
+
+class FakeContext:
+    def __init__(self, shell):
+        self.shell = shell
+        self.key = None
+        self.mode = "readable"
+
+
+class FakeClient:
+    def __init__(self, shell):
+        self.context = FakeContext(shell)
+
+
+class InterfaceCacheTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.shell = FakeShell()
+        self.client = FakeClient(self.shell)
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def test_fetches_the_script_once_per_address(self):
+        cache = InterfaceCache()
+
+        interfaces = {id(cache.contract(self.client, "KT1minter")) for _ in range(1000)}
+
+        self.assertEqual(["KT1minter"], self.shell.fetches)
+        self.assertEqual(1, len(interfaces))
+
+    def test_shares_parsed_program_between_contracts_with_same_code(self):
+        cache = InterfaceCache()
+
+        minter = cache.contract(self.client, "KT1minter")
+        other = cache.contract(self.client, "KT1other")
+
+        self.assertIs(type(minter), type(other))
+        self.assertEqual("KT1other", other.context.address)
+
+    def test_builds_an_interface_per_client_without_fetching_again(self):
+        cache = InterfaceCache()
+        cache.contract(self.client, "KT1minter")
+
+        interface = cache.contract(FakeClient(self.shell), "KT1minter")
+
+        self.assertEqual(["KT1minter"], self.shell.fetches)
+        self.assertEqual("KT1minter", interface.context.address)
+
+    def test_reads_persisted_scripts(self):
+        InterfaceCache(self.tmp.name).contract(self.client, "KT1minter")
+
+        InterfaceCache(self.tmp.name).contract(FakeClient(self.shell), "KT1minter")
+
+        self.assertEqual(["KT1minter"], self.shell.fetches)
+
+    def test_ignores_scripts_persisted_from_another_chain(self):
+        InterfaceCache(self.tmp.name).contract(self.client, "KT1minter")
+
+        InterfaceCache(self.tmp.name).contract(FakeClient(FakeShell(chain="BLsandbox2")), "KT1minter")
+
+        self.assertEqual(["KT1minter"], self.shell.fetches)
+        entry = json.loads((Path(self.tmp.name) / "KT1minter.json").read_text())
+        self.assertEqual("BLsandbox2", entry["chain"])
+
+    def test_ignores_scripts_not_matching_their_code_hash(self):
+        InterfaceCache(self.tmp.name).contract(self.client, "KT1minter")
+        path = Path(self.tmp.name) / "KT1minter.json"
+        entry = json.loads(path.read_text())
+        entry["code"][0]["args"] = [{"prim": "int"}]
+        path.write_text(json.dumps(entry))
+
+        InterfaceCache(self.tmp.name).contract(FakeClient(self.shell), "KT1minter")
+
+        self.assertEqual(["KT1minter", "KT1minter"], self.shell.fetches)
+
+    def test_forget_fetches_again(self):
+        cache = InterfaceCache(self.tmp.name)
+        cache.contract(self.client, "KT1minter")
+
+        cache.forget("KT1minter")
+        cache.contract(self.client, "KT1minter")
+
+        self.assertEqual(["KT1minter", "KT1minter"], self.shell.fetches)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from pytezos import michelson_to_micheline
+
+from src.ligo import LigoView, _view_main_signature
+
+views_source = """
+type storage = (address, nat) big_map
+
+let get_balance_main ((p, s): ((address * nat) list * storage)) : (operation list * storage) =
+  (([]: operation list), s)
+
+let total_supply_main ((token_id, s): (nat * storage)) : (operation list * storage) = (([]: operation list), s)
+
+let all_tokens_main ((p, s): (unit * storage)) : (operation list * storage) = (([]: operation list), s)
+"""
+
+parameters = [michelson_to_micheline("(list (pair address nat))"), {"prim": "nat"}, {"prim": "unit"}]
+
+
+class FakeLigo:
+    def __init__(self):
+        self.commands = []
+        self.sources = []
+
+    async def __call__(self, command, timeout=None):
+        """
+        Answers compile-expression with the view name and compile-contract
+        with a comb of the parameters, annotated as ligo does.
+        """
+        self.commands.append(command)
+        if command[1] == "compile-expression":
+            return json.dumps([{"string": command[-1]}])
+        self.sources.append(Path(command[-2]).read_text())
+        branches = [dict(p, annots=[f"%view_{i}"]) for i, p in enumerate(parameters)]
+        tree = branches[-1]
+        for branch in reversed(branches[:-1]):
+            tree = {"prim": "or", "args": [branch, tree]}
+        return json.dumps([{"prim": "parameter", "args": [tree]}, {"prim": "storage", "args": [{"prim": "unit"}]}])
+
+
+class LigoViewTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.views_file = Path(self.tmp.name) / "views.mligo"
+        self.views_file.write_text(views_source)
+        self.ligo = FakeLigo()
+        patcher = patch("src.ligo.execute_command_async", self.ligo)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def test_finds_parameter_and_storage_types(self):
+        self.assertEqual(("(address * nat) list", "storage"), _view_main_signature(views_source, "get_balance"))
+        self.assertEqual(("nat", "storage"), _view_main_signature(views_source, "total_supply"))
+
+    def test_rejects_unknown_view(self):
+        with self.assertRaises(Exception):
+            _view_main_signature(views_source, "is_operator")
+
+    def test_batch_source_has_a_constructor_per_view(self):
+        source = LigoView(self.views_file)._batch_source(["get_balance", "total_supply", "all_tokens"])
+
+        self.assertEqual(f'#include "{self.views_file.resolve()}"\n\n'
+                         "type views_batch_parameter =\n[@layout:comb]\n"
+                         "| View_0 of (address * nat) list\n| View_1 of nat\n| View_2 of unit\n\n"
+                         "let views_batch_main ((p, s): (views_batch_parameter * storage)) "
+                         ": (operation list * storage) = (([]: operation list), s)\n", source)
+
+    def test_compiles_parameters_of_all_views_at_once(self):
+        balances_type = "(list (pair (pair address nat) nat))"
+        views = LigoView(self.views_file).compile_all([("get_balance", balances_type, "balances"),
+                                                       ("total_supply", "nat", ""),
+                                                       ("all_tokens", "(list nat)", "")])
+
+        self.assertEqual(1, len([c for c in self.ligo.commands if c[1] == "compile-contract"]))
+        self.assertEqual(1, len(self.ligo.sources))
+        self.assertIn("| View_0 of (address * nat) list", self.ligo.sources[0])
+        self.assertEqual(["get_balance", "total_supply", "all_tokens"], [v["name"] for v in views])
+        [get_balance], [total_supply], [all_tokens] = [[i["michelsonStorageView"] for i in v["implementations"]]
+                                                       for v in views]
+        self.assertEqual(parameters[0], get_balance["parameter"])
+        self.assertEqual(michelson_to_micheline(balances_type), get_balance["returnType"])
+        self.assertEqual([{"string": "get_balance_view"}], get_balance["code"])
+        self.assertEqual({"prim": "nat"}, total_supply["parameter"])
+        self.assertEqual([{"string": "total_supply_view"}], total_supply["code"])
+        self.assertNotIn("parameter", all_tokens)
+        self.assertEqual("balances", views[0]["description"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,9 @@
-from pathlib import Path
 from unittest import TestCase
 
 from pytezos import michelson_to_micheline, MichelsonRuntimeError, Key
-from src.ligo import LigoContract
+
+from contracts import contract
+from src.indexer import mint_key
 
 super_admin = 'tz1irF8HUsQp2dLhKNMhteG1qALNU9g3pfdN'
 user = 'tz1grSQDByRpnVs7sPtaprNZRp531ZKz6Jmm'
@@ -19,14 +20,9 @@ signer_3_key = Key.generate(export=False).public_key_hash()
 
 
 class MinterTest(TestCase):
-    @classmethod
-    def compile_contract(cls):
-        root_dir = Path(__file__).parent.parent / "ligo"
-        cls.bender_contract = LigoContract(root_dir / "minter" / "main.mligo", "main").compile_contract()
-
     @classmethod
     def setUpClass(cls):
-        cls.compile_contract()
+        cls.bender_contract = contract("minter")
         cls.maxDiff = None
 
     def _tokens_of(self, storage, addr, token_address):
@@ -38,6 +34,10 @@ class MinterTest(TestCase):
         self.assertIn(address, storage["fees"]["xtz"])
         return storage["fees"]["xtz"][address]
 
+    def _withdrawn_xtz(self, address, storage):
+        res = self.bender_contract.withdraw_all_xtz().interpret(storage=storage, sender=address)
+        return sum(int(op['amount']) for op in res.operations)
+
 
 class MintErc20Test(MinterTest):
 
@@ -100,13 +100,114 @@ class MintErc20Test(MinterTest):
             storage=valid_storage(),
             sender=super_admin)
 
-        self.assertIn((block_hash, log_index), res.storage["assets"]["mints"])
+        self.assertEqual({mint_key(block_hash, log_index)}, set(res.storage["assets"]["mints"]))
+
+    def test_keeps_tx_ids_of_the_same_block(self):
+        block_hash = bytes.fromhex("386bf131803cba7209ff9f43f7be0b1b4112605942d3743dc6285ee400cc8c2d")
+
+        res = self.bender_contract.mint_erc20(
+            mint_erc20_parameters(block_hash=block_hash, log_index=5)).interpret(
+            storage=valid_storage(mints=[(block_hash, 2)]),
+            sender=super_admin)
+
+        self.assertEqual({mint_key(block_hash, 2), mint_key(block_hash, 5)}, set(res.storage["assets"]["mints"]))
 
     def test_cannot_replay_same_tx(self):
         with self.assertRaises(MichelsonRuntimeError) as context:
             self.bender_contract.mint_erc20(
                 mint_erc20_parameters(block_hash=b'aTx', log_index=3)).interpret(
-                storage=valid_storage(mints={(b'aTx', 3): None}),
+                storage=valid_storage(mints=[(b'aTx', 3)]),
+                sender=super_admin)
+        self.assertEqual("'TX_ALREADY_MINTED'", context.exception.args[-1])
+
+
+class MintErc20BatchTest(MinterTest):
+
+    def test_rejects_batch_if_not_signer(self):
+        with self.assertRaises(MichelsonRuntimeError) as context:
+            self.bender_contract.mint_erc20_batch([mint_erc20_parameters()]).interpret(
+                storage=valid_storage(),
+                sender=user)
+
+        self.assertEqual("'NOT_SIGNER'", context.exception.args[-1])
+
+    def test_mints_events_of_a_token_in_one_call_and_collects_fees_once(self):
+        amount = 1 * 10 ** 16
+
+        res = self.bender_contract.mint_erc20_batch([
+            mint_erc20_parameters(log_index=1, amount=amount),
+            mint_erc20_parameters(log_index=2, owner=other_party, amount=amount)]).interpret(
+            storage=valid_storage(fees_ratio=1),
+            self_address=self_address,
+            sender=super_admin)
+
+        self.assertEqual(1, len(res.operations))
+        mint = res.operations[0]
+        self.assertEqual(f'{token_contract}', mint['destination'])
+        self.assertEqual('tokens', mint['parameters']['entrypoint'])
+        fees = int(0.0001 * 10 ** 16)
+        self.assertEqual(michelson_to_micheline(
+            f'( Right {{ Pair "{self_address}" 1 {2 * fees} ; '
+            f'Pair "{other_party}" 1 {amount - fees} ; Pair "{user}" 1 {amount - fees} }})'),
+            mint['parameters']['value'])
+        self.assertEqual(2 * fees, self._tokens_of(res.storage, self_address, (token_contract, 1)))
+
+    def test_calls_each_fa2_once(self):
+        other_token_contract = 'KT1VUNmGa1JYJuNxNS4XDzwpsc9N1gpcCBN2'
+        tokens = {b'BOB': [token_contract, 1], b'ALICE': [other_token_contract, 0], b'EVE': [token_contract, 2]}
+        events = [dict(mint_erc20_parameters(log_index=i), erc_20=erc_20)
+                  for i, erc_20 in enumerate([b'BOB', b'ALICE', b'EVE', b'BOB'])]
+
+        res = self.bender_contract.mint_erc20_batch(events).interpret(
+            storage=valid_storage(tokens=tokens),
+            sender=super_admin)
+
+        self.assertEqual(2, len(res.operations))
+        self.assertEqual({token_contract, other_token_contract}, {op['destination'] for op in res.operations})
+        self.assertEqual({mint_key(e["event_id"]["block_hash"], e["event_id"]["log_index"]) for e in events},
+                         set(res.storage["assets"]["mints"]))
+
+    def test_mints_each_fa2_its_own_events(self):
+        other_token_contract = 'KT1VUNmGa1JYJuNxNS4XDzwpsc9N1gpcCBN2'
+        tokens = {b'BOB': [token_contract, 1], b'ALICE': [other_token_contract, 0]}
+        events = [dict(mint_erc20_parameters(log_index=1, amount=2), erc_20=b'BOB'),
+                  dict(mint_erc20_parameters(log_index=2, owner=other_party, amount=3), erc_20=b'ALICE'),
+                  dict(mint_erc20_parameters(log_index=3, owner=other_party, amount=4), erc_20=b'BOB')]
+
+        res = self.bender_contract.mint_erc20_batch(events).interpret(
+            storage=valid_storage(tokens=tokens),
+            sender=super_admin)
+
+        mints = {op['destination']: op['parameters']['value'] for op in res.operations}
+        self.assertEqual(michelson_to_micheline(f'( Right {{ Pair "{other_party}" 1 4 ; Pair "{user}" 1 2 }})'),
+                         mints[token_contract])
+        self.assertEqual(michelson_to_micheline(f'( Right {{ Pair "{other_party}" 0 3 }})'),
+                         mints[other_token_contract])
+
+    def test_rejects_batch_with_an_unknown_token_in_the_middle(self):
+        events = [mint_erc20_parameters(log_index=1),
+                  dict(mint_erc20_parameters(log_index=2), erc_20=b'ALICE'),
+                  mint_erc20_parameters(log_index=3)]
+
+        with self.assertRaises(MichelsonRuntimeError) as context:
+            self.bender_contract.mint_erc20_batch(events).interpret(
+                storage=valid_storage(),
+                sender=super_admin)
+        self.assertEqual("'UNKNOWN_TOKEN'", context.exception.args[-1])
+
+    def test_cannot_replay_same_tx(self):
+        with self.assertRaises(MichelsonRuntimeError) as context:
+            self.bender_contract.mint_erc20_batch([
+                mint_erc20_parameters(block_hash=b'aTx', log_index=2),
+                mint_erc20_parameters(block_hash=b'aTx', log_index=3)]).interpret(
+                storage=valid_storage(mints=[(b'aTx', 3)]),
+                sender=super_admin)
+        self.assertEqual("'TX_ALREADY_MINTED'", context.exception.args[-1])
+
+    def test_cannot_mint_an_event_twice_in_a_batch(self):
+        with self.assertRaises(MichelsonRuntimeError) as context:
+            self.bender_contract.mint_erc20_batch([mint_erc20_parameters(), mint_erc20_parameters()]).interpret(
+                storage=valid_storage(),
                 sender=super_admin)
         self.assertEqual("'TX_ALREADY_MINTED'", context.exception.args[-1])
 
@@ -193,6 +294,16 @@ class ERC721Test(MinterTest):
             user_mint['parameters']['value'])
         self.assertEqual(20, self._xtz_of(self_address, res.storage))
 
+    def test_saves_nft_tx_id_and_rejects_its_replay(self):
+        res = self.bender_contract.mint_erc721(mint_erc721_parameters(block_hash=b'aTx', log_index=4)) \
+            .interpret(storage=valid_storage(mints=[(b'aTx', 1)]), sender=super_admin, amount=1)
+
+        self.assertEqual({mint_key(b'aTx', 1), mint_key(b'aTx', 4)}, set(res.storage["assets"]["mints"]))
+        with self.assertRaises(MichelsonRuntimeError) as context:
+            self.bender_contract.mint_erc721(mint_erc721_parameters(block_hash=b'aTx', log_index=4)) \
+                .interpret(storage=res.storage, sender=super_admin, amount=1)
+        self.assertEqual("'TX_ALREADY_MINTED'", context.exception.args[-1])
+
     def test_unwrap_nft(self):
         token_id = 1337
         fees = 10
@@ -215,6 +326,83 @@ class ERC721Test(MinterTest):
         self.assertEqual(10, self._xtz_of(self_address, res.storage))
 
 
+class ERC721BatchTest(MinterTest):
+
+    def test_mints_nfts_in_one_call(self):
+        res = self.bender_contract.mint_erc721_batch([
+            mint_erc721_parameters(log_index=1, token_id=5),
+            mint_erc721_parameters(log_index=2, token_id=6)]) \
+            .interpret(storage=valid_storage(nft_fees=20), sender=super_admin, amount=40, self_address=self_address)
+
+        self.assertEqual(1, len(res.operations))
+        mint = res.operations[0]
+        self.assertEqual(f'{nft_contract}', mint['destination'])
+        self.assertEqual(michelson_to_micheline(
+            f'( Right {{ Pair "{user}" 6 1 ; Pair "{user}" 5 1 }})'),
+            mint['parameters']['value'])
+        self.assertEqual(40, self._xtz_of(self_address, res.storage))
+
+    def test_rejects_batch_with_a_minted_event_in_the_middle(self):
+        with self.assertRaises(MichelsonRuntimeError) as context:
+            self.bender_contract.mint_erc721_batch([
+                mint_erc721_parameters(block_hash=b'aTx', log_index=1),
+                mint_erc721_parameters(block_hash=b'aTx', log_index=2),
+                mint_erc721_parameters(block_hash=b'aTx', log_index=3)]) \
+                .interpret(storage=valid_storage(nft_fees=20, mints=[(b'aTx', 2)]), sender=super_admin, amount=60)
+
+        self.assertEqual("'TX_ALREADY_MINTED'", context.exception.args[-1])
+
+    def test_rejects_fees_of_a_single_nft(self):
+        with self.assertRaises(MichelsonRuntimeError) as context:
+            self.bender_contract.mint_erc721_batch([
+                mint_erc721_parameters(log_index=1),
+                mint_erc721_parameters(log_index=2)]) \
+                .interpret(storage=valid_storage(nft_fees=20), sender=super_admin, amount=20)
+
+        self.assertEqual("'FEES_TOO_LOW'", context.exception.args[-1])
+
+
+class ImportMintsTest(MinterTest):
+
+    def test_rejects_import_if_not_admin(self):
+        with self.assertRaises(MichelsonRuntimeError) as context:
+            self.bender_contract.import_mints([{"block_hash": b'aTx', "log_index": 3}]).interpret(
+                storage=valid_storage(paused=True),
+                sender=user)
+
+        self.assertEqual("'NOT_ADMIN'", context.exception.args[-1])
+
+    def test_rejects_import_if_not_paused(self):
+        with self.assertRaises(MichelsonRuntimeError) as context:
+            self.bender_contract.import_mints([{"block_hash": b'aTx', "log_index": 3}]).interpret(
+                storage=valid_storage(),
+                sender=super_admin)
+
+        self.assertEqual("'CONTRACT_NOT_PAUSED'", context.exception.args[-1])
+
+    def test_imports_tx_ids_skipping_known_ones(self):
+        res = self.bender_contract.import_mints([{"block_hash": b'aTx', "log_index": 3},
+                                                 {"block_hash": b'aTx', "log_index": 4},
+                                                 {"block_hash": b'bTx', "log_index": 1}]).interpret(
+            storage=valid_storage(mints=[(b'aTx', 3)], paused=True),
+            sender=super_admin)
+
+        self.assertEqual({mint_key(b'aTx', 3), mint_key(b'aTx', 4), mint_key(b'bTx', 1)},
+                         set(res.storage["assets"]["mints"]))
+
+    def test_imported_events_cannot_be_minted(self):
+        res = self.bender_contract.import_mints([{"block_hash": b'aTx', "log_index": 3}]).interpret(
+            storage=valid_storage(paused=True),
+            sender=super_admin)
+        res.storage["admin"]["paused"] = False
+
+        with self.assertRaises(MichelsonRuntimeError) as context:
+            self.bender_contract.mint_erc20(mint_erc20_parameters(block_hash=b'aTx', log_index=3)).interpret(
+                storage=res.storage,
+                sender=super_admin)
+        self.assertEqual("'TX_ALREADY_MINTED'", context.exception.args[-1])
+
+
 class GovernanceTest(MinterTest):
 
     def test_set_wrapping_fees(self):
@@ -375,7 +563,7 @@ class FeesDistributionTest(MinterTest):
                                                                             sender=super_admin,
                                                                             self_address=self_address)
 
-        self.assertEqual(50, self._xtz_of(signer_1_key, res.storage))
+        self.assertEqual(50, self._withdrawn_xtz(signer_1_key, res.storage))
         self.assertEqual(0, self._xtz_of(self_address, res.storage))
 
     def test_distribute_xtz_to_signer_registered_payment_address(self):
@@ -388,7 +576,7 @@ class FeesDistributionTest(MinterTest):
                                                                             sender=super_admin,
                                                                             self_address=self_address)
 
-        self.assertEqual(50, self._xtz_of(signer_1_payment_address, res.storage))
+        self.assertEqual(50, self._withdrawn_xtz(signer_1_payment_address, res.storage))
 
     def test_distribute_xtz_to_several_signers_and_keeps_remaining_to_distribute(self):
         initial_storage = valid_storage()
@@ -399,11 +587,54 @@ class FeesDistributionTest(MinterTest):
             sender=super_admin,
             self_address=self_address)
 
-        self.assertEqual(16, self._xtz_of(signer_1_key, res.storage))
-        self.assertEqual(16, self._xtz_of(signer_2_key, res.storage))
-        self.assertEqual(16, self._xtz_of(signer_3_key, res.storage))
+        self.assertEqual(16, self._withdrawn_xtz(signer_1_key, res.storage))
+        self.assertEqual(16, self._withdrawn_xtz(signer_2_key, res.storage))
+        self.assertEqual(16, self._withdrawn_xtz(signer_3_key, res.storage))
         self.assertEqual(2, self._xtz_of(self_address, res.storage))
 
+    def test_accrues_signer_xtz_over_distributions(self):
+        initial_storage = valid_storage()
+        with_xtz_to_distribute(100, initial_storage)
+        first = self.bender_contract.distribute_xtz([signer_1_key, signer_2_key]).interpret(
+            storage=initial_storage, sender=super_admin, self_address=self_address)
+        with_xtz_to_distribute(200, first.storage)
+
+        res = self.bender_contract.distribute_xtz([signer_1_key, signer_2_key]).interpret(
+            storage=first.storage, sender=super_admin, self_address=self_address)
+
+        self.assertNotIn(signer_1_key, res.storage["fees"]["xtz"])
+        self.assertEqual(75, self._withdrawn_xtz(signer_1_key, res.storage))
+
+    def test_settles_signers_leaving_the_quorum(self):
+        initial_storage = valid_storage()
+        with_xtz_to_distribute(100, initial_storage)
+        first = self.bender_contract.distribute_xtz([signer_1_key, signer_2_key]).interpret(
+            storage=initial_storage, sender=super_admin, self_address=self_address)
+        with_xtz_to_distribute(100, first.storage)
+
+        res = self.bender_contract.distribute_xtz([signer_1_key]).interpret(
+            storage=first.storage, sender=super_admin, self_address=self_address)
+
+        self.assertEqual(25, self._xtz_of(signer_2_key, res.storage))
+        self.assertEqual(25, self._withdrawn_xtz(signer_2_key, res.storage))
+        self.assertEqual(75, self._withdrawn_xtz(signer_1_key, res.storage))
+
+    def test_settles_holders_whose_shares_change(self):
+        initial_storage = valid_storage()
+        with_xtz_to_distribute(100, initial_storage)
+        first = self.bender_contract.distribute_xtz([signer_1_key, signer_2_key]).interpret(
+            storage=initial_storage, sender=super_admin, self_address=self_address)
+        with_xtz_to_distribute(100, first.storage)
+        first.storage["fees"]["signers"] = {signer_2_key: signer_1_key}
+
+        res = self.bender_contract.distribute_xtz([signer_1_key, signer_2_key]).interpret(
+            storage=first.storage, sender=super_admin, self_address=self_address)
+
+        self.assertEqual({signer_1_key: 2}, res.storage["fees"]["shares"]["holders"])
+        self.assertEqual(25, self._xtz_of(signer_1_key, res.storage))
+        self.assertEqual(25, self._xtz_of(signer_2_key, res.storage))
+        self.assertEqual(75, self._withdrawn_xtz(signer_1_key, res.storage))
+
     def test_distribute_tokens_to_dev_pool(self):
         initial_storage = valid_storage()
         token_address = (token_contract, 0)
@@ -439,8 +670,29 @@ class FeesDistributionTest(MinterTest):
                                                                                                 sender=super_admin,
                                                                                                 self_address=self_address)
 
-        self.assertEqual(90, self._tokens_of(res.storage, signer_1_key, token_address))
+        self.assertEqual(40, self._tokens_of(res.storage, signer_1_key, token_address))
         self.assertEqual(0, self._tokens_of(res.storage, self_address, token_address))
+        withdrawal = self.bender_contract.withdraw_all_tokens(token_contract, [0]).interpret(
+            storage=res.storage, sender=signer_1_key, self_address=self_address)
+        self.assertEqual(michelson_to_micheline(f'{{ Pair "{self_address}" {{ Pair "{signer_1_key}" 0 90 }} }}'),
+                         withdrawal.operations[0]['parameters']['value'])
+
+    def test_settles_only_the_withdrawn_token(self):
+        initial_storage = valid_storage()
+        first_token = (token_contract, 0)
+        second_token = (token_contract, 1)
+        with_token_to_distribute(first_token, 100, initial_storage)
+        with_token_to_distribute(second_token, 200, initial_storage)
+        res = self.bender_contract.distribute_tokens([signer_1_key], [first_token, second_token]).interpret(
+            storage=initial_storage, sender=super_admin, self_address=self_address)
+        # pytezos does not order pair keys consistently when a storage is passed back, the signer has no entry yet
+        res.storage["fees"]["tokens"] = {}
+
+        withdrawal = self.bender_contract.withdraw_token(token_contract, 0, 10).interpret(
+            storage=res.storage, sender=signer_1_key, self_address=self_address)
+
+        self.assertEqual(40, self._tokens_of(withdrawal.storage, signer_1_key, first_token))
+        self.assertNotIn((signer_1_key,) + second_token, withdrawal.storage["fees"]["tokens"])
 
     def test_distribute_several_tokens(self):
         initial_storage = valid_storage()
@@ -471,6 +723,18 @@ class FeesClaimTest(MinterTest):
         self.assertEqual('default', res.operations[0]['parameters']['entrypoint'])
         self.assertEqual(60, self._xtz_of(signer_1_key, res.storage))
 
+    def test_settles_signer_before_withdrawing_some_xtz(self):
+        storage = valid_storage()
+        with_xtz_to_distribute(100, storage)
+        res = self.bender_contract.distribute_xtz([signer_1_key]).interpret(
+            storage=storage, sender=super_admin, self_address=self_address)
+
+        res = self.bender_contract.withdraw_xtz(20).interpret(storage=res.storage, sender=signer_1_key)
+
+        self.assertEqual("20", res.operations[0]['amount'])
+        self.assertEqual(30, self._xtz_of(signer_1_key, res.storage))
+        self.assertEqual(50, res.storage["fees"]["shares"]["xtz_checkpoints"][signer_1_key])
+
     def test_should_fail_if_not_enough_xtz(self):
         with self.assertRaises(MichelsonRuntimeError) as context:
             storage = valid_storage()
@@ -592,9 +856,10 @@ def with_token_balance(address, token_address, amount, initial_storage):
     initial_storage["fees"]["tokens"][(address,) + token_address] = amount
 
 
-def valid_storage(mints=None, fees_ratio=0, nft_fees=1, tokens=None, paused=False):
-    if mints is None:
-        mints = {}
+def valid_storage(mints=(), fees_ratio=0, nft_fees=1, tokens=None, paused=False):
+    """
+    :param mints: (block hash, log index) of the events already minted
+    """
     if tokens is None:
         tokens = {b'BOB': [token_contract, 1]}
     return {
@@ -607,7 +872,7 @@ def valid_storage(mints=None, fees_ratio=0, nft_fees=1, tokens=None, paused=Fals
         "assets": {
             "erc20_tokens": tokens,
             "erc721_tokens": {b'NFT': nft_contract},
-            "mints": mints
+            "mints": {mint_key(block_hash, log_index): None for block_hash, log_index in mints}
         },
         "governance": {
             "contract": super_admin,
@@ -626,7 +891,15 @@ def valid_storage(mints=None, fees_ratio=0, nft_fees=1, tokens=None, paused=Fals
         "fees": {
             "signers": {},
             "tokens": {},
-            "xtz": {}
+            "xtz": {},
+            "shares": {
+                "holders": {},
+                "tokens": [],
+                "tokens_per_share": {},
+                "xtz_per_share": 0,
+                "token_checkpoints": {},
+                "xtz_checkpoints": {}
+            }
         },
         "metadata": {}
     }
@@ -0,0 +1,109 @@
+import unittest
+from unittest.mock import patch
+
+from src.preflight import Preflight, big_map_entry_size, big_map_size_diff, bounded, burn_reserve, expr_size, \
+    gas_reserve
+
+address = {"prim": "address"}
+nat = {"prim": "nat"}
+
+
+class BoundedTest(unittest.TestCase):
+
+    def test_records_are_bounded(self):
+        self.assertTrue(bounded({"prim": "pair", "args": [address, {"prim": "pair", "args": [nat, nat]}]}))
+
+    def test_collections_are_not(self):
+        self.assertFalse(bounded({"prim": "pair", "args": [address, {"prim": "list", "args": [nat]}]}))
+        self.assertFalse(bounded({"prim": "map", "args": [address, nat]}))
+
+
+class BigMapSizeDiffTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.current = {(4, "expru1"): {"int": "10"}}
+
+    def lookup(self, ptr, key_hash):
+        return self.current.get((ptr, key_hash))
+
+    def test_new_entry_pays_key_hash_key_and_value(self):
+        update = {"key_hash": "expru2", "key": {"string": "tz1"}, "value": {"int": "1"}}
+
+        size = big_map_size_diff([(4, update)], self.lookup)
+
+        self.assertEqual(big_map_entry_size + expr_size(update["key"]) + expr_size(update["value"]), size)
+
+    def test_updated_entry_pays_value_growth(self):
+        update = {"key_hash": "expru1", "key": {"string": "tz1"}, "value": {"int": "1000000"}}
+
+        size = big_map_size_diff([(4, update)], self.lookup)
+
+        self.assertEqual(expr_size({"int": "1000000"}) - expr_size({"int": "10"}), size)
+
+    def test_removed_entry_frees_its_size(self):
+        self.assertLess(big_map_size_diff([(4, {"key_hash": "expru1", "key": {"string": "tz1"}})], self.lookup), 0)
+
+
+class FakeKey:
+    def public_key_hash(self):
+        return "tz1admin"
+
+
+class FakeClient:
+    key = FakeKey()
+
+
+class FakeCall:
+    def __init__(self, entrypoint, address="KT1minter", amount=0):
+        self.address = address
+        self.amount = amount
+        self.parameters = {"entrypoint": entrypoint, "value": {"prim": "Unit"}}
+        self.context = self
+        self.script = {"code": [{"prim": "parameter", "args": [{"prim": "unit"}]}]}
+
+
+class PreflightCheckTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.preflight = Preflight(FakeClient(), margin=0.1)
+        self.runs = []
+        self.preflight._refresh = lambda: None
+        self.preflight._state = lambda address: {"balance": 1_000_000}
+        self.preflight._is_bounded = lambda call: call.parameters["entrypoint"] != "distribute_tokens"
+
+    def _run(self, address, entrypoint, value, amount, sender, source):
+        self.runs.append((address, entrypoint, sender))
+        if address == "KT1minter":
+            internal = {"kind": "transaction", "amount": "0", "destination": "KT1fa2",
+                        "parameters": {"entrypoint": "mint_tokens", "value": []}}
+            return 20, [internal, {"kind": "transaction", "amount": "500000", "destination": "tz1dev"}]
+        return 150, []
+
+    def test_runs_internal_operations_and_sums_storage(self):
+        with patch.object(self.preflight, "_run", self._run):
+            [estimate] = self.preflight.check(FakeCall("mint_erc20"))
+
+        self.assertEqual([("KT1minter", "mint_erc20", "tz1admin"), ("KT1fa2", "mint_tokens", "KT1minter")], self.runs)
+        self.assertEqual(170 + burn_reserve, estimate["storage"])
+
+    def test_reuses_measured_gas_of_bounded_entrypoints(self):
+        call = FakeCall("mint_erc20")
+        self.preflight.gas[self.preflight._gas_key(call)] = 50_000
+
+        with patch.object(self.preflight, "_run", self._run):
+            [estimate] = self.preflight.check(call)
+
+        self.assertEqual(55_000 + gas_reserve, estimate["gas"])
+
+    def test_leaves_gas_of_unbounded_entrypoints_to_simulation(self):
+        call = FakeCall("distribute_tokens")
+        self.preflight.gas[self.preflight._gas_key(call)] = 50_000
+
+        with patch.object(self.preflight, "_run", self._run):
+            [estimate] = self.preflight.check(call)
+
+        self.assertIsNone(estimate["gas"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,25 +1,32 @@
 import unittest
-from pathlib import Path
 
 from pytezos import Key, michelson_to_micheline, MichelsonRuntimeError
 from pytezos.michelson.types import MichelsonType
 
-from src.ligo import LigoContract
+from contracts import contract
 
 owner = "tz1S792fHX5rvs6GYP49S1U58isZkp2bNmn6"
 minter_contract = "KT1VUNmGa1JYJuNxNS4XDzwpsc9N1gpcCBN2"
 chain_id = "NetXm8tYqnMWky1"
 minter_ep = """(or
-                 (or (pair %add_fungible_token (bytes %eth_contract) (pair %token_address address nat))
-                     (pair %add_nft (bytes %eth_contract) (address %token_contract)))
-                 (or (pair %mint_fungible_token
-                        (bytes %erc_20)
-                        (pair (pair %event_id (bytes %block_hash) (nat %log_index))
-                              (pair (address %owner) (nat %amount))))
-                     (pair %mint_nft
+                 (or (or (pair %add_fungible_token (bytes %eth_contract) (pair %token_address address nat))
+                         (pair %add_nft (bytes %eth_contract) (address %token_contract)))
+                     (or (pair %mint_fungible_token
+                            (bytes %erc_20)
+                            (pair (pair %event_id (bytes %block_hash) (nat %log_index))
+                                  (pair (address %owner) (nat %amount))))
+                         (list %mint_fungible_token_batch
+                            (pair (bytes %erc_20)
+                                  (pair (pair %event_id (bytes %block_hash) (nat %log_index))
+                                        (pair (address %owner) (nat %amount)))))))
+                 (or (pair %mint_nft
                         (bytes %erc_721)
                         (pair (pair %event_id (bytes %block_hash) (nat %log_index))
-                              (pair (address %owner) (nat %token_id))))))"""
+                              (pair (address %owner) (nat %token_id))))
+                     (list %mint_nft_batch
+                        (pair (bytes %erc_721)
+                              (pair (pair %event_id (bytes %block_hash) (nat %log_index))
+                                    (pair (address %owner) (nat %token_id)))))))"""
 first_signer_id = "k51qzi5uqu5dilfdi6xt8tfbw4zmghwewcvvktm7z9fk4ktsx4z7wn0mz2glje"
 second_signer_id = "k51qzi5uqu5dhuc1pto6x98woksrqgwhq6d1lff2hfymxmlk4qd7vqgtf980yl"
 first_signer_key = Key.generate(curve=b'sp', export=False)
@@ -32,8 +39,7 @@ class QuorumContractTest(unittest.TestCase):
 
     @classmethod
     def setUpClass(cls) -> None:
-        root_dir = Path(__file__).parent.parent / "ligo"
-        cls.contract = LigoContract(root_dir / "quorum" / "multisig.mligo", "main").get_contract()
+        cls.contract = contract("quorum")
 
 
 class SignerTest(QuorumContractTest):
@@ -64,8 +70,8 @@ class SignerTest(QuorumContractTest):
 
         packed = packed_payload(amount, token_id, block_hash, log_index)
         params = forge_params(amount, token_id, block_hash, log_index, [
-            [first_signer_id, first_signer_key.sign(packed)],
-            [second_signer_id, second_signer_key.sign(packed)]
+            [second_signer_id, second_signer_key.sign(packed)],
+            [first_signer_id, first_signer_key.sign(packed)]
         ])
 
         res = self.contract.minter(params).interpret(storage=storage_with_two_keys(),
@@ -144,6 +150,160 @@ class SignerTest(QuorumContractTest):
                                                    chain_id=chain_id, self_address=self_address)
         self.assertEquals("'MISSING_SIGNATURES'", context.exception.args[-1])
 
+    def test_rejects_duplicated_signer(self):
+        with self.assertRaises(MichelsonRuntimeError) as context:
+            token_id = b"contract_on_eth"
+            block_hash = b"txId"
+            log_index = 3
+            packed = packed_payload(10, token_id, block_hash, log_index)
+            params = forge_params(10, token_id, block_hash, log_index,
+                                  [[first_signer_id, first_signer_key.sign(packed)],
+                                   [first_signer_id, first_signer_key.sign(packed)]])
+
+            self.contract.minter(params).interpret(storage=storage_with_two_keys(),
+                                                   sender=first_signer_key.public_key_hash(),
+                                                   chain_id=chain_id, self_address=self_address)
+        self.assertEqual("'UNSORTED_SIGNATURES'", context.exception.args[-1])
+
+    def test_rejects_signatures_not_sorted_by_signer_id(self):
+        with self.assertRaises(MichelsonRuntimeError) as context:
+            token_id = b"contract_on_eth"
+            block_hash = b"txId"
+            log_index = 3
+            packed = packed_payload(10, token_id, block_hash, log_index)
+            params = forge_params(10, token_id, block_hash, log_index,
+                                  [[first_signer_id, first_signer_key.sign(packed)],
+                                   [second_signer_id, second_signer_key.sign(packed)]])
+
+            self.contract.minter(params).interpret(storage=storage_with_two_keys(),
+                                                   sender=first_signer_key.public_key_hash(),
+                                                   chain_id=chain_id, self_address=self_address)
+        self.assertEqual("'UNSORTED_SIGNATURES'", context.exception.args[-1])
+
+    def test_ignores_signatures_after_threshold_is_reached(self):
+        amount = 10000000
+        token_id = b"contract_on_eth"
+        block_hash = b"txId"
+        log_index = 3
+        packed = packed_payload(amount, token_id, block_hash, log_index)
+        params = forge_params(amount, token_id, block_hash, log_index, [
+            [second_signer_id, second_signer_key.sign(packed)],
+            ["unknown", first_signer_key.sign(packed)]
+        ])
+
+        res = self.contract.minter(params).interpret(storage=storage_with_two_keys(threshold=1),
+                                                     sender=first_signer_key.public_key_hash(),
+                                                     chain_id=chain_id, self_address=self_address)
+
+        self.assertEqual(1, len(res.operations))
+
+
+class BatchTest(QuorumContractTest):
+    def test_mints_every_action_of_a_batch(self):
+        mints = [(10, b"contract_on_eth", b"txId", 1), (20, b"contract_on_eth", b"txId", 2)]
+        packed = packed_batch_payload(mints)
+        params = forge_batch_params(mints, [[second_signer_id, second_signer_key.sign(packed)],
+                                            [first_signer_id, first_signer_key.sign(packed)]])
+
+        res = self.contract.minter_batch(params).interpret(storage=storage_with_two_keys(),
+                                                           sender=first_signer_key.public_key_hash(),
+                                                           chain_id=chain_id, self_address=self_address)
+
+        self.assertEqual(2, len(res.operations))
+        for op, mint in zip(res.operations, mints):
+            self.assertEqual(minter_contract, op["destination"])
+            self.assertEqual(michelson_to_micheline(minter_call(*mint)), op['parameters']['value'])
+
+    def test_rejects_signature_of_a_single_action(self):
+        with self.assertRaises(MichelsonRuntimeError) as context:
+            mint = (10, b"contract_on_eth", b"txId", 1)
+            packed = packed_payload(*mint)
+            params = forge_batch_params([mint], [[first_signer_id, first_signer_key.sign(packed)]])
+
+            self.contract.minter_batch(params).interpret(storage=storage(),
+                                                         sender=first_signer_key.public_key_hash(),
+                                                         chain_id=chain_id, self_address=self_address)
+        self.assertEqual("'BAD_SIGNATURE'", context.exception.args[-1])
+
+    def test_sends_amounts_with_their_action(self):
+        mints = [(10, b"contract_on_eth", b"txId", 1), (20, b"contract_on_eth", b"txId", 2)]
+        packed = packed_batch_payload(mints)
+        params = forge_batch_params(mints, [[first_signer_id, first_signer_key.sign(packed)]], [0, 500_000])
+
+        res = self.contract.minter_batch(params).interpret(storage=storage(), amount=500_000,
+                                                           sender=first_signer_key.public_key_hash(),
+                                                           chain_id=chain_id, self_address=self_address)
+
+        self.assertEqual(["0", "500000"], [op["amount"] for op in res.operations])
+
+    def test_rejects_amounts_not_matching_amount_sent(self):
+        with self.assertRaises(MichelsonRuntimeError) as context:
+            mints = [(10, b"contract_on_eth", b"txId", 1)]
+            packed = packed_batch_payload(mints)
+            params = forge_batch_params(mints, [[first_signer_id, first_signer_key.sign(packed)]], [500_000])
+
+            self.contract.minter_batch(params).interpret(storage=storage(), amount=400_000,
+                                                         sender=first_signer_key.public_key_hash(),
+                                                         chain_id=chain_id, self_address=self_address)
+        self.assertEqual("'BAD_AMOUNT'", context.exception.args[-1])
+
+    def test_rejects_more_amounts_than_actions(self):
+        with self.assertRaises(MichelsonRuntimeError) as context:
+            mints = [(10, b"contract_on_eth", b"txId", 1)]
+            packed = packed_batch_payload(mints)
+            params = forge_batch_params(mints, [[first_signer_id, first_signer_key.sign(packed)]], [500_000, 0])
+
+            self.contract.minter_batch(params).interpret(storage=storage(), amount=500_000,
+                                                         sender=first_signer_key.public_key_hash(),
+                                                         chain_id=chain_id, self_address=self_address)
+        self.assertEqual("'BAD_AMOUNT'", context.exception.args[-1])
+
+    def test_rejects_xtz_sent_without_amounts(self):
+        with self.assertRaises(MichelsonRuntimeError) as context:
+            mints = [(10, b"contract_on_eth", b"txId", 1)]
+            packed = packed_batch_payload(mints)
+            params = forge_batch_params(mints, [[first_signer_id, first_signer_key.sign(packed)]])
+
+            self.contract.minter_batch(params).interpret(storage=storage(), amount=500_000,
+                                                         sender=first_signer_key.public_key_hash(),
+                                                         chain_id=chain_id, self_address=self_address)
+        self.assertEqual("'BAD_AMOUNT'", context.exception.args[-1])
+
+    def test_rejects_batch_signature_replayed_on_part_of_the_batch(self):
+        with self.assertRaises(MichelsonRuntimeError) as context:
+            mints = [(10, b"contract_on_eth", b"txId", 1), (20, b"contract_on_eth", b"txId", 2)]
+            packed = packed_batch_payload(mints)
+            params = forge_batch_params(mints[1:], [[first_signer_id, first_signer_key.sign(packed)]])
+
+            self.contract.minter_batch(params).interpret(storage=storage(),
+                                                         sender=first_signer_key.public_key_hash(),
+                                                         chain_id=chain_id, self_address=self_address)
+        self.assertEqual("'BAD_SIGNATURE'", context.exception.args[-1])
+
+    def test_rejects_batch_signature_replayed_on_another_quorum(self):
+        with self.assertRaises(MichelsonRuntimeError) as context:
+            mints = [(10, b"contract_on_eth", b"txId", 1)]
+            packed = packed_batch_payload(mints)
+            params = forge_batch_params(mints, [[first_signer_id, first_signer_key.sign(packed)]])
+
+            self.contract.minter_batch(params).interpret(storage=storage(),
+                                                         sender=first_signer_key.public_key_hash(),
+                                                         chain_id=chain_id,
+                                                         self_address="KT1RXpLtz22YgX24QQhxKVyKvtKZFaAVtTB9")
+        self.assertEqual("'BAD_SIGNATURE'", context.exception.args[-1])
+
+    def test_rejects_duplicated_signer_in_a_batch(self):
+        with self.assertRaises(MichelsonRuntimeError) as context:
+            mints = [(10, b"contract_on_eth", b"txId", 1)]
+            packed = packed_batch_payload(mints)
+            params = forge_batch_params(mints, [[first_signer_id, first_signer_key.sign(packed)],
+                                                [first_signer_id, first_signer_key.sign(packed)]])
+
+            self.contract.minter_batch(params).interpret(storage=storage_with_two_keys(),
+                                                         sender=first_signer_key.public_key_hash(),
+                                                         chain_id=chain_id, self_address=self_address)
+        self.assertEqual("'UNSORTED_SIGNATURES'", context.exception.args[-1])
+
 
 class AdminTest(QuorumContractTest):
 
@@ -316,8 +476,16 @@ def forge_params(amount, token_id, block_hash, log_index, signatures):
     }
 
 
+def forge_batch_params(mints, signatures, amounts=()):
+    actions = [{"entrypoint": {"mint_erc20": {"amount": amount, "owner": owner, "erc_20": token_id,
+                                              "event_id": {"block_hash": block_hash, "log_index": log_index}}},
+                "target": f"{minter_contract}%minter"}
+               for amount, token_id, block_hash, log_index in mints]
+    return {"signatures": signatures, "actions": actions, "amounts": list(amounts)}
+
+
 def minter_call(amount, token_id, block_hash, log_index):
-    return f"(Right (Left (Pair 0x{token_id.hex()} (Pair 0x{block_hash.hex()} {log_index})\"{owner}\" {amount})))"
+    return f"(Left (Right (Left (Pair 0x{token_id.hex()} (Pair 0x{block_hash.hex()} {log_index})\"{owner}\" {amount}))))"
 
 
 def packed_payload(amount, token_id, block_hash, log_index):
@@ -332,6 +500,14 @@ def packed_payload(amount, token_id, block_hash, log_index):
     return ty.from_micheline_value(payload_value).pack().hex()
 
 
+def packed_batch_payload(mints):
+    ty = MichelsonType.match(michelson_to_micheline(f"(pair (pair chain_id address) (list (pair {minter_ep} address)))"))
+    calls = " ; ".join(f"Pair {minter_call(*mint)} \"{minter_contract}%minter\"" for mint in mints)
+    payload_value = michelson_to_micheline(f"(Pair (Pair \"{chain_id}\" \"{self_address}\") {{ {calls} }})")
+
+    return ty.from_micheline_value(payload_value).pack().hex()
+
+
 def storage():
     return {
         "admin": first_signer_key.public_key_hash(),
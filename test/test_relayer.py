@@ -0,0 +1,171 @@
+import unittest
+from unittest.mock import patch
+
+from pytezos import Key
+from pytezos.rpc.errors import RpcError
+
+from src.relayer import MintRelayer, minter_batch_call
+
+relayer_address = Key.generate(export=False).public_key_hash()
+quorum_address = "KT1RXpLtz22YgX24QQhxKVyKvtKZFaAVtTB9"
+minter_address = "KT1Hd1hiG1PhZ7xRi1HUVoAXM7i7Pzta8EHW"
+
+
+def mint(event, gas=10_000, simulation="applied", on_chain="applied", conflicts_with=None):
+    """
+    :param simulation: status of the mint when simulated
+    :param on_chain: status of the mint once injected
+    :param conflicts_with: event of a mint making this one fail when simulated in the same group
+    """
+    return {"entrypoint": "mint_erc20", "signatures": [("k51", "sig")],
+            "mint": {"event_id": event, "gas": gas, "simulation": simulation, "on_chain": on_chain,
+                     "conflicts_with": conflicts_with}}
+
+
+class FakeCall:
+    def __init__(self, mint):
+        self.mint = mint
+
+    def with_amount(self, amount):
+        return self
+
+
+class FakeQuorum:
+    def minter(self, signatures, action):
+        [(_, m)] = action["entrypoint"].items()
+        return FakeCall(m)
+
+
+class FakeGroup:
+    def __init__(self, client, calls):
+        self.client = client
+        self.calls = calls
+        self.contents = None
+
+    def fill(self, counter):
+        return self
+
+    def _status(self, call):
+        if call.mint["conflicts_with"] in [c.mint["event_id"] for c in self.calls]:
+            return "failed"
+        return call.mint["simulation"]
+
+    def run(self):
+        return {"contents": [{"kind": "transaction", "source": relayer_address, "fee": "0", "counter": str(6 + i),
+                              "gas_limit": "1040000", "storage_limit": "60000", "amount": "0",
+                              "destination": quorum_address,
+                              "parameters": {"entrypoint": "minter", "value": {"int": str(c.mint["event_id"])}},
+                              "metadata": {"operation_result": {"status": self._status(c),
+                                                                "consumed_gas": str(c.mint["gas"])}}}
+                             for i, c in enumerate(self.calls)]}
+
+    def sign(self):
+        return self
+
+    def inject(self, _async, preapply):
+        op_hash = f"oo{len(self.client.injected)}"
+        self.client.injected.append(([c.mint["event_id"] for c in self.calls], self.contents))
+        self.client.outcomes[op_hash] = all(c.mint["on_chain"] == "applied" for c in self.calls)
+        return {"hash": op_hash}
+
+
+class FakeKey:
+    def public_key_hash(self):
+        return relayer_address
+
+
+class FakeClient:
+    def __init__(self):
+        self.key = FakeKey()
+        self.shell = self
+        self.contracts = {relayer_address: lambda: {"counter": "5"}}
+        self.injected = []
+        self.outcomes = {}
+
+    def bulk(self, *calls):
+        return FakeGroup(self, calls)
+
+
+class FakeInterfaces:
+    def contract(self, client, address):
+        return FakeQuorum()
+
+
+class FakeTracker:
+    def __init__(self, client):
+        self.client = client
+
+    async def wait(self, op_hash):
+        if not self.client.outcomes[op_hash]:
+            raise RpcError.from_errors([{"id": "script_rejected"}])
+        return {"hash": op_hash}
+
+
+class MintRelayerTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.client = FakeClient()
+        patcher = patch("src.relayer.interface_cache", FakeInterfaces())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def relayer(self, **kwargs):
+        return MintRelayer(self.client, quorum_address, minter_address, tracker=FakeTracker(self.client), **kwargs)
+
+    def test_packs_mints_under_gas_budget(self):
+        relayer = self.relayer(gas_budget=350_000)
+
+        confirmed, failed = relayer.run([mint(i, gas=100_000) for i in range(10)])
+
+        self.assertEqual([[0, 1, 2], [3, 4, 5], [6, 7, 8], [9]], [events for events, _ in self.client.injected])
+        self.assertEqual(["oo0", "oo1", "oo2", "oo3"], [op_hash for op_hash, _ in relayer.injected])
+        self.assertEqual(list(range(10)), [a["mint"]["event_id"] for a, _ in confirmed])
+        self.assertEqual([], failed)
+
+    def test_assigns_consecutive_counters_across_pipelined_groups(self):
+        self.relayer(max_batch=2).run([mint(i) for i in range(5)])
+
+        counters = [int(c["counter"]) for _, contents in self.client.injected for c in contents]
+        self.assertEqual(list(range(6, 11)), counters)
+
+    def test_sets_aside_mints_failing_simulation(self):
+        actions = [mint(0), mint(1, simulation="failed"), mint(2)]
+
+        confirmed, failed = self.relayer().run(actions)
+
+        self.assertEqual([[0, 2]], [events for events, _ in self.client.injected])
+        self.assertEqual([1], [a["mint"]["event_id"] for a, _ in failed])
+        self.assertEqual(2, len(confirmed))
+
+    def test_splits_a_group_failing_only_together(self):
+        actions = [mint(0), mint(1), mint(2, conflicts_with=0), mint(3)]
+
+        confirmed, failed = self.relayer().run(actions)
+
+        self.assertEqual([[0, 1], [2, 3]], [events for events, _ in self.client.injected])
+        self.assertEqual([0, 1, 2, 3], sorted(a["mint"]["event_id"] for a, _ in confirmed))
+        self.assertEqual([], failed)
+
+    def test_retries_mints_of_a_failed_group_one_by_one(self):
+        actions = [mint(0), mint(1, on_chain="failed"), mint(2)]
+
+        confirmed, failed = self.relayer().run(actions)
+
+        self.assertEqual([[0, 1, 2], [0], [1], [2]], [events for events, _ in self.client.injected])
+        self.assertEqual([0, 2], sorted(a["mint"]["event_id"] for a, _ in confirmed))
+        [(action, error)] = failed
+        self.assertEqual(1, action["mint"]["event_id"])
+        self.assertIsInstance(error, RpcError)
+
+
+class MinterBatchCallTest(unittest.TestCase):
+
+    def test_rejects_more_amounts_than_mints(self):
+        with self.assertRaises(ValueError) as context:
+            minter_batch_call(FakeQuorum(), minter_address, [("mint_erc721", {"event_id": 1})], [("k51", "sig")],
+                              amounts=[500_000, 0])
+        self.assertIn("BAD_AMOUNT", str(context.exception))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import asyncio
+import sys
+import time
+import unittest
+
+from src import runner
+from src.runner import CommandError, run_command, run_command_async
+
+
+class RunnerTest(unittest.TestCase):
+
+    def test_returns_stdout(self):
+        self.assertEqual("hello\n", run_command([sys.executable, "-c", "print('hello')"]))
+
+    def test_raises_with_stderr_on_failure(self):
+        with self.assertRaises(CommandError) as context:
+            run_command([sys.executable, "-c", "import sys; sys.stderr.write('boom'); sys.exit(3)"])
+        self.assertEqual(3, context.exception.returncode)
+        self.assertEqual("boom", context.exception.stderr)
+
+    def test_does_not_deadlock_on_large_stderr(self):
+        script = "import sys; sys.stderr.write('x' * 1_000_000); print('done')"
+
+        self.assertEqual("done\n", run_command([sys.executable, "-c", script], timeout=30))
+
+    def test_kills_command_on_timeout(self):
+        with self.assertRaises(asyncio.TimeoutError):
+            run_command([sys.executable, "-c", "import time; time.sleep(30)"], timeout=0.5)
+
+    def test_limits_concurrency(self):
+        previous = runner.max_concurrency
+        runner.max_concurrency = 2
+        try:
+            async def run_all():
+                command = [sys.executable, "-c", "import time; time.sleep(0.5)"]
+                await asyncio.gather(*[run_command_async(command) for _ in range(4)])
+
+            start = time.perf_counter()
+            asyncio.run(run_all())
+            self.assertGreaterEqual(time.perf_counter() - start, 1.0)
+        finally:
+            runner.max_concurrency = previous
+
+
+if __name__ == '__main__':
+    unittest.main()
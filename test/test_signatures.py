@@ -0,0 +1,115 @@
+import json
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+from src.signatures import SignatureAggregator
+
+signers = {"alice": "sppk_alice", "bob": "sppk_bob", "carol": "sppk_carol"}
+
+
+def fake_verify(public_key, signature, message):
+    return signature == f"{public_key}:{message.decode()}"
+
+
+def sign(signer_id, action):
+    return f"{signers[signer_id]}:{json.dumps(action['mint'], sort_keys=True)}"
+
+
+def mint(log_index):
+    return {"entrypoint": "mint_erc20",
+            "mint": {"erc_20": "aa", "event_id": {"block_hash": "bb", "log_index": log_index}, "owner": "tz1owner",
+                     "amount": 10}}
+
+
+class FakeQuorum:
+    def storage(self):
+        return {"threshold": 2, "signers": signers}
+
+
+class FakeInterfaces:
+    def contract(self, client, address):
+        return FakeQuorum()
+
+
+class FakeHead:
+    def header(self):
+        return {"chain_id": "NetXm8tYqnMWky1"}
+
+
+class FakeShell:
+    blocks = {"head": FakeHead()}
+
+
+class FakeClient:
+    shell = FakeShell()
+
+
+class SignatureAggregatorTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.packed = []
+        patches = [patch("src.signatures.interface_cache", FakeInterfaces()),
+                   patch("src.signatures.verify", fake_verify),
+                   patch.object(SignatureAggregator, "_pack", self._pack)]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        self.aggregator = SignatureAggregator(FakeClient(), "KT1quorum", "KT1minter", ThreadPoolExecutor(4))
+        self.addCleanup(self.aggregator.close)
+
+    def _pack(self, action):
+        self.packed.append(action)
+        return json.dumps(action["mint"], sort_keys=True).encode()
+
+    def test_releases_mints_at_threshold(self):
+        action = mint(1)
+
+        ready, rejected = self.aggregator.collect([(action, "bob", sign("bob", action))])
+        self.assertEqual([], ready)
+
+        ready, rejected = self.aggregator.collect([(action, "alice", sign("alice", action)),
+                                                   (action, "carol", sign("carol", action))])
+
+        self.assertEqual([], rejected)
+        self.assertEqual([dict(action, signatures=[["alice", sign("alice", action)], ["bob", sign("bob", action)]])],
+                         ready)
+
+    def test_releases_a_mint_once(self):
+        action = mint(1)
+        self.aggregator.collect([(action, "alice", sign("alice", action)), (action, "bob", sign("bob", action))])
+
+        ready, _ = self.aggregator.collect([(action, "carol", sign("carol", action))])
+
+        self.assertEqual([], ready)
+
+    def test_rejects_bad_and_unknown_signatures(self):
+        action = mint(1)
+
+        ready, rejected = self.aggregator.collect([(action, "alice", sign("alice", mint(2))),
+                                                   (action, "dave", sign("alice", action)),
+                                                   (action, "bob", sign("bob", action))])
+
+        self.assertEqual([], ready)
+        self.assertEqual([(action, "alice", "BAD_SIGNATURE"), (action, "dave", "SIGNER_UNKNOWN")], rejected)
+        self.assertEqual([(action, 1)], self.aggregator.waiting())
+
+    def test_counts_a_signer_once(self):
+        action = mint(1)
+
+        ready, _ = self.aggregator.collect([(action, "alice", sign("alice", action)),
+                                            (action, "alice", sign("alice", action))])
+
+        self.assertEqual([], ready)
+
+    def test_packs_each_mint_once(self):
+        action = mint(1)
+
+        self.aggregator.collect([(action, signer, sign(signer, action)) for signer in signers])
+        self.aggregator.collect([(dict(reversed(list(action.items()))), "alice", "other")])
+
+        self.assertEqual([action], self.packed)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,146 @@
+import asyncio
+import unittest
+
+from src.tracker import OperationTracker
+
+
+def operation(op_hash, status="applied"):
+    result = {"status": status}
+    if status != "applied":
+        result["errors"] = [{"id": "proto.008-PtEdo2Zk.michelson_v1.script_rejected"}]
+    return {"hash": op_hash, "contents": [{"kind": "transaction", "metadata": {"operation_result": result}}]}
+
+
+class FakeChain:
+    def __init__(self):
+        self.headers = {"B0": {"level": 0, "hash": "B0", "predecessor": "B0"}}
+        self.operations = {"B0": []}
+        self.head = "B0"
+        self.operation_fetches = 0
+        for _ in range(3):
+            self.add_block([])
+
+    def add_block(self, ops, predecessor=None, branch=""):
+        predecessor = predecessor or self.head
+        level = self.headers[predecessor]["level"] + 1
+        block_hash = f"B{level}{branch}"
+        self.headers[block_hash] = {"level": level, "hash": block_hash, "predecessor": predecessor}
+        self.operations[block_hash] = ops
+        self.head = block_hash
+        return block_hash
+
+
+class FakeBlock:
+    def __init__(self, chain, block_id):
+        self.chain = chain
+        self.block_hash = chain.head if block_id == "head" else block_id
+        self.operations = {3: self._operations}
+
+    def header(self):
+        return self.chain.headers[self.block_hash]
+
+    def _operations(self):
+        self.chain.operation_fetches += 1
+        return self.chain.operations[self.block_hash]
+
+
+class FakeClient:
+    def __init__(self, chain):
+        self.shell = self
+        self.chain = chain
+        self.blocks = self
+
+    def __getitem__(self, block_id):
+        return FakeBlock(self.chain, block_id)
+
+
+class OperationTrackerTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.chain = FakeChain()
+        self.tracker = OperationTracker(FakeClient(self.chain), lookback=2)
+        self.tracker.poll()
+
+    def test_fetches_each_block_once_whatever_the_number_of_operations(self):
+        hashes = [f"oo{i}" for i in range(500)]
+        self.tracker.track(*hashes)
+        fetches = self.chain.operation_fetches
+
+        self.chain.add_block([operation(h) for h in hashes[:250]])
+        first = self.tracker.poll()
+        self.chain.add_block([operation(h) for h in hashes[250:]])
+        second = self.tracker.poll()
+
+        self.assertEqual(2, self.chain.operation_fetches - fetches)
+        self.assertEqual(250, len(first))
+        self.assertEqual(set(hashes), {h for h, _, _ in first + second})
+
+    def test_waits_for_confirmations(self):
+        self.tracker.confirmations = 2
+        self.tracker.track("oo1")
+
+        self.chain.add_block([operation("oo1")])
+        self.assertEqual([], self.tracker.poll())
+        self.chain.add_block([])
+
+        self.assertEqual(["oo1"], [h for h, _, _ in self.tracker.poll()])
+
+    def test_finds_operations_included_before_being_tracked(self):
+        self.chain.add_block([operation("oo1")])
+        self.tracker.poll()
+
+        self.tracker.track("oo1")
+
+        self.assertEqual(["oo1"], [h for h, _, _ in self.tracker.poll()])
+
+    def test_reports_failed_operations(self):
+        self.tracker.track("oo1")
+        self.chain.add_block([operation("oo1", status="failed")])
+
+        [(_, _, error)] = self.tracker.poll()
+
+        self.assertIsNotNone(error)
+
+    def test_reports_timeout(self):
+        self.tracker.timeout_blocks = 1
+        self.tracker.track("oo1")
+        self.chain.add_block([])
+        self.assertEqual([], self.tracker.poll())
+        self.chain.add_block([])
+
+        [(_, _, error)] = self.tracker.poll()
+
+        self.assertIsInstance(error, TimeoutError)
+
+    def test_puts_operations_back_to_pending_on_reorg(self):
+        self.tracker.confirmations = 2
+        self.tracker.track("oo1")
+        fork_point = self.chain.head
+        self.chain.add_block([operation("oo1")])
+        self.tracker.poll()
+
+        self.chain.add_block([], predecessor=fork_point, branch="b")
+        self.chain.add_block([])
+        self.assertEqual([], self.tracker.poll())
+        self.assertIn("oo1", self.tracker.pending)
+
+        self.chain.add_block([operation("oo1")])
+        self.chain.add_block([])
+        self.assertEqual(["oo1"], [h for h, _, _ in self.tracker.poll()])
+
+    def test_async_wait_resolves_results_in_order(self):
+        self.tracker.poll_interval = 0
+
+        async def scenario():
+            waiting = asyncio.create_task(self.tracker.wait("oo2", "oo1"))
+            await asyncio.sleep(0.05)
+            self.chain.add_block([operation("oo1"), operation("oo2")])
+            return await asyncio.wait_for(waiting, 5)
+
+        results = asyncio.run(scenario())
+
+        self.assertEqual(["oo2", "oo1"], [r["hash"] for r in results])
+
+
+if __name__ == '__main__':
+    unittest.main()
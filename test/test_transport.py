@@ -0,0 +1,165 @@
+import json
+import socket
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from pytezos.rpc.node import RpcError
+
+from src.transport import NodePool
+
+block_hash = "BLockGenesisGenesisGenesisGenesisGenesisf79b5d1CoW2"
+
+
+class FakeNode:
+    def __init__(self, level=10):
+        """
+        Local stand-in answering the head header, a counter and a failing
+        run_operation, recording the requests and client connections.
+        """
+        self.level = level
+        self.status = 200
+        self.known_blocks = set()
+        self.requests = []
+        self.connections = set()
+        node = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                node.requests.append(self.path)
+                node.connections.add(self.client_address)
+                if self.path == "/chains/main/blocks/head/header":
+                    self._answer(200, {"level": node.level, "hash": f"BL{node.level}"})
+                elif "/blocks/B" in self.path and self.path.split("/")[4] not in node.known_blocks:
+                    self._answer(404, None)
+                else:
+                    self._answer(node.status, {"counter": "7"})
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers["Content-Length"]))
+                node.requests.append(self.path)
+                self._answer(500, [{"kind": "temporary", "id": "proto.008-PtEdo2Zk.michelson_v1.script_rejected"}])
+
+            def _answer(self, status, body):
+                data = json.dumps(body).encode() if body is not None else b"Not found"
+                self.send_response(status)
+                self.send_header("content-type", "application/json" if body is not None else "text/plain")
+                self.send_header("content-length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.uri = f"http://127.0.0.1:{self.server.server_port}"
+        self.thread = threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True)
+        self.thread.start()
+
+    def calls(self, path):
+        return sum(1 for p in self.requests if p == path)
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def dead_uri():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return f"http://127.0.0.1:{s.getsockname()[1]}"
+
+
+counter_path = "chains/main/blocks/head/context/contracts/tz1relayer/counter"
+run_operation_path = "chains/main/blocks/head/helpers/scripts/run_operation"
+block_path = f"chains/main/blocks/{block_hash}/header/shell"
+
+
+class NodePoolTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.nodes = [FakeNode(), FakeNode(), FakeNode()]
+        self.pool = NodePool([n.uri for n in self.nodes], timeout=2)
+
+    def tearDown(self) -> None:
+        for node in self.nodes:
+            node.stop()
+
+    def test_spreads_block_reads_across_nodes(self):
+        for node in self.nodes:
+            node.known_blocks.add(block_hash)
+
+        for _ in range(30):
+            self.assertEqual({"counter": "7"}, self.pool.get(block_path))
+
+        self.assertEqual([10, 10, 10], [n.calls(f"/{block_path}") for n in self.nodes])
+
+    def test_sends_head_reads_and_writes_to_one_node(self):
+        for _ in range(10):
+            self.pool.get(counter_path)
+            with self.assertRaises(RpcError):
+                self.pool.post(run_operation_path, json={})
+
+        self.assertEqual([10, 0, 0], [n.calls(f"/{counter_path}") for n in self.nodes])
+        self.assertEqual([10, 0, 0], [n.calls(f"/{run_operation_path}") for n in self.nodes])
+
+    def test_keeps_connections_alive(self):
+        pool = NodePool([self.nodes[0].uri])
+
+        for _ in range(20):
+            pool.get(counter_path)
+
+        self.assertEqual(1, len(self.nodes[0].connections))
+
+    def test_skips_lagging_nodes(self):
+        self.nodes[2].level = 5
+
+        for _ in range(10):
+            self.pool.get(counter_path)
+
+        self.assertEqual(0, self.nodes[2].calls(f"/{counter_path}"))
+        self.assertFalse(self.pool.nodes[2].healthy)
+
+    def test_fails_over_when_a_node_is_down(self):
+        pool = NodePool([dead_uri()] + [n.uri for n in self.nodes[1:]], timeout=2)
+        pool.check()
+        pool.nodes[0].healthy = True
+
+        for _ in range(10):
+            self.assertEqual({"counter": "7"}, pool.get(counter_path))
+
+        self.assertFalse(pool.nodes[0].healthy)
+        self.assertEqual(10, sum(n.calls(f"/{counter_path}") for n in self.nodes[1:]))
+
+    def test_fails_over_on_gateway_errors(self):
+        self.nodes[0].status = 502
+
+        for _ in range(10):
+            self.pool.get(counter_path)
+
+        self.assertEqual([1, 10, 0], [n.calls(f"/{counter_path}") for n in self.nodes])
+        self.assertFalse(self.pool.nodes[0].healthy)
+
+    def test_asks_other_nodes_for_blocks_unknown_to_a_lagging_one(self):
+        self.nodes[2].known_blocks.add(block_hash)
+
+        for _ in range(3):
+            self.assertEqual({"counter": "7"}, self.pool.get(block_path))
+
+    def test_raises_node_errors_without_failing_over(self):
+        with self.assertRaises(RpcError):
+            self.pool.post(run_operation_path, json={})
+
+        self.assertEqual(1, sum(n.calls(f"/{run_operation_path}") for n in self.nodes))
+
+    def test_raises_when_no_node_answers(self):
+        pool = NodePool([dead_uri(), dead_uri()], timeout=2)
+
+        with self.assertRaises(RpcError):
+            pool.get(counter_path)
+
+
+if __name__ == '__main__':
+    unittest.main()